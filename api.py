@@ -0,0 +1,344 @@
+# api.py - read-only HTTP/JSON service over the data layer, for scripts (no flet needed)
+#
+#   python api.py [--db path.db] [--host 127.0.0.1] [--port 8766] [--workers 4]
+#
+#   GET /clients?search=&limit=&cursor=        workers, by name
+#   GET /clients/<id>
+#   GET /attendance?date=YYYY-MM-DD            ids of the workers present (default: today)
+#   GET /payments?client=<id>&since=YYYY-MM-DD a worker's payments, newest first
+#   GET /expenses?limit=&cursor=               newest first
+#   GET /report[?from=&to=]                    all-time totals, or one date range
+#   GET /report/daily?from=&to=                one row per day
+#
+# Errors come back as {"error": "..."}: 400 bad parameter, 404 unknown id or
+# endpoint, 503 when an archived year the request reaches into has no file.
+#
+# Lists come back as {"items": [...], "next": cursor-or-null}; pass `next` as
+# `cursor` for the following page. Requests are served by a fixed pool of
+# worker threads, each reading through its own pooled connection (db.get_conn
+# is per thread). Every response carries an ETag that changes whenever the
+# database does: the server checks PRAGMA data_version at the start of each
+# request, so a request with a matching If-None-Match is answered 304 without
+# running its query.
+import argparse
+import base64
+import json
+import queue
+import sqlite3
+import sys
+import threading
+import uuid
+from datetime import date
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import db
+from db import (
+    init_db, set_db_path, fetch_clients, client_cursor, get_client, get_attendance_ids,
+    get_payments, get_expenses, expense_cursor, compute_report, get_range_report, get_daily_rows,
+)
+
+PORT = 8766
+WORKERS = 4
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+REQUEST_TIMEOUT = 10  # seconds a worker waits on a slow client before dropping it
+MAX_ID = 2 ** 63 - 1  # SQLite integers are signed 64-bit; larger ids overflow the binding
+
+
+class BadRequest(ValueError):
+    pass
+
+
+# -------------------- PARAMETERS --------------------
+def _param(query, name, default=None):
+    values = query.get(name)
+    return values[0] if values and values[0] != "" else default
+
+
+def _int(query, name, default=None):
+    value = _param(query, name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise BadRequest(f"{name} must be an integer") from None
+    if abs(number) > MAX_ID:
+        raise BadRequest(f"{name} is out of range")
+    return number
+
+
+def _day(query, name, default=None):
+    value = _param(query, name)
+    if value is None:
+        return default
+    try:
+        return date.fromisoformat(value).strftime("%Y-%m-%d")
+    except ValueError:
+        raise BadRequest(f"{name} must be a date (YYYY-MM-DD)") from None
+
+
+def _limit(query):
+    limit = _int(query, "limit", DEFAULT_LIMIT)
+    if not 1 <= limit <= MAX_LIMIT:
+        raise BadRequest(f"limit must be between 1 and {MAX_LIMIT}")
+    return limit
+
+
+def _range(query, required=False):
+    start, end = _day(query, "from"), _day(query, "to")
+    if (start is None) != (end is None) or (required and start is None):
+        raise BadRequest("give both from and to")
+    return start, end
+
+
+# keyset cursors are opaque to callers: the last row's sort key, base64'd.
+# Both keys are (text, id): a client's name or an expense's date, then its id
+def _encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(list(values), ensure_ascii=False).encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(query):
+    token = _param(query, "cursor")
+    if token is None:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+    except ValueError:
+        values = None
+    if (not isinstance(values, list) or len(values) != 2 or not isinstance(values[0], str)
+            or type(values[1]) is not int or abs(values[1]) > MAX_ID):
+        raise BadRequest("bad cursor")
+    return tuple(values)
+
+
+def _page(rows, limit, cursor_of):
+    # `rows` holds up to limit + 1 rows; the extra one only says there is a next page
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return rows, (_encode_cursor(cursor_of(rows[-1])) if more else None)
+
+
+def _slice(items, query):
+    # lists the helpers return whole (one day's attendance, one worker's payments)
+    limit, offset = _limit(query), _int(query, "cursor", 0)
+    if offset < 0:
+        raise BadRequest("bad cursor")
+    page = items[offset:offset + limit]
+    return page, (str(offset + limit) if offset + limit < len(items) else None)
+
+# -------------------- ENDPOINTS --------------------
+_CLIENT_FIELDS = ("id", "name", "phone", "daily_rate", "days_worked")
+_PAYMENT_FIELDS = ("id", "amount", "type", "date")
+_EXPENSE_FIELDS = ("id", "type", "amount", "description", "date")
+_DAILY_FIELDS = ("day", "attendance", "income", "expense", "payments", "advances")
+
+
+def _clients(query):
+    limit = _limit(query)
+    rows, next_cursor = _page(fetch_clients(_param(query, "search"), _decode_cursor(query), limit + 1),
+                              limit, client_cursor)
+    return {"items": [dict(zip(_CLIENT_FIELDS, r)) for r in rows], "next": next_cursor}
+
+
+def _client(cid):
+    row = get_client(cid)
+    if row is None:
+        raise LookupError(f"no client {cid}")
+    return dict(zip(_CLIENT_FIELDS, row))
+
+
+def _attendance(query):
+    day = _day(query, "date", date.today().strftime("%Y-%m-%d"))
+    items, next_cursor = _slice(sorted(get_attendance_ids(day)), query)
+    return {"date": day, "items": items, "next": next_cursor}
+
+
+def _payments(query):
+    cid = _int(query, "client")
+    if cid is None:
+        raise BadRequest("client is required")
+    items, next_cursor = _slice(get_payments(cid, _day(query, "since")), query)
+    return {"client": cid, "items": [dict(zip(_PAYMENT_FIELDS, r)) for r in items], "next": next_cursor}
+
+
+def _expenses(query):
+    limit = _limit(query)
+    rows, next_cursor = _page(get_expenses(_decode_cursor(query), limit + 1), limit, expense_cursor)
+    return {"items": [dict(zip(_EXPENSE_FIELDS, r)) for r in rows], "next": next_cursor}
+
+
+def _report(query):
+    start, end = _range(query)
+    if start is None:
+        n_clients, attendance, income, expense, net = compute_report()
+        return {"clients": n_clients, "attendance": attendance, "income": income, "expense": expense, "net": net}
+    attendance, income, expense, paid, advances, net = get_range_report(start, end)
+    return {"from": start, "to": end, "attendance": attendance, "income": income, "expense": expense,
+            "payments": paid, "advances": advances, "net": net}
+
+
+def _daily(query):
+    start, end = _range(query, required=True)
+    return {"from": start, "to": end, "items": [dict(zip(_DAILY_FIELDS, r)) for r in get_daily_rows(start, end)]}
+
+
+ROUTES = {
+    "/clients": _clients,
+    "/attendance": _attendance,
+    "/payments": _payments,
+    "/expenses": _expenses,
+    "/report": _report,
+    "/report/daily": _daily,
+}
+
+
+def dispatch(path, query):
+    """The JSON-able body for GET `path`; raises BadRequest or LookupError."""
+    path = path.rstrip("/") or "/"
+    if path in ROUTES:
+        return ROUTES[path](query)
+    prefix, _, cid = path.rpartition("/")
+    if prefix == "/clients" and cid.isdigit():
+        if int(cid) > MAX_ID:
+            raise LookupError(f"no client {cid}")
+        return _client(int(cid))
+    raise LookupError(f"no endpoint {path}")
+
+# -------------------- SERVER --------------------
+class _Handler(BaseHTTPRequestHandler):
+    timeout = REQUEST_TIMEOUT
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        try:
+            etag = self.server.current_etag()
+            if etag in (t.strip() for t in self.headers.get("If-None-Match", "").split(",")):
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            body = dispatch(url.path, parse_qs(url.query))
+        except BadRequest as ex:
+            return self._json(400, {"error": str(ex)})
+        except LookupError as ex:
+            return self._json(404, {"error": str(ex)})
+        except FileNotFoundError as ex:
+            # an archived year the request reaches into has lost its file
+            return self._json(503, {"error": str(ex)})
+        except sqlite3.Error as ex:
+            return self._json(500, {"error": str(ex)})
+        self._json(200, body, etag)
+
+    def _json(self, status, body, etag=None):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")  # cache, but revalidate every time
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PooledHTTPServer(HTTPServer):
+    """An HTTPServer that hands accepted connections to `workers` long-lived threads.
+
+    ThreadingHTTPServer starts a thread per request, and every new thread
+    would open (and keep) a pooled connection of its own; a fixed pool keeps
+    one connection per worker for the life of the server.
+    """
+
+    def __init__(self, address, handler, workers=WORKERS):
+        super().__init__(address, handler)
+        # ETags: data_version moves on every commit made by another connection,
+        # but two connections' values cannot be compared, so all workers read it
+        # from one connection that never writes; the boot id keeps tags from a
+        # previous run of the server from matching
+        self._watch = db.open_connection()
+        self._watch_lock = threading.Lock()
+        self._data_version = None
+        self._generation = 0
+        self._boot = uuid.uuid4().hex[:8]
+        self._queue = queue.Queue()
+        self._workers = [threading.Thread(target=self._work, name=f"api-worker-{i}", daemon=True)
+                         for i in range(workers)]
+        for t in self._workers:
+            t.start()
+
+    def current_etag(self):
+        with self._watch_lock:
+            version = self._watch.execute("PRAGMA data_version").fetchone()[0]
+            if version != self._data_version:
+                self._data_version = version
+                self._generation += 1
+                # the writer may have been another process: its helpers could not invalidate ours
+                db.invalidate_client_cache()
+            return f'W/"{self._boot}-{self._generation}"'
+
+    def process_request(self, request, client_address):
+        self._queue.put((request, client_address))
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            request, client_address = item
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        for _ in self._workers:
+            self._queue.put(None)
+        for t in self._workers:
+            t.join()
+        self._watch.close()
+
+
+def serve(host="127.0.0.1", port=PORT, workers=WORKERS):
+    """The API server for the current DB; call serve_forever() on it, or use serve_in_background()."""
+    init_db()
+    return PooledHTTPServer((host, port), _Handler, workers)
+
+
+def serve_in_background(host="127.0.0.1", port=PORT, workers=WORKERS):
+    """Start serve() on a daemon thread; stop it with .shutdown() and .server_close()."""
+    server = serve(host, port, workers)
+    threading.Thread(target=server.serve_forever, name="api-server", daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Read-only HTTP/JSON API over the database")
+    parser.add_argument("--db", help="database file (default: worker_manager_final.db)")
+    parser.add_argument("--host", default="127.0.0.1", help="0.0.0.0 to accept other machines")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    args = parser.parse_args(argv)
+    if args.db:
+        set_db_path(args.db)
+
+    server = serve(args.host, args.port, args.workers)
+    print(f"serving {db.DB} on http://{args.host}:{server.server_address[1]}/ with {args.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+# archive.py - move closed years of history out of the live database
+#
+#   python archive.py [--db path.db] [--before 2025] [--no-vacuum]
+#
+# Attendance, payments and expenses of every year before `before` (default:
+# the current year) move into one file per year next to the live DB, e.g.
+# worker_manager_final.2023.db, together with that year's daily_rollup rows.
+# The live DB keeps a catalog of archived years (the archives table) and
+# per-client carry-forwards, so the all-time report, days_worked and payroll
+# balances do not change. Date-range reports and a client's payment history
+# ATTACH a year's file only when the requested range reaches it.
+#
+# A year is archived in two steps: its rows are copied into the archive file
+# (INSERT OR IGNORE, so a rerun after a crash only adds what is missing),
+# then the copied rows are deleted from the live DB in one transaction that
+# also records the carry-forwards. Rows written to a closed year later stay
+# live and are picked up by the next run.
+import argparse
+import os
+import sys
+import threading
+import time
+from contextlib import closing
+from datetime import date
+
+import db
+from db import invalidate_client_cache, migrate, open_connection, set_db_path, transaction
+
+PAYMENT = "دفع"
+ADVANCE = "سلفة"
+
+_ARCHIVE_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS arc.attendance(id INTEGER PRIMARY KEY, client_id INTEGER, date TEXT)",
+    "CREATE TABLE IF NOT EXISTS arc.payments(id INTEGER PRIMARY KEY, client_id INTEGER, amount REAL, type TEXT, date TEXT)",
+    "CREATE TABLE IF NOT EXISTS arc.expenses(id INTEGER PRIMARY KEY, type TEXT, amount REAL, description TEXT, date TEXT)",
+    """CREATE TABLE IF NOT EXISTS arc.daily_rollup(
+        day TEXT PRIMARY KEY,
+        attendance INTEGER NOT NULL DEFAULT 0,
+        income REAL NOT NULL DEFAULT 0,
+        expense REAL NOT NULL DEFAULT 0,
+        payments REAL NOT NULL DEFAULT 0,
+        advances REAL NOT NULL DEFAULT 0) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS arc.idx_attendance_date ON attendance(date, client_id)",
+    "CREATE INDEX IF NOT EXISTS arc.idx_payments_ledger ON payments(client_id, date, type, amount)",
+    "CREATE INDEX IF NOT EXISTS arc.idx_expenses_date ON expenses(date)",
+)
+
+_COPY = (
+    "INSERT OR IGNORE INTO arc.attendance SELECT id, client_id, date FROM main.attendance WHERE date BETWEEN ? AND ?",
+    "INSERT OR IGNORE INTO arc.payments SELECT id, client_id, amount, type, date FROM main.payments WHERE date BETWEEN ? AND ?",
+    "INSERT OR IGNORE INTO arc.expenses SELECT id, type, amount, description, date FROM main.expenses WHERE date BETWEEN ? AND ?",
+)
+
+
+def _year_range(year):
+    return f"{year:04d}-01-01", f"{year:04d}-12-31"
+
+
+def archive_year(conn, year):
+    """Move `year`'s rows from the live DB behind `conn` into its archive file.
+
+    Returns the number of live rows moved.
+    """
+    first, last = _year_range(year)
+    main_path = conn.execute("PRAGMA database_list").fetchone()[2]
+    name = db.archive_file(year, main_path)
+    conn.execute("ATTACH DATABASE ? AS arc", (os.path.join(os.path.dirname(main_path), name),))
+    try:
+        # step 1: copy; only the archive file is written, the live DB is just read
+        conn.execute("BEGIN")
+        try:
+            for sql in _ARCHIVE_SCHEMA:
+                conn.execute(sql)
+            for sql in _COPY:
+                conn.execute(sql, (first, last))
+            db._rebuild_daily_rollup(conn, "arc")
+            totals = conn.execute("""SELECT COALESCE(SUM(attendance), 0), COALESCE(SUM(income), 0),
+                COALESCE(SUM(expense), 0), COALESCE(SUM(payments), 0), COALESCE(SUM(advances), 0)
+                FROM arc.daily_rollup""").fetchall()[0]
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+        # step 2: drop the copied rows from the live DB, keeping every total
+        with transaction(conn) as c:
+            # moving rows out is not an edit: other copies must not delete them
+            c.execute("INSERT OR REPLACE INTO sync_state VALUES ('muted', 1)")
+            summary = c.execute("SELECT n_clients, days_worked, n_attendance, total_income, total_expense "
+                                "FROM report_summary WHERE id = 1").fetchone()
+            days = c.execute("""SELECT client_id, COUNT(*) FROM attendance
+                WHERE date BETWEEN ? AND ? AND id IN (SELECT id FROM arc.attendance) GROUP BY client_id""",
+                (first, last)).fetchall()
+            money = c.execute("""SELECT client_id,
+                    COALESCE(SUM(CASE WHEN type = ? THEN amount END), 0),
+                    COALESCE(SUM(CASE WHEN type = ? THEN amount END), 0)
+                FROM payments WHERE date BETWEEN ? AND ? AND id IN (SELECT id FROM arc.payments)
+                GROUP BY client_id""", (PAYMENT, ADVANCE, first, last)).fetchall()
+            moved = 0
+            for table in ("attendance", "payments", "expenses"):
+                moved += c.execute(f"DELETE FROM {table} WHERE date BETWEEN ? AND ? "
+                                   f"AND id IN (SELECT id FROM arc.{table})", (first, last)).rowcount
+            # the delete triggers took the moved days off days_worked: carry them forward
+            c.executemany("UPDATE clients SET days_worked = days_worked + ?, archived_days = archived_days + ? "
+                          "WHERE id = ?", [(n, n, cid) for cid, n in days])
+            c.executemany("UPDATE clients SET archived_paid = archived_paid + ?, "
+                          "archived_advances = archived_advances + ? WHERE id = ?",
+                          [(paid, adv, cid) for cid, paid, adv in money])
+            # all-time figures still include the archived year; its days now
+            # live in the archive's daily_rollup (rows written late stay here)
+            c.execute("""UPDATE report_summary SET n_clients = ?, days_worked = ?, n_attendance = ?,
+                         total_income = ?, total_expense = ? WHERE id = 1""", summary)
+            db._rebuild_daily_rollup(c, "main", first, last)
+            c.execute("INSERT OR REPLACE INTO archives VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                      (year, name, *totals, time.strftime("%Y-%m-%dT%H:%M:%S")))
+            c.execute("DELETE FROM sync_state WHERE key = 'muted'")
+    finally:
+        conn.execute("DETACH DATABASE arc")
+    invalidate_client_cache()
+    return moved
+
+
+def _db_bytes(path):
+    # the live file plus its write-ahead log, where recent pages may still sit
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+
+
+def archive_closed_years(before=None, vacuum=True, progress=None):
+    """Archive every year earlier than `before` (default: the current year).
+
+    Returns a dict with `years` ({year: rows moved}), `bytes_before`,
+    `bytes_after` (live DB size on disk) and `seconds`.
+    """
+    before = before or date.today().year
+    if before > date.today().year:
+        raise ValueError("only closed years can be archived")
+    start = time.perf_counter()
+    result = {"years": {}, "bytes_before": _db_bytes(db.DB)}
+    with closing(open_connection()) as conn:
+        migrate(conn)
+        oldest = conn.execute("""SELECT MIN(d) FROM (
+            SELECT MIN(date) AS d FROM attendance UNION ALL
+            SELECT MIN(date) FROM payments UNION ALL
+            SELECT MIN(date) FROM expenses)""").fetchone()[0]
+        first_year = int(oldest[:4]) if oldest else before
+        for year in range(first_year, before):
+            first, last = _year_range(year)
+            if not any(conn.execute(f"SELECT 1 FROM {t} WHERE date BETWEEN ? AND ? LIMIT 1", (first, last)).fetchone()
+                       for t in ("attendance", "payments", "expenses")):
+                continue
+            result["years"][year] = archive_year(conn, year)
+            if progress:
+                progress(year, result["years"][year])
+        if vacuum and result["years"]:
+            conn.execute("VACUUM")  # give the freed pages back so the file shrinks
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    result["bytes_after"] = _db_bytes(db.DB)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def archive_in_background(progress=None, done=None, error=None, **kwargs):
+    """Run archive_closed_years on a daemon thread so a UI handler can return immediately."""
+    def run():
+        try:
+            result = archive_closed_years(progress=progress, **kwargs)
+        except Exception as ex:
+            if error:
+                error(ex)
+            return
+        if done:
+            done(result)
+
+    t = threading.Thread(target=run, name="archive-closed-years", daemon=True)
+    t.start()
+    return t
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move closed years into per-year archive files")
+    parser.add_argument("--db", help="database file (default: worker_manager_final.db)")
+    parser.add_argument("--before", type=int, help="archive years before this one (default: the current year)")
+    parser.add_argument("--no-vacuum", action="store_true", help="do not shrink the live file afterwards")
+    args = parser.parse_args(argv)
+    if args.db:
+        set_db_path(args.db)
+
+    result = archive_closed_years(before=args.before, vacuum=not args.no_vacuum,
+                                  progress=lambda year, n: print(f"{year}: {n} rows moved"))
+    print(f"archived {len(result['years'])} year(s) in {result['seconds']:.2f}s, live file "
+          f"{result['bytes_before'] / 1e6:.1f} MB -> {result['bytes_after'] / 1e6:.1f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+# attendance_buffer.py - write-behind buffer for attendance checkbox toggles
+#
+# Toggles are held for FLUSH_WINDOW seconds and coalesced per (client, date):
+# only the last state of each pair is written, and a pair toggled back to the
+# state it started from is dropped without touching the database. Everything
+# pending is written by one db.apply_attendance_changes transaction.
+#
+# Call flush() before reading attendance back (screen change, date change)
+# and on exit; the buffer only knows what the checkboxes asked for.
+import threading
+import time
+
+from db import apply_attendance_changes
+
+FLUSH_WINDOW = 1.0  # seconds toggles are held before they are written
+
+
+class AttendanceBuffer:
+    def __init__(self, window=FLUSH_WINDOW, write=apply_attendance_changes, on_flush=None, on_error=None):
+        """`write(changes)` stores a list of (cid, date_str, is_present).
+
+        `on_flush(changes)` runs after every successful write and
+        `on_error(exc)` when a background flush fails.
+        """
+        self.window = window
+        self.write = write
+        self.on_flush = on_flush
+        self.on_error = on_error
+        self.toggles = 0   # toggles received
+        self.flushes = 0   # write() calls, i.e. transactions committed
+        self.written = 0   # (client, date) pairs handed to write()
+        self._pending = {}  # (cid, date_str) -> (stored state, wanted state)
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    def toggle(self, cid, date_str, is_present):
+        """Record that (cid, date_str) should now be present / absent."""
+        key = (cid, date_str)
+        with self._cond:
+            self.toggles += 1
+            # first toggle of a pair: the checkbox was showing the opposite
+            stored = self._pending.pop(key, (not is_present,))[0]
+            if stored != is_present:
+                self._pending[key] = (stored, is_present)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="attendance-flush", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def pending(self):
+        with self._cond:
+            return len(self._pending)
+
+    def flush(self):
+        """Write everything pending now. Returns (added, removed)."""
+        with self._flush_lock:
+            with self._cond:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0, 0
+            changes = [(cid, date_str, wanted) for (cid, date_str), (_, wanted) in pending.items()]
+            try:
+                result = self.write(changes)
+            except BaseException:
+                with self._cond:
+                    # keep what failed unless it was toggled again meanwhile
+                    for key, state in pending.items():
+                        self._pending.setdefault(key, state)
+                raise
+            self.flushes += 1
+            self.written += len(changes)
+        if self.on_flush:
+            self.on_flush(changes)
+        return result
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            time.sleep(self.window)  # let the rest of the burst arrive
+            try:
+                self.flush()
+            except Exception as ex:
+                if self.on_error:
+                    self.on_error(ex)
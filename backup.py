@@ -0,0 +1,284 @@
+# backup.py - online snapshots of the live database with the SQLite backup API
+#
+#   python backup.py [--db path.db] [--keep 7]            # take a snapshot
+#   python backup.py --list
+#   python backup.py --restore backups/worker_manager_final-20250101-120000-000.db
+#
+# Connection.backup copies the database page by page while the app keeps
+# working, so a snapshot is never torn the way a file copy taken during a
+# write can be. Pages are copied PAGES at a time. If another connection
+# writes in between, SQLite restarts the copy; after MAX_RESTARTS restarts
+# the rest is done in a single step, which in WAL mode is one read snapshot
+# and does not block writers either. Every snapshot is checked with PRAGMA
+# integrity_check before it replaces anything, and only the newest `keep`
+# are kept.
+#
+# Years moved out by archive.py live in their own files, which only change
+# when a year is archived again. A snapshot therefore saves each archive
+# file once per version (archived_at) in backups/archives/, and snapshots
+# that catalogue the same version share that copy. A restore puts back the
+# versions the snapshot catalogues, so the backups folder can be restored
+# elsewhere as a whole.
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import closing
+
+import db
+from db import close_all, migrate, open_connection, set_db_path
+from sync import renew_log
+
+KEEP = 7                      # snapshots kept per database
+PAGES = 1024                  # pages copied per step
+STEP_PAUSE = 0.001            # seconds between steps, so writers get the lock
+MAX_RESTARTS = 3
+BACKUP_INTERVAL = 24 * 3600   # backup_if_due: seconds between automatic snapshots
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def backup_dir(db_path=None):
+    return os.path.join(os.path.dirname(os.path.abspath(db_path or db.DB)), "backups")
+
+
+def archive_copies(snapshot):
+    """{archive file name: path of its saved copy} for every archived year `snapshot` catalogues."""
+    folder = os.path.join(os.path.dirname(os.path.abspath(snapshot)), "archives")
+    with closing(sqlite3.connect(snapshot)) as conn:
+        try:
+            rows = conn.execute("SELECT file, archived_at FROM archives").fetchall()
+        except sqlite3.OperationalError:  # taken before archives existed
+            rows = []
+    return {name: os.path.join(folder, f"{os.path.splitext(name)[0]}-{re.sub(r'[^0-9]', '', archived_at or '')}.db")
+            for name, archived_at in rows}
+
+
+def list_backups(db_path=None):
+    """Snapshot paths of the live DB at `db_path`, newest first."""
+    stem = os.path.splitext(os.path.basename(db_path or db.DB))[0]
+    folder = backup_dir(db_path)
+    if not os.path.isdir(folder):
+        return []
+    names = [n for n in os.listdir(folder)
+             if n.startswith(stem + "-") and n.endswith(".db") and n[len(stem) + 1:-3].replace("-", "").isdigit()]
+    return [os.path.join(folder, n) for n in sorted(names, reverse=True)]
+
+
+def check_integrity(path):
+    """PRAGMA integrity_check of the file at `path`; returns the problems found ([] when ok)."""
+    with closing(sqlite3.connect(path)) as conn:
+        rows = [r[0] for r in conn.execute("PRAGMA integrity_check")]
+    return [] if rows == ["ok"] else rows
+
+
+def _copy_file(source_path, target_path):
+    # online copy of a whole (small, rarely written) database file, checked before it is used
+    partial = target_path + ".partial"
+    with closing(sqlite3.connect(source_path)) as source, closing(sqlite3.connect(partial)) as target:
+        source.backup(target)
+        target.execute("PRAGMA journal_mode=DELETE")
+    problems = check_integrity(partial)
+    if problems:
+        os.remove(partial)
+        raise sqlite3.DatabaseError(f"{source_path} failed integrity_check: " + "; ".join(problems[:5]))
+    os.replace(partial, target_path)
+
+
+def _save_archives(snapshot):
+    # the archive versions `snapshot` needs that no earlier snapshot saved yet
+    live_dir = os.path.dirname(os.path.abspath(db.DB))
+    saved = []
+    for name, copy in archive_copies(snapshot).items():
+        live = os.path.join(live_dir, name)
+        if os.path.exists(copy) or not os.path.exists(live):  # a lost year stays lost
+            continue
+        os.makedirs(os.path.dirname(copy), exist_ok=True)
+        _copy_file(live, copy)
+        saved.append(copy)
+    return saved
+
+
+def _drop_unused_archives():
+    # saved archive versions no remaining snapshot catalogues
+    stem = os.path.splitext(os.path.basename(db.DB))[0]
+    folder = os.path.join(backup_dir(), "archives")
+    if not os.path.isdir(folder):
+        return []
+    used = {copy for snapshot in list_backups() for copy in archive_copies(snapshot).values()}
+    unused = [os.path.join(folder, n) for n in os.listdir(folder) if n.startswith(stem + ".") and n.endswith(".db")]
+    unused = [path for path in unused if path not in used]
+    for path in unused:
+        os.remove(path)
+    return unused
+
+
+def _copy(source, target, pages=PAGES, progress=None):
+    # stepped copy; falls back to one step if concurrent writes keep restarting it
+    state = {"remaining": None, "restarts": 0}
+
+    def on_step(status, remaining, total):
+        if state["remaining"] is not None and remaining > state["remaining"]:
+            state["restarts"] += 1
+            if state["restarts"] > MAX_RESTARTS:
+                raise _TooManyRestarts
+        state["remaining"] = remaining
+        if progress:
+            progress(total - remaining, total)
+
+    try:
+        source.backup(target, pages=pages, progress=on_step, sleep=STEP_PAUSE)
+    except _TooManyRestarts:
+        source.backup(target)
+    return state["restarts"]
+
+
+def take_backup(keep=KEEP, pages=PAGES, progress=None):
+    """Snapshot the current DB into backup_dir(), keeping the newest `keep`.
+
+    Returns a dict with `path`, `bytes`, `restarts`, `copy_seconds`,
+    `check_seconds`, `archives` (archive files saved for the first time) and
+    `removed` (snapshots and archive copies rotated out; keep=None rotates
+    nothing). Raises sqlite3.DatabaseError if the copy fails its integrity
+    check; the existing snapshots are then left untouched.
+    """
+    stem = os.path.splitext(os.path.basename(db.DB))[0]
+    folder = backup_dir()
+    os.makedirs(folder, exist_ok=True)
+    now = time.time()
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(now)) + f"-{int(now * 1000) % 1000:03d}"
+    path = os.path.join(folder, f"{stem}-{stamp}.db")
+    partial = path + ".partial"
+
+    start = time.perf_counter()
+    with closing(open_connection()) as source, closing(sqlite3.connect(partial)) as target:
+        migrate(source)  # on this connection: a pooled one would outlive the job's thread
+        restarts = _copy(source, target, pages, progress)
+        # a snapshot is one self-contained file: no -wal next to it
+        target.execute("PRAGMA journal_mode=DELETE")
+    copied = time.perf_counter()
+    problems = check_integrity(partial)
+    checked = time.perf_counter()
+    if problems:
+        os.remove(partial)
+        raise sqlite3.DatabaseError("backup failed integrity_check: " + "; ".join(problems[:5]))
+    try:
+        archives = _save_archives(partial)
+    except BaseException:
+        os.remove(partial)
+        raise
+    os.replace(partial, path)
+
+    removed = list_backups()[keep:] if keep is not None else []
+    for old in removed:
+        os.remove(old)
+    if removed:
+        removed += _drop_unused_archives()
+    return {"path": path, "bytes": os.path.getsize(path), "restarts": restarts, "copy_seconds": copied - start,
+            "check_seconds": checked - copied, "archives": archives, "removed": removed}
+
+
+def backup_if_due(interval=BACKUP_INTERVAL, **kwargs):
+    """take_backup() unless the newest snapshot is younger than `interval` seconds; None if skipped."""
+    latest = list_backups()[:1]
+    if latest and time.time() - os.path.getmtime(latest[0]) < interval:
+        return None
+    return take_backup(**kwargs)
+
+
+def restore_backup(path, pages=PAGES, progress=None):
+    """Copy the snapshot at `path` over the live DB, online.
+
+    The snapshot is checked first, and the current state is saved as one more
+    snapshot so a restore can be undone. The archive files the snapshot
+    catalogues are put back from backups/archives/ next to it; a year whose
+    copy is not there keeps the file it has. Callers must flush pending
+    writes (e.g. buffered attendance) before. Returns a dict with
+    `safety_backup`, `archives` (files put back), `missing` (catalogued years
+    with no saved copy) and `seconds`.
+    """
+    problems = check_integrity(path)
+    if problems:
+        raise sqlite3.DatabaseError("snapshot failed integrity_check: " + "; ".join(problems[:5]))
+    start = time.perf_counter()
+    safety = take_backup(keep=None)["path"]  # no rotation: `path` itself may be the oldest
+    with closing(sqlite3.connect(path)) as source, closing(open_connection()) as target:
+        source.backup(target, pages=pages, progress=(lambda s, r, t: progress(t - r, t)) if progress else None)
+        migrate(target)  # an older snapshot is brought up to the current schema
+        renew_log(target)  # its change log went back: peers must not trust their watermarks
+    live_dir = os.path.dirname(os.path.abspath(db.DB))
+    restored, missing = [], []
+    for name, copy in archive_copies(path).items():
+        if os.path.exists(copy):
+            _copy_file(copy, os.path.join(live_dir, name))
+            restored.append(name)
+        else:
+            missing.append(name)
+    # pooled connections and cached rows still describe the old contents
+    close_all()
+    return {"safety_backup": safety, "archives": restored, "missing": missing,
+            "seconds": time.perf_counter() - start}
+
+
+def _in_background(job, name, progress=None, done=None, error=None, **kwargs):
+    def run():
+        try:
+            result = job(progress=progress, **kwargs)
+        except Exception as ex:
+            if error:
+                error(ex)
+            return
+        if done:
+            done(result)
+
+    t = threading.Thread(target=run, name=name, daemon=True)
+    t.start()
+    return t
+
+
+def backup_in_background(progress=None, done=None, error=None, **kwargs):
+    """Run take_backup (or backup_if_due with due_only=True) on a daemon thread."""
+    job = backup_if_due if kwargs.pop("due_only", False) else take_backup
+    return _in_background(job, "db-backup", progress, done, error, **kwargs)
+
+
+def restore_in_background(path, progress=None, done=None, error=None):
+    """Run restore_backup on a daemon thread so a UI handler can return immediately."""
+    return _in_background(restore_backup, "db-restore", progress, done, error, path=path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Online snapshots of the database")
+    parser.add_argument("--db", help="database file (default: worker_manager_final.db)")
+    parser.add_argument("--keep", type=int, default=KEEP, help="snapshots to keep")
+    parser.add_argument("--list", action="store_true", help="list snapshots, newest first")
+    parser.add_argument("--restore", metavar="SNAPSHOT", help="copy SNAPSHOT over the database")
+    args = parser.parse_args(argv)
+    if args.db:
+        set_db_path(args.db)
+
+    if args.list:
+        for path in list_backups():
+            print(f"{path}  {os.path.getsize(path) / 1e6:.1f} MB")
+        return 0
+    if args.restore:
+        result = restore_backup(args.restore)
+        print(f"restored {args.restore} in {result['seconds']:.2f}s "
+              f"(previous state saved as {result['safety_backup']})")
+        for name in result["missing"]:
+            print(f"warning: no saved copy of archive {name}; the file in place was kept")
+        return 0
+    result = take_backup(keep=args.keep)
+    print(f"{result['path']}: {result['bytes'] / 1e6:.1f} MB, copy {result['copy_seconds']:.2f}s, "
+          f"integrity_check {result['check_seconds']:.2f}s, restarts {result['restarts']}, "
+          f"rotated out {len(result['removed'])}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+# bench_api.py - load test of the JSON API (api.py) against a local instance
+#
+#   python benchmarks/bench_api.py [--size small] [--workers 4] [--threads 8] [--seconds 5]
+#
+# Starts the API on a free port over a synthetic DB, then runs `--threads`
+# client threads requesting a mix of endpoints for `--seconds` per phase:
+#   plain        no caching
+#   conditional  each thread revalidates with If-None-Match (mostly 304s)
+#   + writer     the same while another connection adds an expense every 50 ms
+# Exits 1 if a 304 is ever answered for data that changed.
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from datagen import SIZES, generate  # noqa: E402
+import api  # noqa: E402
+import db  # noqa: E402
+
+
+def get(url, etag=None):
+    req = urllib.request.Request(url, headers={"If-None-Match": etag} if etag else {})
+    try:
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            resp.read()
+            return resp.status, resp.headers.get("ETag")
+    except urllib.error.HTTPError as ex:
+        return ex.code, ex.headers.get("ETag")
+
+
+def run_phase(base, paths, threads, seconds, conditional):
+    latencies, statuses, lock = [], {}, threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client(seed):
+        rnd = random.Random(seed)
+        tags = {}
+        mine, codes = [], {}
+        while time.perf_counter() < deadline:
+            path = rnd.choice(paths)
+            start = time.perf_counter()
+            status, etag = get(base + path, tags.get(path) if conditional else None)
+            mine.append(time.perf_counter() - start)
+            codes[status] = codes.get(status, 0) + 1
+            if etag:
+                tags[path] = etag
+        with lock:
+            latencies.extend(mine)
+            for status, n in codes.items():
+                statuses[status] = statuses.get(status, 0) + n
+
+    workers = [threading.Thread(target=client, args=(i,)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    ordered = sorted(latencies)
+    return {"requests": len(ordered), "rps": len(ordered) / seconds, "p50": statistics.median(ordered) * 1000,
+            "p99": ordered[int(len(ordered) * 0.99)] * 1000, "statuses": statuses}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", choices=sorted(SIZES), default="small")
+    parser.add_argument("--workers", type=int, default=api.WORKERS)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        days = generate(os.path.join(tmp, "bench.db"), **SIZES[args.size])
+        db.close_all()
+        server = api.serve_in_background(port=0, workers=args.workers)
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        n_clients = SIZES[args.size]["clients"]
+        rnd = random.Random(1)
+        paths = (["/clients?limit=50", "/expenses?limit=100", "/report",
+                  f"/report?from={days[0]}&to={days[-1]}", f"/report/daily?from={days[-7]}&to={days[-1]}"]
+                 + [f"/attendance?date={rnd.choice(days)}" for _ in range(5)]
+                 + [f"/payments?client={rnd.randint(1, n_clients)}" for _ in range(5)]
+                 + [f"/clients/{rnd.randint(1, n_clients)}" for _ in range(5)])
+
+        stop = threading.Event()
+
+        def writer():
+            while not stop.wait(0.05):
+                db.add_expense_db("دخل", 1, "bench")
+            db.close_all()
+
+        results = {}
+        results["plain"] = run_phase(base, paths, args.threads, args.seconds, False)
+        results["conditional"] = run_phase(base, paths, args.threads, args.seconds, True)
+        t = threading.Thread(target=writer)
+        t.start()
+        results["+ writer"] = run_phase(base, paths, args.threads, args.seconds, True)
+        stop.set()
+        t.join()
+
+        # a write must invalidate the tag a client holds
+        _, etag = get(base + "/report")
+        db.add_expense_db("دخل", 1, "after")
+        stale, _ = get(base + "/report", etag)
+        server.shutdown()
+        server.server_close()
+        db.close_all()
+
+    print(f"size={args.size} workers={args.workers} client threads={args.threads} {args.seconds:.0f}s per phase")
+    print(f"{'phase':<13}{'requests':>9}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}  statuses")
+    for name, r in results.items():
+        print(f"{name:<13}{r['requests']:>9}{r['rps']:>9.0f}{r['p50']:>9.2f}{r['p99']:>9.2f}  "
+              f"{dict(sorted(r['statuses'].items()))}")
+    if stale == 304:
+        print("FAIL: 304 after the data changed", file=sys.stderr)
+        return 1
+    print("OK: a write invalidates the ETag")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+# bench_archive.py - live DB size and helper latency before and after archiving closed years
+#
+#   python benchmarks/bench_archive.py [--size medium] [--clients 500] [--repeat 20]
+#
+# Generates a synthetic DB spanning several years (the preset's row counts
+# spread over fewer workers, so they cover more days), times the day-to-day
+# helpers, moves every year before the last one into archive files with
+# archive.py, then times them again. Reports over the current period must not
+# need the archives; a range reaching into an archived year ATTACHes one file.
+# Exits 1 if any total (including the consolidated site report) changed.
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from datagen import SIZES, generate  # noqa: E402
+import archive  # noqa: E402
+import db  # noqa: E402
+import payroll  # noqa: E402
+import sites  # noqa: E402
+
+
+def median_ms(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", choices=sorted(SIZES), default="medium")
+    parser.add_argument("--clients", type=int, default=500, help="workers (fewer workers = more years)")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        days = generate(path, **dict(SIZES[args.size], clients=args.clients))
+        last_year = int(days[-1][:4])
+        if last_year == int(days[0][:4]):
+            parser.error("the data set covers a single year; use a larger --size or fewer --clients")
+        today, month_start = days[-1], days[-1][:8] + "01"
+        old_start, old_end = days[0], days[0][:8] + "28"
+        cases = {
+            "get_attendance_ids(today)": lambda: db.get_attendance_ids(today),
+            "get_payments": lambda: db.get_payments(7),
+            "get_expenses": lambda: db.get_expenses(),
+            "get_range_report(this month)": lambda: db.get_range_report(month_start, today),
+            "get_range_report(archived month)": lambda: db.get_range_report(old_start, old_end),
+            "get_payments(all years)": lambda: db.get_payments(7, since=days[0]),
+            "compute_payroll": lambda: payroll.compute_payroll(),
+        }
+        totals = lambda: (db.compute_report(), db.get_range_report(days[0], today),
+                          payroll.payroll_totals(payroll.compute_payroll()),
+                          sites.consolidated_report({"bench": path})[1][1:],
+                          sites.consolidated_report({"bench": path}, days[0], today)[1][1:])
+
+        before_totals = totals()
+        before = {name: median_ms(fn, args.repeat) for name, fn in cases.items()}
+        db.close_all()
+        result = archive.archive_closed_years(before=last_year)
+        after = {name: median_ms(fn, args.repeat) for name, fn in cases.items()}
+        after_totals = totals()
+
+    print(f"size={args.size} days={days[0]}..{days[-1]} archived={sorted(result['years'])} "
+          f"rows moved={sum(result['years'].values())} in {result['seconds']:.1f}s")
+    print(f"live file {result['bytes_before'] / 1e6:.1f} MB -> {result['bytes_after'] / 1e6:.1f} MB")
+    print(f"{'helper':<34}{'before ms':>11}{'after ms':>10}")
+    for name in cases:
+        print(f"{name:<34}{before[name]:>11.2f}{after[name]:>10.2f}")
+
+    def close(a, b):
+        return all(close(x, y) for x, y in zip(a, b)) if isinstance(a, tuple) else abs(a - b) < 1e-6
+    if not close(before_totals, after_totals):
+        print(f"FAIL: totals changed\n  before {before_totals}\n  after  {after_totals}", file=sys.stderr)
+        return 1
+    print("OK: report, range, payroll and consolidated site totals unchanged")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+# bench_attendance_buffer.py - rapid checkbox clicking: commit per toggle vs write-behind
+#
+#   python benchmarks/bench_attendance_buffer.py [--clients 60] [--clicks 2000]
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db  # noqa: E402
+from attendance_buffer import AttendanceBuffer  # noqa: E402
+
+DAY = "2024-01-01"
+
+
+def clicks(n_clients, n_clicks):
+    # a supervisor ticking and unticking checkboxes: every click flips one box
+    rnd = random.Random(11)
+    state = {}
+    for _ in range(n_clicks):
+        cid = rnd.randint(1, n_clients)
+        state[cid] = not state.get(cid, False)
+        yield cid, state[cid]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=60)
+    parser.add_argument("--clicks", type=int, default=2000)
+    parser.add_argument("--window", type=float, default=0.05, help="flush window in seconds")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.set_db_path(os.path.join(tmp, "bench.db"))
+        db.init_db()
+        for i in range(args.clients):
+            db.insert_client(f"عامل {i}", "", 150)
+
+        start = time.perf_counter()
+        for cid, present in clicks(args.clients, args.clicks):
+            db.toggle_attendance_db(cid, DAY, present)
+        direct_s = time.perf_counter() - start
+        direct_ids = set(db.get_attendance_ids(DAY))
+        db.clear_attendance(DAY)
+
+        buf = AttendanceBuffer(window=args.window)
+        start = time.perf_counter()
+        for cid, present in clicks(args.clients, args.clicks):
+            buf.toggle(cid, DAY, present)
+            time.sleep(0.0005)  # clicks arrive over time, not all at once
+        buf.flush()
+        buffered_s = time.perf_counter() - start
+        assert set(db.get_attendance_ids(DAY)) == direct_ids
+        days = sum(r[4] for r in db.fetch_clients())
+        assert days == len(direct_ids), (days, len(direct_ids))
+
+        print(f"clicks={args.clicks} clients={args.clients} window={args.window}s")
+        print(f"commit per toggle   {args.clicks:6d} commits  {direct_s * 1000:9.1f} ms")
+        print(f"write-behind buffer {buf.flushes:6d} commits  {buffered_s * 1000:9.1f} ms "
+              f"(incl. {args.clicks * 0.5:.0f} ms of simulated click gaps), {buf.written} pairs written")
+        db.close_all()
+
+
+if __name__ == "__main__":
+    main()
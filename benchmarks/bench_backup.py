@@ -0,0 +1,100 @@
+# bench_backup.py - online backup, integrity check and restore timings on a large database
+#
+#   python benchmarks/bench_backup.py [--size large] [--pages 1024] [--write-interval 0.01]
+#
+# Each snapshot is taken while a writer thread keeps adding expenses, the way
+# the app keeps saving while a backup runs; the writer's commit latency shows
+# whether the backup holds it up. Compares a stepped copy (--pages per step)
+# with a single-step copy and a plain file copy, then restores the stepped
+# snapshot and checks the restored totals.
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from datagen import SIZES, generate  # noqa: E402
+import backup  # noqa: E402
+import db  # noqa: E402
+
+
+class Writer(threading.Thread):
+    """Adds one expense every `interval` seconds and records each commit's latency."""
+
+    def __init__(self, interval):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.latencies = []
+        self.stop = threading.Event()
+
+    def run(self):
+        while not self.stop.is_set():
+            start = time.perf_counter()
+            db.add_expense_db("دخل", 1, "bench")
+            self.latencies.append(time.perf_counter() - start)
+            self.stop.wait(self.interval)
+        db.close_all()
+
+    def summary(self):
+        ordered = sorted(self.latencies) or [0.0]
+        return (f"{len(ordered)} writes, p50 {statistics.median(ordered) * 1000:.1f} ms, "
+                f"max {ordered[-1] * 1000:.1f} ms")
+
+
+def with_writer(interval, fn):
+    writer = Writer(interval)
+    writer.start()
+    try:
+        return fn(), writer
+    finally:
+        writer.stop.set()
+        writer.join()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", choices=sorted(SIZES), default="large")
+    parser.add_argument("--pages", type=int, default=backup.PAGES)
+    parser.add_argument("--write-interval", type=float, default=0.01)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        start = time.perf_counter()
+        generate(path, **SIZES[args.size])
+        db.get_conn().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        print(f"size={args.size}: {os.path.getsize(path) / 1e6:.1f} MB generated in {time.perf_counter() - start:.1f}s")
+
+        runs = [("stepped", dict(pages=args.pages)), ("single step", dict(pages=-1))]
+        results = {}
+        for name, kwargs in runs:
+            results[name], writer = with_writer(args.write_interval, lambda: backup.take_backup(keep=None, **kwargs))
+            r = results[name]
+            print(f"{name:<12} copy {r['copy_seconds']:6.2f}s  integrity_check {r['check_seconds']:6.2f}s  "
+                  f"restarts {r['restarts']}  writer: {writer.summary()}")
+
+        start = time.perf_counter()
+        _, writer = with_writer(args.write_interval, lambda: shutil.copyfile(path, os.path.join(tmp, "copy.db")))
+        print(f"{'file copy':<12} copy {time.perf_counter() - start:6.2f}s  (not consistent while writing)  "
+              f"writer: {writer.summary()}")
+
+        snapshot = results["stepped"]["path"]
+        db.add_expense_db("دخل", 1, "after the snapshot")
+        restored = backup.restore_backup(snapshot)
+        print(f"{'restore':<12} {restored['seconds']:6.2f}s (includes a safety snapshot of the current state)")
+        leftover = db.get_conn().execute("SELECT 1 FROM expenses WHERE description = 'after the snapshot'").fetchone()
+        if leftover or backup.check_integrity(path):
+            print("FAIL: restore did not bring back the snapshot", file=sys.stderr)
+            return 1
+        print(f"OK: restored report {db.compute_report()}")
+        db.close_all()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+# bench_concurrency.py - parallel readers and writers against one local DB
+#
+#   python benchmarks/bench_concurrency.py [--readers 4] [--writers 2] [--seconds 5]
+#
+# Runs the same workload twice: with the old defaults (rollback journal,
+# FULL sync, no busy timeout) and with db.py's tuned settings, and reports
+# throughput, "database is locked" errors and time spent waiting on locks.
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db  # noqa: E402
+
+MODES = {
+    "legacy": dict(journal_mode="DELETE", synchronous="FULL", busy_timeout_ms=0, cache_size_kb=2000, mmap_size=0),
+    "tuned": dict(journal_mode="WAL", synchronous="NORMAL", busy_timeout_ms=5000,
+                  cache_size_kb=db.CACHE_SIZE_KB, mmap_size=db.MMAP_SIZE),
+}
+
+
+def seed(n_clients, n_days):
+    db.init_db()
+    with db.transaction() as c:
+        c.executemany("INSERT INTO clients (name, phone, daily_rate) VALUES (?, ?, 150)",
+                      [(f"عامل {i}", f"010{i:08d}") for i in range(n_clients)])
+        c.executemany("INSERT INTO attendance (client_id, date) VALUES (?, ?)",
+                      [(cid, f"2024-01-{d:02d}") for d in range(1, n_days + 1) for cid in range(1, n_clients + 1, 2)])
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def run(mode, readers, writers, seconds, n_clients):
+    stop = threading.Event()
+    lock = threading.Lock()
+    stats = {"reads": 0, "writes": 0, "locked": 0, "read_ms": [], "write_ms": []}
+
+    def reader():
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                db.get_report_data()
+                db.fetch_clients(limit=50)
+                db.get_attendance_ids("2024-01-05")
+                db.get_range_report("2024-01-01", "2024-01-31")
+            except sqlite3.OperationalError:
+                with lock:
+                    stats["locked"] += 1
+                continue
+            with lock:
+                stats["reads"] += 1
+                stats["read_ms"].append((time.perf_counter() - start) * 1000)
+
+    def writer(seed_):
+        rnd = random.Random(seed_)
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                cid = rnd.randint(1, n_clients)
+                db.toggle_attendance_db(cid, f"2024-01-{rnd.randint(1, 28):02d}", rnd.random() < 0.5)
+                db.add_payment_db(cid, 100, "دفع")
+            except sqlite3.OperationalError:
+                with lock:
+                    stats["locked"] += 1
+                continue
+            with lock:
+                stats["writes"] += 1
+                stats["write_ms"].append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    print(f"{mode:<8} reads/s {stats['reads'] / seconds:8.0f}   writes/s {stats['writes'] / seconds:7.0f}   "
+          f"locked errors {stats['locked']:5d}   "
+          f"read p50/p99 {percentile(stats['read_ms'], .5):6.2f}/{percentile(stats['read_ms'], .99):7.2f} ms   "
+          f"write p50/p99 {percentile(stats['write_ms'], .5):6.2f}/{percentile(stats['write_ms'], .99):7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--clients", type=int, default=2000)
+    args = parser.parse_args()
+
+    for mode, settings in MODES.items():
+        with tempfile.TemporaryDirectory() as tmp:
+            db.configure(**settings)
+            db.set_db_path(os.path.join(tmp, f"{mode}.db"))
+            seed(args.clients, 28)
+            run(mode, args.readers, args.writers, args.seconds, args.clients)
+            db.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# bench_connections.py - per-operation latency: connect-per-call vs pooled db.py
+#
+#   python benchmarks/bench_connections.py [--clients 2000] [--repeat 300]
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db  # noqa: E402
+
+TODAY = "2024-01-01"
+
+
+# -------------------- OLD HELPERS (connect per call) --------------------
+def legacy_fetch_clients(path):
+    conn = sqlite3.connect(path)
+    c = conn.cursor()
+    c.execute("SELECT id, name, phone, daily_rate, days_worked FROM clients ORDER BY name")
+    rows = c.fetchall()
+    conn.close()
+    return rows
+
+
+def legacy_get_attendance_ids(path, date_str):
+    conn = sqlite3.connect(path)
+    c = conn.cursor()
+    c.execute("SELECT client_id FROM attendance WHERE date=?", (date_str,))
+    ids = [r[0] for r in c.fetchall()]
+    conn.close()
+    return ids
+
+
+def legacy_toggle_attendance_db(path, cid, date_str, is_present):
+    conn = sqlite3.connect(path)
+    c = conn.cursor()
+    c.execute("PRAGMA foreign_keys = ON")
+    c.execute("SELECT id FROM attendance WHERE client_id=? AND date=?", (cid, date_str))
+    exists = c.fetchone()
+    if is_present and not exists:
+        c.execute("INSERT INTO attendance (client_id, date) VALUES (?, ?)", (cid, date_str))
+        c.execute("UPDATE clients SET days_worked = days_worked + 1 WHERE id=?", (cid,))
+    elif not is_present and exists:
+        c.execute("DELETE FROM attendance WHERE client_id=? AND date=?", (cid, date_str))
+        c.execute("UPDATE clients SET days_worked = days_worked - 1 WHERE id=?", (cid,))
+    conn.commit()
+    conn.close()
+
+
+def legacy_get_payments(path, cid):
+    conn = sqlite3.connect(path)
+    c = conn.cursor()
+    c.execute("SELECT id, amount, type, date FROM payments WHERE client_id=? ORDER BY date DESC", (cid,))
+    rows = c.fetchall()
+    conn.close()
+    return rows
+
+
+def legacy_get_report_data(path):
+    conn = sqlite3.connect(path)
+    c = conn.cursor()
+    c.execute("SELECT COUNT(*) FROM clients")
+    c.fetchone()
+    c.execute("SELECT SUM(days_worked) FROM clients")
+    c.fetchone()
+    c.execute("SELECT SUM(amount) FROM expenses WHERE type='دخل'")
+    c.fetchone()
+    c.execute("SELECT SUM(amount) FROM expenses WHERE type='مصروف'")
+    c.fetchone()
+    conn.close()
+
+
+# -------------------- HARNESS --------------------
+def seed(n_clients):
+    db.init_db()
+    with db.transaction() as c:
+        c.executemany(
+            "INSERT INTO clients (name, phone, daily_rate, days_worked) VALUES (?, ?, ?, 0)",
+            [(f"عامل {i}", f"010{i:08d}", 150) for i in range(n_clients)],
+        )
+        c.executemany(
+            "INSERT INTO payments (client_id, amount, type, date) VALUES (?, ?, ?, ?)",
+            [(i % n_clients + 1, 100, "دفع", TODAY) for i in range(n_clients * 2)],
+        )
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for i in range(repeat):
+        fn(i)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=300)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        db.set_db_path(path)
+        seed(args.clients)
+        n = args.clients
+
+        cases = [
+            ("fetch_clients",
+             lambda i: legacy_fetch_clients(path),
+             lambda i: db.fetch_clients()),
+            ("get_attendance_ids",
+             lambda i: legacy_get_attendance_ids(path, TODAY),
+             lambda i: db.get_attendance_ids(TODAY)),
+            ("toggle_attendance_db",
+             lambda i: legacy_toggle_attendance_db(path, i % n + 1, TODAY, i % 2 == 0),
+             lambda i: db.toggle_attendance_db(i % n + 1, TODAY, i % 2 == 0)),
+            ("get_payments",
+             lambda i: legacy_get_payments(path, i % n + 1),
+             lambda i: db.get_payments(i % n + 1)),
+            ("get_report_data",
+             lambda i: legacy_get_report_data(path),
+             lambda i: db.get_report_data()),
+        ]
+
+        print(f"{'operation':<24}{'per-call µs':>14}{'pooled µs':>14}{'speedup':>10}")
+        for name, legacy, pooled in cases:
+            before = timed(legacy, args.repeat)
+            after = timed(pooled, args.repeat)
+            print(f"{name:<24}{before:>14.1f}{after:>14.1f}{before / after:>9.1f}x")
+        db.close_all()
+
+
+if __name__ == "__main__":
+    main()
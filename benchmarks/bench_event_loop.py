@@ -0,0 +1,115 @@
+# bench_event_loop.py - does the event loop stay responsive during a long export?
+#
+#   python benchmarks/bench_event_loop.py [--clients 5000] [--days 120] [--max-lag-ms 100]
+#
+# A ticker coroutine measures how late each 10 ms sleep wakes up while the full
+# ledger export runs, first called straight from a coroutine (the old way),
+# then awaited through db_async. Short queries are awaited alongside to show
+# they are still answered. Exits 1 if the db_async run lags more than allowed.
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db  # noqa: E402
+import db_async  # noqa: E402
+import export  # noqa: E402
+
+TICK = 0.01
+
+
+def seed(n_clients, n_days):
+    db.init_db()
+    rnd = random.Random(3)
+    days = [f"2024-{m:02d}-{d:02d}" for m in range(1, 13) for d in range(1, 29)][:n_days]
+    with db.transaction() as c:
+        c.executemany(
+            "INSERT INTO clients (name, phone, daily_rate, days_worked) VALUES (?, ?, ?, 0)",
+            [(f"عامل {i}", f"010{i:08d}", 150) for i in range(n_clients)],
+        )
+        c.executemany(
+            "INSERT INTO attendance (client_id, date) VALUES (?, ?)",
+            [(cid, day) for day in days for cid in range(1, n_clients + 1) if rnd.random() < 0.6],
+        )
+        c.executemany(
+            "INSERT INTO payments (client_id, amount, type, date) VALUES (?, ?, ?, ?)",
+            [(rnd.randint(1, n_clients), 100, "دفع", rnd.choice(days)) for _ in range(n_clients * 10)],
+        )
+
+
+async def ticker(stop, lags):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - start - TICK)
+
+
+async def queries(stop, latencies):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await db_async.get_report_data()
+        await db_async.fetch_clients(limit=50)
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.05)
+
+
+async def measure(export_coro_fn):
+    stop = asyncio.Event()
+    lags, latencies = [], []
+    tasks = [asyncio.create_task(ticker(stop, lags)), asyncio.create_task(queries(stop, latencies))]
+    await asyncio.sleep(0.1)
+    start = time.perf_counter()
+    counts = await export_coro_fn()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await asyncio.gather(*tasks)
+    return elapsed, sum(counts.values()), lags, latencies
+
+
+def fmt(lags):
+    lags = sorted(lags) or [0.0]
+    p99 = lags[min(len(lags) - 1, int(len(lags) * 0.99))]
+    return f"max lag {lags[-1] * 1000:8.1f} ms   p99 {p99 * 1000:7.1f} ms   ticks {len(lags)}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=120)
+    parser.add_argument("--max-lag-ms", type=float, default=100.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.set_db_path(os.path.join(tmp, "bench.db"))
+        seed(args.clients, args.days)
+        out_dir = os.path.join(tmp, "exports")
+
+        async def blocking():
+            return export.export_all(out_dir)
+
+        async def awaited():
+            return await db_async.export_all(out_dir)
+
+        t_block, rows, lag_block, _ = asyncio.run(measure(blocking))
+        t_async, _, lag_async, latencies = asyncio.run(measure(awaited))
+        db_async.shutdown()
+        db.close_all()
+
+    print(f"exported {rows} rows")
+    print(f"blocking export   {t_block:6.2f}s   {fmt(lag_block)}")
+    print(f"db_async export   {t_async:6.2f}s   {fmt(lag_async)}")
+    if latencies:
+        print(f"queries during db_async export: {len(latencies)}, slowest {max(latencies) * 1000:.1f} ms")
+    worst = max(lag_async, default=0.0) * 1000
+    if worst > args.max_lag_ms:
+        print(f"FAIL: event loop lagged {worst:.1f} ms > {args.max_lag_ms} ms", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
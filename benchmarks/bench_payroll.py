@@ -0,0 +1,75 @@
+# bench_payroll.py - set-based payroll vs opening every worker's profile
+#
+#   python benchmarks/bench_payroll.py [--workers 10000] [--payments 50]
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db  # noqa: E402
+import payroll  # noqa: E402
+
+
+def seed(n_workers, payments_per_worker):
+    db.init_db()
+    rnd = random.Random(7)
+    with db.transaction() as c:
+        c.executemany(
+            "INSERT INTO clients (name, phone, daily_rate, days_worked) VALUES (?, ?, ?, ?)",
+            [(f"عامل {i}", f"010{i:08d}", rnd.choice((120, 150, 200)), rnd.randint(0, 300)) for i in range(n_workers)],
+        )
+        c.executemany(
+            "INSERT INTO payments (client_id, amount, type, date) VALUES (?, ?, ?, ?)",
+            [(rnd.randint(1, n_workers), rnd.randint(50, 500), rnd.choice(("دفع", "سلفة")), "2024-01-01")
+             for _ in range(n_workers * payments_per_worker)],
+        )
+
+
+def per_worker_payroll():
+    # what finding every balance costs today: open each profile in turn
+    out = []
+    for cid, _, _, rate, days in db.fetch_clients():
+        payments = db.get_payments(cid)
+        paid = sum(a for _, a, t, _ in payments if t == "دفع")
+        adv = sum(a for _, a, t, _ in payments if t == "سلفة")
+        out.append((cid, (rate or 0) * (days or 0) - paid - adv))
+    return out
+
+
+def timed(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=10000)
+    parser.add_argument("--payments", type=int, default=50, help="payments per worker")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.set_db_path(os.path.join(tmp, "bench.db"))
+        seed(args.workers, args.payments)
+
+        loop_ms, loop_rows = timed(per_worker_payroll, repeat=1)
+        sql_ms, rows = timed(payroll.compute_payroll)
+        assert {cid: round(bal, 2) for cid, bal in loop_rows} == {r[0]: round(r[7], 2) for r in rows}
+        what_if_ms, _ = timed(lambda: payroll.what_if_balances(rows, scale=1.1))
+
+        print(f"workers={args.workers} payments={args.workers * args.payments}")
+        print(f"per-worker profile loop   {loop_ms:10.1f} ms")
+        print(f"compute_payroll (1 query) {sql_ms:10.1f} ms")
+        engine = "numpy" if payroll.np is not None else "python"
+        print(f"what_if_balances ({engine:<6}) {what_if_ms:9.1f} ms")
+        db.close_all()
+
+
+if __name__ == "__main__":
+    main()
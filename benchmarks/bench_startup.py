@@ -0,0 +1,102 @@
+# bench_startup.py - app startup work before the home screen's first frame
+#
+#   python benchmarks/bench_startup.py [--clients 10000] [--target-ms 100] [--runs 5]
+#
+# Each run is a fresh interpreter that imports what the app imports and does
+# the DB work that happens before home is shown:
+#   eager - the old path: init_db twice, then fill the clients, attendance,
+#           expenses and report screens up front
+#   lazy  - the current path: one init_db (a single user_version check on an
+#           up-to-date file); other screens query on their first visit
+# Flet itself is not imported (rendering is not measured here); when it is
+# installed its import time is reported separately. Exits 1 if the lazy path's
+# median exceeds --target-ms.
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from datagen import generate  # noqa: E402
+import db  # noqa: E402
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {root!r})
+import db, db_async, export, payroll, attendance_buffer, diagnostics
+imported = time.perf_counter()
+db.set_db_path({path!r})
+db.init_db()
+if {eager!r}:
+    db.init_db()
+    db.fetch_clients(limit=50)
+    set(db.get_attendance_ids(db._today()))
+    db.fetch_clients()
+    db.get_expenses()
+    db.compute_report()
+done = time.perf_counter()
+print(json.dumps({{"import_ms": (imported - start) * 1000, "db_ms": (done - imported) * 1000,
+                   "total_ms": (done - start) * 1000}}))
+"""
+
+
+def run_child(path, eager):
+    code = CHILD.format(root=ROOT, path=path, eager=eager)
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    result = json.loads(out)
+    result["process_ms"] = (time.perf_counter() - start) * 1000
+    return result
+
+
+def flet_import_ms():
+    code = "import time; s = time.perf_counter(); import flet; print((time.perf_counter() - s) * 1000)"
+    proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    return float(proc.stdout) if proc.returncode == 0 else None
+
+
+def median_of(runs, key):
+    return statistics.median(r[key] for r in runs)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=10000)
+    parser.add_argument("--attendance", type=int, default=300_000)
+    parser.add_argument("--payments", type=int, default=100_000)
+    parser.add_argument("--expenses", type=int, default=20_000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--target-ms", type=float, default=100.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "startup.db")
+        generate(path, args.clients, args.attendance, args.payments, args.expenses)
+        db.close_all()
+        results = {mode: [run_child(path, mode == "eager") for _ in range(args.runs)] for mode in ("eager", "lazy")}
+
+    print(f"clients={args.clients} attendance={args.attendance} payments={args.payments} runs={args.runs}")
+    print(f"{'path':<8}{'imports ms':>12}{'db ms':>10}{'total ms':>10}{'process ms':>12}")
+    for mode, runs in results.items():
+        print(f"{mode:<8}{median_of(runs, 'import_ms'):>12.1f}{median_of(runs, 'db_ms'):>10.1f}"
+              f"{median_of(runs, 'total_ms'):>10.1f}{median_of(runs, 'process_ms'):>12.1f}")
+    flet_ms = flet_import_ms()
+    print(f"import flet: {'not installed' if flet_ms is None else f'{flet_ms:.1f} ms'}")
+
+    lazy = median_of(results["lazy"], "total_ms")
+    if lazy > args.target_ms:
+        print(f"FAIL: startup work {lazy:.1f} ms > target {args.target_ms} ms", file=sys.stderr)
+        return 1
+    print(f"OK: startup work {lazy:.1f} ms <= target {args.target_ms} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+# bench_suite.py - time every DB helper and screen load at several dataset sizes
+#
+#   python benchmarks/bench_suite.py [--sizes small,medium,large] [--out bench_results.json]
+#   python benchmarks/bench_suite.py --sizes small --baseline old.json [--tolerance 0.25]
+#
+# Each size is generated once with datagen.py into a temp DB. A "screen" case
+# runs the same DB calls its screen makes when it is opened. Results are
+# written as JSON; with --baseline, cases slower than the baseline's median by
+# more than --tolerance are listed and the exit status is 1.
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db  # noqa: E402
+import payroll  # noqa: E402
+from datagen import SIZES, generate  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def cases(n_clients, days):
+    rnd = random.Random(5)
+    day = days[len(days) // 2]
+    month_start, month_end = days[-1][:8] + "01", days[-1]
+
+    def cid():
+        return rnd.randint(1, n_clients)
+
+    def cold_client():
+        i = cid()
+        db.invalidate_client_cache(i)
+        return db.get_client(i)
+
+    def toggle():
+        i = cid()
+        present.symmetric_difference_update((i,))
+        db.toggle_attendance_db(i, day, i in present)
+
+    present = set(db.get_attendance_ids(day))
+    helpers = {
+        "fetch_clients(all)": lambda: db.fetch_clients(),
+        "fetch_clients(page)": lambda: db.fetch_clients(limit=50),
+        "search_clients": lambda: db.search_clients("محمد"),
+        "get_client(cold)": cold_client,
+        "get_client(cached)": lambda: db.get_client(1),
+        "get_attendance_ids": lambda: db.get_attendance_ids(day),
+        "toggle_attendance_db": toggle,
+        "get_payments": lambda: db.get_payments(cid()),
+        "get_expenses": lambda: db.get_expenses(),
+        "get_report_data": lambda: db.get_report_data(),
+        "get_range_report(month)": lambda: db.get_range_report(month_start, month_end),
+        "compute_payroll": lambda: payroll.compute_payroll(),
+    }
+
+    def payroll_screen():
+        rows = payroll.compute_payroll()
+        payroll.payroll_totals(rows)
+        payroll.what_if_balances(rows, scale=1.1)
+
+    screens = {
+        "screen:clients": lambda: db.fetch_clients(limit=50),
+        "screen:client_details": lambda: (lambda i: (db.get_client(i), db.get_payments(i)))(cid()),
+        "screen:attendance": lambda: (db.get_attendance_ids(day), db.fetch_clients()),
+        "screen:expenses": lambda: db.get_expenses(),
+        "screen:report": lambda: (db.get_report_data(), db.get_range_report(month_start, month_end)),
+        "screen:payroll": payroll_screen,
+    }
+    return [("helper", name, fn) for name, fn in helpers.items()] + [("screen", name, fn) for name, fn in screens.items()]
+
+
+def measure(fn, min_runs, budget):
+    # at least min_runs calls, more while under `budget` seconds
+    times = []
+    deadline = time.perf_counter() + budget
+    while len(times) < min_runs or (time.perf_counter() < deadline and len(times) < 1000):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return {
+        "runs": len(times),
+        "min_ms": round(times[0], 4),
+        "median_ms": round(statistics.median(times), 4),
+        "p95_ms": round(times[min(len(times) - 1, int(len(times) * 0.95))], 4),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    before = {(r["size"], r["name"]): r["median_ms"] for r in baseline["results"]}
+    slower = []
+    for r in results:
+        old = before.get((r["size"], r["name"]))
+        if old and r["median_ms"] > old * (1 + tolerance):
+            slower.append((r["size"], r["name"], old, r["median_ms"]))
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="small,medium", help=f"comma separated, from {', '.join(SIZES)}")
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--min-runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=1.0, help="seconds per case")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed median slowdown, 0.25 = 25%%")
+    args = parser.parse_args()
+
+    sizes = [s.strip() for s in args.sizes.split(",") if s.strip()]
+    for size in sizes:
+        if size not in SIZES:
+            parser.error(f"unknown size {size!r}")
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            counts = SIZES[size]
+            start = time.perf_counter()
+            days = generate(os.path.join(tmp, f"{size}.db"), **counts)
+            print(f"== {size}: " + ", ".join(f"{k}={v}" for k, v in counts.items())
+                  + f" (generated in {time.perf_counter() - start:.1f}s)")
+            for kind, name, fn in cases(counts["clients"], days):
+                stats = measure(fn, args.min_runs, args.budget)
+                results.append({"size": size, "kind": kind, "name": name, **counts, **stats})
+                print(f"   {name:<26}{stats['median_ms']:>10.3f} ms median{stats['p95_ms']:>10.3f} ms p95")
+            db.close_all()
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git": git_revision(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+    print(f"wrote {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            slower = compare(results, json.load(f), args.tolerance)
+        for size, name, old, new in slower:
+            print(f"REGRESSION {size} {name}: {old:.3f} -> {new:.3f} ms", file=sys.stderr)
+        return 1 if slower else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+# bench_sync.py - bytes moved by a delta sync versus copying the whole database file
+#
+#   python benchmarks/bench_sync.py [--size medium] [--workers 200]
+#
+# Generates the office DB, makes a phone copy of it with sync.make_copy, then
+# edits both the way a day of work does: the phone marks attendance and
+# records payments and expenses, the office edits clients (one of them on
+# both sides, a conflict) and adds expenses. The phone then syncs through an
+# in-process stand-in for the HTTP endpoint (JSON both ways, as on the wire)
+# and the two copies are compared row by row. Exits 1 if they differ.
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import tempfile
+from contextlib import closing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from datagen import SIZES, generate  # noqa: E402
+import db  # noqa: E402
+import sync  # noqa: E402
+
+
+def contents(conn):
+    # both copies, keyed by uid so local ids may differ
+    return (
+        conn.execute("SELECT uid, name, phone, daily_rate, days_worked FROM clients ORDER BY uid").fetchall(),
+        conn.execute("SELECT c.uid, a.date FROM attendance a JOIN clients c ON c.id = a.client_id "
+                     "ORDER BY 1, 2").fetchall(),
+        conn.execute("SELECT p.uid, c.uid, p.amount, p.type, p.date FROM payments p "
+                     "JOIN clients c ON c.id = p.client_id ORDER BY 1").fetchall(),
+        conn.execute("SELECT uid, type, amount, description, date FROM expenses ORDER BY uid").fetchall(),
+        conn.execute("SELECT * FROM report_summary").fetchall(),
+    )
+
+
+def stand_in(office):
+    # what serve() does for one POST, minus the socket; records the gzip sizes
+    wire = {"up": 0, "down": 0}
+
+    def send(request):
+        body = gzip.compress(sync._encode(request))
+        wire["up"] += len(body)
+        response = gzip.compress(sync._encode(sync.handle_sync(office, json.loads(gzip.decompress(body)))))
+        wire["down"] += len(response)
+        return json.loads(gzip.decompress(response))
+    return send, wire
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", choices=sorted(SIZES), default="medium")
+    parser.add_argument("--workers", type=int, default=200, help="workers marked present on the phone")
+    args = parser.parse_args()
+    rnd = random.Random(7)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        office_path, phone_path = os.path.join(tmp, "office.db"), os.path.join(tmp, "phone.db")
+        generate(office_path, **SIZES[args.size])
+        url = "http://office:8765/sync"
+        copied = sync.make_copy(phone_path, url)
+        n_clients = SIZES[args.size]["clients"]
+        day = "2030-01-01"  # after every generated day
+        shared = rnd.randint(1, n_clients)
+
+        db.set_db_path(phone_path)
+        db.apply_attendance_changes([(cid, day, True) for cid in rnd.sample(range(1, n_clients + 1), args.workers)])
+        for _ in range(20):
+            db.add_payment_db(rnd.randint(1, n_clients), 100, "دفع")
+        for _ in range(5):
+            db.add_expense_db("مصروف", 50, "phone")
+        db.update_client_db(shared, "edited on the phone", "0100", 150)
+        db.delete_payment_db(1)
+        db.close_all()
+
+        db.set_db_path(office_path)
+        db.update_client_db(shared, "edited in the office", "0111", 175)  # the later edit: it wins
+        for cid in rnd.sample(range(1, n_clients + 1), 10):
+            client = db.get_client(cid)
+            db.update_client_db(cid, client[1], client[2], (client[3] or 0) + 10)
+        for _ in range(10):
+            db.add_expense_db("دخل", 500, "office")
+        db.close_all()
+
+        with closing(db.open_connection(office_path)) as office, closing(db.open_connection(phone_path)) as phone:
+            transport, wire = stand_in(office)
+            first = sync.sync(phone, transport, url)
+            second = sync.sync(phone, transport, url)
+            same = contents(phone) == contents(office)
+            winner = phone.execute("SELECT name FROM clients WHERE id = ?", (shared,)).fetchone()[0]
+
+    print(f"size={args.size}: whole-file copy {copied['bytes'] / 1e6:.1f} MB")
+    for name, r in (("first sync", first), ("second sync", second)):
+        print(f"{name:<12} sent {r['sent']:4d} changes {r['bytes_sent'] / 1024:7.1f} KB, "
+              f"received {r['received']:4d} changes {r['bytes_received'] / 1024:7.1f} KB, "
+              f"{r['seconds'] * 1000:6.1f} ms")
+    print(f"gzip on the wire, both syncs: up {wire['up'] / 1024:.1f} KB, down {wire['down'] / 1024:.1f} KB")
+    print(f"conflict on client {shared}: kept {winner!r}")
+    if not same or winner != "edited in the office":
+        print("FAIL: the copies differ after syncing", file=sys.stderr)
+        return 1
+    print("OK: both copies hold the same rows")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+# datagen.py - realistic synthetic databases for benchmarks
+#
+#   python benchmarks/datagen.py out.db --size large
+#   python benchmarks/datagen.py out.db --clients 3000 --attendance 300000 --payments 80000
+#
+# Workers get Arabic names and Egyptian mobile numbers, attendance is spread
+# over consecutive working days, payments and expenses over the same period.
+# Everything goes through the normal schema (init_db) so the triggers, FTS and
+# rollups are populated exactly as in production.
+import argparse
+import math
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db  # noqa: E402
+
+SIZES = {
+    "small": {"clients": 500, "attendance": 50_000, "payments": 10_000, "expenses": 2_000},
+    "medium": {"clients": 2_000, "attendance": 400_000, "payments": 100_000, "expenses": 10_000},
+    "large": {"clients": 10_000, "attendance": 2_000_000, "payments": 500_000, "expenses": 50_000},
+}
+
+FIRST_NAMES = (
+    "محمد", "أحمد", "محمود", "مصطفى", "علي", "حسن", "حسين", "إبراهيم", "يوسف", "عمر",
+    "خالد", "سعيد", "عبد الله", "عبد الرحمن", "طارق", "كريم", "ياسر", "هشام", "وليد", "سامح",
+    "فاطمة", "مريم", "نور", "سارة", "هدى", "منى", "آية", "دعاء", "رحاب", "أسماء",
+)
+FAMILY_NAMES = (
+    "السيد", "عبد العزيز", "الشافعي", "المصري", "حسانين", "عبد الحميد", "النجار", "الحداد",
+    "سليمان", "عثمان", "رمضان", "شعبان", "البنا", "الجمال", "فرج", "عطية", "منصور", "زكي",
+)
+EXPENSE_DESCRIPTIONS = ("مواد خام", "نقل", "كهرباء", "إيجار", "صيانة", "أدوات", "توريد", "دفعة عميل")
+DAILY_RATES = (120, 150, 180, 200, 250)
+PRESENCE = 0.8  # share of workers present on a working day
+START = date(2023, 1, 1)
+
+
+def worker_name(rnd):
+    return f"{rnd.choice(FIRST_NAMES)} {rnd.choice(FIRST_NAMES)} {rnd.choice(FAMILY_NAMES)}"
+
+
+def generate(path, clients, attendance, payments, expenses, seed=1):
+    """Create a populated database at `path`; returns the list of days used."""
+    rnd = random.Random(seed)
+    n_days = max(1, math.ceil(attendance / (clients * PRESENCE)))
+    days = [(START + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(n_days)]
+
+    def attendance_rows():
+        left = attendance
+        for day in days:
+            for cid in range(1, clients + 1):
+                if left and rnd.random() < PRESENCE:
+                    left -= 1
+                    yield cid, day
+
+    db.set_db_path(path)
+    db.init_db()
+    with db.transaction() as c:
+        c.executemany(
+            "INSERT INTO clients (name, phone, daily_rate, days_worked) VALUES (?, ?, ?, 0)",
+            ((worker_name(rnd), f"01{rnd.choice('0125')}{rnd.randrange(10**8):08d}", rnd.choice(DAILY_RATES))
+             for _ in range(clients)),
+        )
+        c.executemany("INSERT OR IGNORE INTO attendance (client_id, date) VALUES (?, ?)", attendance_rows())
+        c.executemany(
+            "INSERT INTO payments (client_id, amount, type, date) VALUES (?, ?, ?, ?)",
+            ((rnd.randint(1, clients), rnd.randrange(50, 1000, 50), "دفع" if rnd.random() < 0.7 else "سلفة", rnd.choice(days))
+             for _ in range(payments)),
+        )
+        c.executemany(
+            "INSERT INTO expenses (type, amount, description, date) VALUES (?, ?, ?, ?)",
+            (("دخل" if rnd.random() < 0.4 else "مصروف", rnd.randrange(100, 20000, 10),
+              rnd.choice(EXPENSE_DESCRIPTIONS), rnd.choice(days))
+             for _ in range(expenses)),
+        )
+    db.get_conn().execute("ANALYZE")
+    return days
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic database")
+    parser.add_argument("path")
+    parser.add_argument("--size", choices=sorted(SIZES), default="small")
+    for key in SIZES["small"]:
+        parser.add_argument(f"--{key}", type=int, help=f"override the preset's {key} count")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    counts = dict(SIZES[args.size])
+    counts.update({k: getattr(args, k) for k in counts if getattr(args, k) is not None})
+    if os.path.exists(args.path):
+        parser.error(f"{args.path} already exists")
+    days = generate(args.path, seed=args.seed, **counts)
+    print(f"{args.path}: " + ", ".join(f"{k}={v}" for k, v in counts.items()) + f", days={len(days)}")
+    db.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+# cli.py - reports, exports and maintenance from the command line, without starting the GUI
+#
+#   python cli.py [--db path.db] report [--period month | --from 2025-01-01 --to 2025-01-31] [--json]
+#   python cli.py [--db path.db] payroll [--raise 10] [--csv payroll.csv]
+#   python cli.py [--db path.db] export exports/ [--only payments expenses]
+#   python cli.py [--db path.db] import attendance january.csv [--rejects rejected.csv]
+#   python cli.py [--db path.db] backup [--keep 7 | --list | --restore SNAPSHOT]
+#   python cli.py [--db path.db] vacuum | analyze | rebuild-summary
+#   python cli.py [--db path.db] reconcile | archive | sync | api [their own options]
+#
+# Only the data layer is imported (never flet), and each subcommand imports
+# just the modules it needs when it runs, so a cron job pays for the command
+# it asks for and nothing else. import, backup, reconcile, archive, sync and
+# api hand their arguments to those modules' own command lines.
+import argparse
+import sys
+import time
+
+# subcommand -> module whose main(argv) takes over the remaining arguments
+DELEGATED = {
+    "import": "importer",
+    "backup": "backup",
+    "reconcile": "reconcile",
+    "archive": "archive",
+    "sync": "sync",
+    "api": "api",
+}
+
+
+def _iso_date(value):
+    from datetime import date
+    return date.fromisoformat(value).strftime("%Y-%m-%d")
+
+
+def _print_json(data):
+    import json
+    print(json.dumps(data, ensure_ascii=False, indent=2))
+
+
+def cmd_report(args):
+    import db
+    db.init_db()
+    if args.period or args.start:
+        start, end = db.period_range(args.period) if args.period else (args.start, args.end)
+        attendance, income, expense, paid, advances, net = db.get_range_report(start, end)
+        data = {"from": start, "to": end, "attendance": attendance, "income": income, "expense": expense,
+                "payments": paid, "advances": advances, "net": net}
+    else:
+        n_clients, attendance, income, expense, net = db.compute_report()
+        data = {"clients": n_clients, "attendance": attendance, "income": income, "expense": expense, "net": net}
+    if args.json:
+        _print_json(data)
+    else:
+        for key, value in data.items():
+            print(f"{key:<11} {value}")
+    return 0
+
+
+def cmd_payroll(args):
+    import db
+    from payroll import compute_payroll, payroll_totals, what_if_balances
+    db.init_db()
+    rows = compute_payroll()
+    n, earned, paid, advances, balance = payroll_totals(rows)
+    print(f"workers {n}  earned {earned}  paid {paid}  advances {advances}  balance {balance}")
+    if args.raise_pct:
+        _, total = what_if_balances(rows, scale=1 + args.raise_pct / 100)
+        print(f"balance if daily rates rose {args.raise_pct}%: {total:.2f}")
+    if args.csv:
+        import csv
+        with open(args.csv, "w", newline="", encoding="utf-8-sig") as f:
+            writer = csv.writer(f)
+            writer.writerow(["id", "name", "daily_rate", "days", "earned", "paid", "advances", "balance"])
+            writer.writerows(rows)
+        print(f"{len(rows)} rows written to {args.csv}")
+    return 0
+
+
+def cmd_export(args):
+    import db
+    from export import export_all
+    db.init_db()
+    start = time.perf_counter()
+    counts = export_all(args.out_dir, args.only)
+    for name, n in counts.items():
+        print(f"{name:<11} {n} rows")
+    print(f"exported to {args.out_dir} in {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+def _db_bytes(path):
+    import os
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+
+
+def cmd_vacuum(args):
+    # rewrites the whole file: run it when the apps are idle (e.g. at night)
+    import db
+    db.init_db()
+    before, start = _db_bytes(db.DB), time.perf_counter()
+    conn = db.get_conn()
+    conn.execute("VACUUM")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    print(f"{db.DB}: {before / 1e6:.1f} MB -> {_db_bytes(db.DB) / 1e6:.1f} MB "
+          f"in {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+def cmd_analyze(args):
+    import db
+    db.init_db()
+    start = time.perf_counter()
+    db.get_conn().execute("ANALYZE")
+    print(f"{db.DB}: statistics refreshed in {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+def cmd_rebuild_summary(args):
+    import db
+    db.init_db()
+    n_clients, attendance, income, expense = db.rebuild_report_summary()
+    print(f"report_summary rebuilt: clients {n_clients}  attendance {attendance}  income {income}  expense {expense}")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Worker manager from the command line (no GUI)")
+    parser.add_argument("--db", help="database file (default: worker_manager_final.db)")
+    sub = parser.add_subparsers(dest="command", required=True, metavar="command")
+
+    p = sub.add_parser("report", help="all-time or date-range totals")
+    p.add_argument("--period", choices=("today", "week", "month"))
+    p.add_argument("--from", dest="start", type=_iso_date)
+    p.add_argument("--to", dest="end", type=_iso_date)
+    p.add_argument("--json", action="store_true", help="print JSON instead of text")
+    p.set_defaults(run=cmd_report)
+
+    p = sub.add_parser("payroll", help="earned, paid, advances and balance per worker")
+    p.add_argument("--raise", dest="raise_pct", type=float, default=0, help="also show balances with rates raised by %%")
+    p.add_argument("--csv", help="write every worker's row to this file")
+    p.set_defaults(run=cmd_payroll)
+
+    p = sub.add_parser("export", help="stream the ledgers to CSV files")
+    p.add_argument("out_dir")
+    p.add_argument("--only", nargs="+", metavar="NAME", help="clients, attendance, payments, expenses, statements")
+    p.set_defaults(run=cmd_export)
+
+    sub.add_parser("vacuum", help="rebuild the file to give free pages back").set_defaults(run=cmd_vacuum)
+    sub.add_parser("analyze", help="refresh the query planner's statistics").set_defaults(run=cmd_analyze)
+    sub.add_parser("rebuild-summary", help="recompute the report tables from the base tables").set_defaults(
+        run=cmd_rebuild_summary)
+
+    for name, module in DELEGATED.items():
+        sub.add_parser(name, help=f"python {module}.py with the same options", add_help=False)
+    return parser
+
+
+def _command_index(argv):
+    # position of the subcommand: the first word that is not --db or its value
+    i = 0
+    while i < len(argv):
+        if argv[i] == "--db":
+            i += 2
+        elif argv[i].startswith("-"):
+            i += 1
+        else:
+            return i
+    return None
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = build_parser()
+    # a delegated command's options belong to its module: parse only what precedes it
+    split = _command_index(argv)
+    if split is not None and argv[split] not in DELEGATED:
+        split = None
+    args = parser.parse_args(argv if split is None else argv[:split + 1])
+    if split is not None:
+        import importlib
+        rest = argv[split + 1:]
+        if args.db:
+            rest = ["--db", args.db] + rest
+        return importlib.import_module(DELEGATED[args.command]).main(rest)
+
+    if args.command == "report" and (args.start is None) != (args.end is None):
+        parser.error("report: give both --from and --to")
+    if args.db:
+        import db
+        db.set_db_path(args.db)
+    return args.run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,946 @@
+# db.py - shared data-access layer used by main.py, main.py.py and phone.app.py
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+# -------------------- DATABASE PATH --------------------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_NAME = "worker_manager_final.db"
+DB = os.path.join(BASE_DIR, DB_NAME)
+
+# -------------------- TUNING --------------------
+# Applied once when a connection is opened, not on every helper call.
+# WAL lets report queries run while another session writes; NORMAL sync is
+# durable across app crashes in WAL mode. Change these with configure().
+JOURNAL_MODE = "WAL"
+SYNCHRONOUS = "NORMAL"
+BUSY_TIMEOUT_MS = 5000         # wait this long for a lock before "database is locked"
+CACHE_SIZE_KB = 16 * 1024      # page cache per connection
+MMAP_SIZE = 64 * 1024 * 1024   # bytes of the file read through mmap
+
+
+def pragmas():
+    return (
+        "PRAGMA foreign_keys = ON",
+        f"PRAGMA journal_mode = {JOURNAL_MODE}",
+        f"PRAGMA synchronous = {SYNCHRONOUS}",
+        f"PRAGMA busy_timeout = {int(BUSY_TIMEOUT_MS)}",
+        f"PRAGMA cache_size = -{int(CACHE_SIZE_KB)}",
+        f"PRAGMA mmap_size = {int(MMAP_SIZE)}",
+    )
+
+
+def configure(journal_mode=None, synchronous=None, busy_timeout_ms=None, cache_size_kb=None, mmap_size=None):
+    """Change connection tuning; open connections are closed and reopen with it."""
+    global JOURNAL_MODE, SYNCHRONOUS, BUSY_TIMEOUT_MS, CACHE_SIZE_KB, MMAP_SIZE
+    if journal_mode is not None:
+        JOURNAL_MODE = journal_mode
+    if synchronous is not None:
+        SYNCHRONOUS = synchronous
+    if busy_timeout_ms is not None:
+        BUSY_TIMEOUT_MS = busy_timeout_ms
+    if cache_size_kb is not None:
+        CACHE_SIZE_KB = cache_size_kb
+    if mmap_size is not None:
+        MMAP_SIZE = mmap_size
+    close_all()
+
+# -------------------- CONNECTIONS --------------------
+# Every thread keeps one long-lived connection. Flet runs handlers on a thread
+# pool, so this gives each worker thread its own connection without locking
+# and without paying sqlite3.connect() on every helper call.
+_local = threading.local()
+_conns_lock = threading.Lock()
+_conns = []
+_generation = 0
+_connection_hooks = []
+_ready_db = None  # path whose schema init_db() has already brought up to date
+
+
+def set_db_path(path):
+    """Point the data layer at another database file and drop open connections.
+
+    Cached client rows belong to the old file, so the cache is cleared too.
+    """
+    global DB, _ready_db
+    with _conns_lock:
+        DB = path
+        _ready_db = None
+    close_all()
+    invalidate_client_cache()
+
+
+def _open(path):
+    # check_same_thread=False only so close_all() can close it from another
+    # thread; each connection is still used by the thread that opened it.
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+    for pragma in pragmas():
+        conn.execute(pragma)
+    for hook in _connection_hooks:
+        hook(conn)
+    return conn
+
+
+def add_connection_hook(fn):
+    """Call fn(conn) on every connection opened from now on (pooled or not)."""
+    _connection_hooks.append(fn)
+    close_all()
+
+
+def open_connection(path=None):
+    """A fresh, unpooled connection to `path` (default: the current DB); the caller closes it.
+
+    Meant for short-lived background jobs (exports, imports) so their thread
+    does not leave a pooled connection behind.
+    """
+    return _open(path or DB)
+
+
+def get_conn():
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.generation == _generation:
+        return conn
+    with _conns_lock:
+        conn = _open(DB)
+        _conns.append(conn)
+        _local.conn = conn
+        _local.generation = _generation
+    return conn
+
+
+def close_all():
+    """Close every pooled connection; threads reopen lazily on next use."""
+    global _generation
+    with _conns_lock:
+        conns = _conns[:]
+        _conns.clear()
+        _generation += 1
+    invalidate_client_cache()
+    for conn in conns:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+    _local.__dict__.clear()
+
+
+@contextmanager
+def transaction(conn=None):
+    """Yield a cursor inside one transaction: commit on success, rollback on error.
+
+    Uses this thread's pooled connection unless `conn` is given. Nested calls
+    join the enclosing transaction instead of committing early.
+    """
+    conn = conn or get_conn()
+    if conn.in_transaction:
+        yield conn.cursor()
+        return
+    # explicit BEGIN so DDL (migrations) is covered too, not only DML.
+    # IMMEDIATE takes the write lock up front: a deferred transaction that
+    # reads first can fail with SQLITE_BUSY under WAL without waiting.
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn.cursor()
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def _today():
+    return date.today().strftime("%Y-%m-%d")
+
+# -------------------- SCHEMA MIGRATIONS --------------------
+# Each step runs once, in its own transaction, and bumps PRAGMA user_version.
+# Append new steps at the end; never edit or reorder steps that have shipped.
+def _m1_base_schema(c):
+    c.execute("""CREATE TABLE IF NOT EXISTS clients(id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, phone TEXT, daily_rate REAL DEFAULT 0, days_worked INTEGER DEFAULT 0)""")
+    c.execute("""CREATE TABLE IF NOT EXISTS attendance(id INTEGER PRIMARY KEY AUTOINCREMENT, client_id INTEGER, date TEXT, FOREIGN KEY(client_id) REFERENCES clients(id) ON DELETE CASCADE)""")
+    c.execute("""CREATE TABLE IF NOT EXISTS payments(id INTEGER PRIMARY KEY AUTOINCREMENT, client_id INTEGER, amount REAL, type TEXT, date TEXT, FOREIGN KEY(client_id) REFERENCES clients(id) ON DELETE CASCADE)""")
+    c.execute("""CREATE TABLE IF NOT EXISTS expenses(id INTEGER PRIMARY KEY AUTOINCREMENT, type TEXT, amount REAL, description TEXT, date TEXT)""")
+
+    # databases created before versioning may predate these columns
+    cols = [r[1] for r in c.execute("PRAGMA table_info(clients)").fetchall()]
+    if "daily_rate" not in cols:
+        c.execute("ALTER TABLE clients ADD COLUMN daily_rate REAL DEFAULT 0")
+    if "days_worked" not in cols:
+        c.execute("ALTER TABLE clients ADD COLUMN days_worked INTEGER DEFAULT 0")
+
+
+def _m2_indexes(c):
+    # drop duplicate (client, date) rows so the unique index can be built
+    c.execute("DELETE FROM attendance WHERE id NOT IN (SELECT MIN(id) FROM attendance GROUP BY client_id, date)")
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_attendance_client_date ON attendance(client_id, date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_attendance_date ON attendance(date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_payments_client_date ON payments(client_id, date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_expenses_type_date ON expenses(type, date)")
+
+
+_SUMMARY_TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS trg_summary_clients_ins AFTER INSERT ON clients BEGIN
+        UPDATE report_summary SET n_clients = n_clients + 1,
+            days_worked = days_worked + COALESCE(NEW.days_worked, 0) WHERE id = 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_summary_clients_del AFTER DELETE ON clients BEGIN
+        UPDATE report_summary SET n_clients = n_clients - 1,
+            days_worked = days_worked - COALESCE(OLD.days_worked, 0) WHERE id = 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_summary_clients_upd AFTER UPDATE OF days_worked ON clients BEGIN
+        UPDATE report_summary SET
+            days_worked = days_worked - COALESCE(OLD.days_worked, 0) + COALESCE(NEW.days_worked, 0) WHERE id = 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_summary_attendance_ins AFTER INSERT ON attendance BEGIN
+        UPDATE report_summary SET n_attendance = n_attendance + 1 WHERE id = 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_summary_attendance_del AFTER DELETE ON attendance BEGIN
+        UPDATE report_summary SET n_attendance = n_attendance - 1 WHERE id = 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_summary_expenses_ins AFTER INSERT ON expenses BEGIN
+        UPDATE report_summary SET
+            total_income = total_income + CASE WHEN NEW.type = 'دخل' THEN COALESCE(NEW.amount, 0) ELSE 0 END,
+            total_expense = total_expense + CASE WHEN NEW.type = 'مصروف' THEN COALESCE(NEW.amount, 0) ELSE 0 END
+        WHERE id = 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_summary_expenses_del AFTER DELETE ON expenses BEGIN
+        UPDATE report_summary SET
+            total_income = total_income - CASE WHEN OLD.type = 'دخل' THEN COALESCE(OLD.amount, 0) ELSE 0 END,
+            total_expense = total_expense - CASE WHEN OLD.type = 'مصروف' THEN COALESCE(OLD.amount, 0) ELSE 0 END
+        WHERE id = 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_summary_expenses_upd AFTER UPDATE OF type, amount ON expenses BEGIN
+        UPDATE report_summary SET
+            total_income = total_income
+                - CASE WHEN OLD.type = 'دخل' THEN COALESCE(OLD.amount, 0) ELSE 0 END
+                + CASE WHEN NEW.type = 'دخل' THEN COALESCE(NEW.amount, 0) ELSE 0 END,
+            total_expense = total_expense
+                - CASE WHEN OLD.type = 'مصروف' THEN COALESCE(OLD.amount, 0) ELSE 0 END
+                + CASE WHEN NEW.type = 'مصروف' THEN COALESCE(NEW.amount, 0) ELSE 0 END
+        WHERE id = 1;
+    END""",
+)
+
+
+def _m3_report_summary(c):
+    # one-row counters kept current by triggers, so the report is a single lookup
+    c.execute("""CREATE TABLE IF NOT EXISTS report_summary(
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        n_clients INTEGER NOT NULL DEFAULT 0,
+        days_worked INTEGER NOT NULL DEFAULT 0,
+        n_attendance INTEGER NOT NULL DEFAULT 0,
+        total_income REAL NOT NULL DEFAULT 0,
+        total_expense REAL NOT NULL DEFAULT 0)""")
+    for sql in _SUMMARY_TRIGGERS:
+        c.execute(sql)
+    _rebuild_report_summary(c)
+
+
+def _m4_clients_name_index(c):
+    # backs ORDER BY name, id and the (name, id) > (?, ?) page cursor
+    c.execute("CREATE INDEX IF NOT EXISTS idx_clients_name ON clients(name)")
+
+
+_CLIENTS_FTS_TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS trg_clients_fts_ins AFTER INSERT ON clients BEGIN
+        INSERT INTO clients_fts (rowid, name, phone) VALUES (NEW.id, NEW.name, NEW.phone);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_clients_fts_del AFTER DELETE ON clients BEGIN
+        INSERT INTO clients_fts (clients_fts, rowid, name, phone) VALUES ('delete', OLD.id, OLD.name, OLD.phone);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_clients_fts_upd AFTER UPDATE OF name, phone ON clients BEGIN
+        INSERT INTO clients_fts (clients_fts, rowid, name, phone) VALUES ('delete', OLD.id, OLD.name, OLD.phone);
+        INSERT INTO clients_fts (rowid, name, phone) VALUES (NEW.id, NEW.name, NEW.phone);
+    END""",
+)
+
+
+def _m5_clients_fts(c):
+    # trigram FTS5 index over name and phone; builds without FTS5 (or with an
+    # SQLite older than 3.34) skip it and search_clients falls back to LIKE
+    try:
+        c.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS clients_fts USING fts5(
+            name, phone, content='clients', content_rowid='id', tokenize='trigram')""")
+    except sqlite3.OperationalError:
+        return
+    for sql in _CLIENTS_FTS_TRIGGERS:
+        c.execute(sql)
+    c.execute("INSERT INTO clients_fts (clients_fts) VALUES ('rebuild')")
+
+
+def _m6_payments_covering_index(c):
+    # (client_id, date) plus type and amount: get_payments and the payroll
+    # GROUP BY read payments from the index alone, without table lookups
+    c.execute("CREATE INDEX IF NOT EXISTS idx_payments_ledger ON payments(client_id, date, type, amount)")
+    c.execute("DROP INDEX IF EXISTS idx_payments_client_date")
+
+
+# daily_rollup column -> value contributed by one row of each source table
+_ROLLUP_SOURCES = {
+    "attendance": ("date", {"attendance": None}),
+    "expenses": ("type, amount, date", {"income": "دخل", "expense": "مصروف"}),
+    "payments": ("type, amount, date", {"payments": "دفع", "advances": "سلفة"}),
+}
+
+
+def _rollup_apply(table, row, sign):
+    # add (sign='+') or remove (sign='-') one OLD/NEW row's share of its day
+    sets = []
+    for column, type_ in _ROLLUP_SOURCES[table][1].items():
+        value = "1" if type_ is None else f"CASE WHEN {row}.type = '{type_}' THEN COALESCE({row}.amount, 0) ELSE 0 END"
+        sets.append(f"{column} = {column} {sign} {value}")
+    return (f"INSERT OR IGNORE INTO daily_rollup (day) VALUES ({row}.date);\n"
+            f"        UPDATE daily_rollup SET {', '.join(sets)} WHERE day = {row}.date;")
+
+
+def _rollup_triggers():
+    for table, (watched, _) in _ROLLUP_SOURCES.items():
+        yield (f"CREATE TRIGGER IF NOT EXISTS trg_rollup_{table}_ins AFTER INSERT ON {table} BEGIN\n"
+               f"        {_rollup_apply(table, 'NEW', '+')}\n    END")
+        yield (f"CREATE TRIGGER IF NOT EXISTS trg_rollup_{table}_del AFTER DELETE ON {table} BEGIN\n"
+               f"        {_rollup_apply(table, 'OLD', '-')}\n    END")
+        yield (f"CREATE TRIGGER IF NOT EXISTS trg_rollup_{table}_upd AFTER UPDATE OF {watched} ON {table} BEGIN\n"
+               f"        {_rollup_apply(table, 'OLD', '-')}\n"
+               f"        {_rollup_apply(table, 'NEW', '+')}\n    END")
+
+
+def _m7_daily_rollup(c):
+    # per-day totals kept current by triggers; date-range reports sum these
+    # rows instead of scanning attendance, payments and expenses
+    c.execute("""CREATE TABLE IF NOT EXISTS daily_rollup(
+        day TEXT PRIMARY KEY,
+        attendance INTEGER NOT NULL DEFAULT 0,
+        income REAL NOT NULL DEFAULT 0,
+        expense REAL NOT NULL DEFAULT 0,
+        payments REAL NOT NULL DEFAULT 0,
+        advances REAL NOT NULL DEFAULT 0) WITHOUT ROWID""")
+    for sql in _rollup_triggers():
+        c.execute(sql)
+    _rebuild_daily_rollup(c)
+
+
+_DAYS_WORKED_TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS trg_days_worked_ins AFTER INSERT ON attendance BEGIN
+        UPDATE clients SET days_worked = COALESCE(days_worked, 0) + 1 WHERE id = NEW.client_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_days_worked_del AFTER DELETE ON attendance BEGIN
+        UPDATE clients SET days_worked = COALESCE(days_worked, 0) - 1 WHERE id = OLD.client_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_days_worked_upd AFTER UPDATE OF client_id ON attendance BEGIN
+        UPDATE clients SET days_worked = COALESCE(days_worked, 0) - 1 WHERE id = OLD.client_id;
+        UPDATE clients SET days_worked = COALESCE(days_worked, 0) + 1 WHERE id = NEW.client_id;
+    END""",
+)
+
+
+def _m8_days_worked_triggers(c):
+    # days_worked is derived from attendance only: these triggers are its sole
+    # writers, and the recount drops whatever drift the old hand updates left
+    for sql in _DAYS_WORKED_TRIGGERS:
+        c.execute(sql)
+    c.execute("""UPDATE clients SET days_worked = (SELECT COUNT(*) FROM attendance a WHERE a.client_id = clients.id)
+                 WHERE days_worked IS NOT (SELECT COUNT(*) FROM attendance a WHERE a.client_id = clients.id)""")
+
+
+def _m9_archives(c):
+    # closed years moved out by archive.py: a catalog of the per-year archive
+    # files with their totals, and per-client carry-forwards of what moved so
+    # days_worked and payroll balances still cover the whole history
+    c.execute("""CREATE TABLE IF NOT EXISTS archives(
+        year INTEGER PRIMARY KEY,
+        file TEXT NOT NULL,
+        attendance INTEGER NOT NULL DEFAULT 0,
+        income REAL NOT NULL DEFAULT 0,
+        expense REAL NOT NULL DEFAULT 0,
+        payments REAL NOT NULL DEFAULT 0,
+        advances REAL NOT NULL DEFAULT 0,
+        archived_at TEXT)""")
+    cols = [r[1] for r in c.execute("PRAGMA table_info(clients)").fetchall()]
+    for col, decl in (("archived_days", "INTEGER NOT NULL DEFAULT 0"),
+                      ("archived_paid", "REAL NOT NULL DEFAULT 0"),
+                      ("archived_advances", "REAL NOT NULL DEFAULT 0")):
+        if col not in cols:
+            c.execute(f"ALTER TABLE clients ADD COLUMN {col} {decl}")
+
+
+# rows sync.py exchanges, keyed by a uid that is the same in every copy of the
+# database: clients, payments and expenses carry one; an attendance row is
+# keyed by its client's uid and its date
+_SYNC_SOURCES = {
+    "clients": "name, phone, daily_rate",
+    "payments": "client_id, amount, type, date",
+    "expenses": "type, amount, description, date",
+}
+_NOW_MS = "CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER)"
+# sync.py mutes logging while it applies remote rows, archive.py while it
+# moves rows out: neither is an edit to send
+_MUTED = "EXISTS (SELECT 1 FROM sync_state WHERE key = 'muted')"
+
+
+def _change_ts(table, prior):
+    # never earlier than the version replaced (the entry matching `prior`), so
+    # an edit made after a sync wins even on a clock running behind
+    if prior is None:
+        return _NOW_MS
+    return f"MAX({_NOW_MS}, COALESCE((SELECT ts FROM change_log WHERE tbl = '{table}' AND {prior}), 0) + 1)"
+
+
+def _log_upsert(table, row_id, prior=None, key=None):
+    # the row's one entry now points at this edit. Only attendance keys come
+    # back after a delete (marked again): pass `key` to supersede its tombstone
+    if key is None:
+        return (f"INSERT OR REPLACE INTO change_log (tbl, row_id, op, ts, origin)\n"
+                f"            SELECT '{table}', {row_id}, 'upsert', {_change_ts(table, prior)}, '' WHERE NOT {_MUTED};")
+    return (f"INSERT OR REPLACE INTO change_log (tbl, row_id, op, ts, origin)\n"
+            f"            SELECT '{table}', {row_id}, 'upsert', {_change_ts(table, prior)}, ''\n"
+            f"            FROM (SELECT {key} AS k) WHERE k IS NOT NULL AND NOT {_MUTED};\n"
+            f"        DELETE FROM change_log WHERE tbl = '{table}' AND key = {key} AND NOT {_MUTED};")
+
+
+def _log_delete(table, row_id, key):
+    # the row is gone, so its entry becomes a tombstone carrying the key; a
+    # cascaded delete of a client's rows finds the client gone (NULL key) and
+    # leaves none: the client's own tombstone covers them, and if it loses
+    # on the other side, that side sends the client's rows back (sync.py)
+    return (f"INSERT OR REPLACE INTO change_log (tbl, row_id, op, ts, origin, key)\n"
+            f"            SELECT '{table}', NULL, 'delete', {_change_ts(table, f'row_id = {row_id}')}, '', k\n"
+            f"            FROM (SELECT {key} AS k) WHERE k IS NOT NULL AND NOT {_MUTED};\n"
+            f"        DELETE FROM change_log WHERE tbl = '{table}' AND row_id = {row_id};")
+
+
+# a payment's uid, or NULL when it goes with its client (ON DELETE CASCADE
+# runs after the client row is already gone)
+_CASCADED_KEY = "(SELECT OLD.uid WHERE EXISTS (SELECT 1 FROM clients WHERE id = OLD.client_id))"
+
+
+def _change_log_triggers():
+    # a new row has a new id and a new random uid: nothing earlier to supersede
+    for table, watched in _SYNC_SOURCES.items():
+        yield (f"CREATE TRIGGER IF NOT EXISTS trg_log_{table}_ins AFTER INSERT ON {table} BEGIN\n"
+               f"        UPDATE {table} SET uid = lower(hex(randomblob(8))) WHERE id = NEW.id AND uid IS NULL;\n"
+               f"        {_log_upsert(table, 'NEW.id')}\n    END")
+        yield (f"CREATE TRIGGER IF NOT EXISTS trg_log_{table}_upd AFTER UPDATE OF {watched} ON {table} BEGIN\n"
+               f"        {_log_upsert(table, 'NEW.id', 'row_id = NEW.id')}\n    END")
+        deleted = _CASCADED_KEY if table == "payments" else "OLD.uid"
+        yield (f"CREATE TRIGGER IF NOT EXISTS trg_log_{table}_del AFTER DELETE ON {table} BEGIN\n"
+               f"        {_log_delete(table, 'OLD.id', deleted)}\n    END")
+    key = "((SELECT uid FROM clients WHERE id = {0}.client_id) || '|' || {0}.date)"
+    yield ("CREATE TRIGGER IF NOT EXISTS trg_log_attendance_ins AFTER INSERT ON attendance BEGIN\n"
+           f"        {_log_upsert('attendance', 'NEW.id', 'key = k', key.format('NEW'))}\n    END")
+    yield ("CREATE TRIGGER IF NOT EXISTS trg_log_attendance_upd AFTER UPDATE OF client_id, date ON attendance BEGIN\n"
+           f"        {_log_delete('attendance', 'OLD.id', key.format('OLD'))}\n"
+           f"        {_log_upsert('attendance', 'NEW.id', 'key = k', key.format('NEW'))}\n    END")
+    yield ("CREATE TRIGGER IF NOT EXISTS trg_log_attendance_del AFTER DELETE ON attendance BEGIN\n"
+           f"        {_log_delete('attendance', 'OLD.id', key.format('OLD'))}\n    END")
+
+
+def _m10_change_log(c):
+    # change_log holds one entry per edited row of the synced tables: its
+    # local id, last edit time and origin, or a tombstone with the key once
+    # the row is deleted. sync.py sends the rows behind entries newer than
+    # the last sync instead of whole files.
+    for table in _SYNC_SOURCES:
+        cols = [r[1] for r in c.execute(f"PRAGMA table_info({table})").fetchall()]
+        if "uid" not in cols:
+            c.execute(f"ALTER TABLE {table} ADD COLUMN uid TEXT")
+        # copies made before sync existed were whole-file copies, so a row's
+        # id names the same row in each of them
+        c.execute(f"UPDATE {table} SET uid = 'L' || id WHERE uid IS NULL")
+        c.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{table}_uid ON {table}(uid)")
+    c.execute("""CREATE TABLE IF NOT EXISTS change_log(
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        tbl TEXT NOT NULL,
+        row_id INTEGER,
+        op TEXT NOT NULL,
+        ts INTEGER NOT NULL,
+        origin TEXT NOT NULL,
+        key TEXT)""")
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_change_log_row ON change_log(tbl, row_id)")
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_change_log_key ON change_log(tbl, key) WHERE key IS NOT NULL")
+    c.execute("CREATE TABLE IF NOT EXISTS sync_state(key TEXT PRIMARY KEY, value) WITHOUT ROWID")
+    c.execute("""CREATE TABLE IF NOT EXISTS sync_peers(
+        peer TEXT PRIMARY KEY,
+        device TEXT,
+        sent INTEGER NOT NULL DEFAULT 0,
+        received INTEGER NOT NULL DEFAULT 0,
+        synced_at TEXT)""")
+    for sql in _change_log_triggers():
+        c.execute(sql)
+
+
+def _m11_expenses_date_index(c):
+    # backs get_expenses' ORDER BY date DESC, id DESC and its (date, id) < (?, ?)
+    # page cursor; idx_expenses_type_date cannot, as it leads with type
+    c.execute("CREATE INDEX IF NOT EXISTS idx_expenses_date_id ON expenses(date, id)")
+
+
+def _m12_sync_identity(c):
+    # the id of this file's change log, sent with every sync answer: a restored
+    # snapshot gets a new one, so peers holding seqs of the replaced log start
+    # over; and the token a peer must present to sync with this file. Each
+    # peer row keeps the log id it last saw and the token it was paired with.
+    cols = [r[1] for r in c.execute("PRAGMA table_info(sync_peers)").fetchall()]
+    for col in ("log", "token"):
+        if col not in cols:
+            c.execute(f"ALTER TABLE sync_peers ADD COLUMN {col} TEXT")
+    c.execute("INSERT OR IGNORE INTO sync_state VALUES ('log', lower(hex(randomblob(8))))")
+    c.execute("INSERT OR IGNORE INTO sync_state VALUES ('token', lower(hex(randomblob(16))))")
+
+
+def _m13_cascade_tombstones(c):
+    # payments deleted with their client stop leaving tombstones of their own
+    # (see _CASCADED_KEY): a client delete that loses a conflict must not
+    # take the payments with it
+    c.execute("DROP TRIGGER IF EXISTS trg_log_payments_del")
+    for sql in _change_log_triggers():
+        c.execute(sql)
+
+
+MIGRATIONS = [
+    _m1_base_schema,
+    _m2_indexes,
+    _m3_report_summary,
+    _m4_clients_name_index,
+    _m5_clients_fts,
+    _m6_payments_covering_index,
+    _m7_daily_rollup,
+    _m8_days_worked_triggers,
+    _m9_archives,
+    _m10_change_log,
+    _m11_expenses_date_index,
+    _m12_sync_identity,
+    _m13_cascade_tombstones,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def schema_version():
+    return get_conn().execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn=None):
+    """Apply every migration newer than the database's user_version.
+
+    Works on the pooled connection of the current DB unless `conn` is given.
+    """
+    conn = conn or get_conn()
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for target, step in enumerate(MIGRATIONS[version:], start=version + 1):
+        with transaction(conn) as c:
+            step(c)
+            c.execute(f"PRAGMA user_version = {target}")
+    return SCHEMA_VERSION
+
+
+def init_db():
+    """Bring the schema up to date; later calls for the same file return at once."""
+    global _ready_db
+    if _ready_db == DB:
+        return
+    migrate()
+    _ready_db = DB
+
+# -------------------- CLIENTS --------------------
+def fetch_clients(search=None, after=None, limit=None):
+    """Clients ordered by (name, id).
+
+    For keyset pagination pass `limit` and, for every page after the first,
+    `after=client_cursor(last_row_of_previous_page)`.
+    """
+    sql = "SELECT id, name, phone, daily_rate, days_worked FROM clients"
+    where, params = [], []
+    if search:
+        where.append("name LIKE ?")
+        params.append(f"%{search}%")
+    if after:
+        where.append("(name, id) > (?, ?)")
+        params.extend(after)
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY name, id"
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return get_conn().execute(sql, params).fetchall()
+
+
+def client_cursor(row):
+    return row[1], row[0]
+
+
+def _has_clients_fts():
+    return get_conn().execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='clients_fts'"
+    ).fetchone() is not None
+
+
+def search_clients(query, limit=20):
+    """Top `limit` clients whose name or phone contains `query`, prefix matches first."""
+    q = (query or "").strip()
+    if not q:
+        return fetch_clients(limit=limit)
+    prefix = q + "%"
+    if len(q) < 3:
+        # too short for trigrams: name-prefix range scan on idx_clients_name
+        return get_conn().execute(
+            """SELECT id, name, phone, daily_rate, days_worked FROM clients
+               WHERE name >= ? AND name < ? ORDER BY name, id LIMIT ?""",
+            (q, q + "\U0010ffff", limit),
+        ).fetchall()
+    rank = "CASE WHEN c.name LIKE ? OR c.phone LIKE ? THEN 0 ELSE 1 END"
+    if _has_clients_fts():
+        phrase = '"' + q.replace('"', '""') + '"'
+        sql = f"""SELECT c.id, c.name, c.phone, c.daily_rate, c.days_worked
+                  FROM clients_fts f JOIN clients c ON c.id = f.rowid
+                  WHERE clients_fts MATCH ?
+                  ORDER BY {rank}, c.name, c.id LIMIT ?"""
+        return get_conn().execute(sql, (phrase, prefix, prefix, limit)).fetchall()
+    sql = f"""SELECT c.id, c.name, c.phone, c.daily_rate, c.days_worked FROM clients c
+              WHERE c.name LIKE ? OR c.phone LIKE ?
+              ORDER BY {rank}, c.name, c.id LIMIT ?"""
+    return get_conn().execute(sql, (f"%{q}%", f"%{q}%", prefix, prefix, limit)).fetchall()
+
+
+# -------------------- CLIENT RECORD CACHE --------------------
+# LRU of (id, name, phone, daily_rate, days_worked) rows keyed by client id.
+# Every helper that changes a client row (including days_worked through
+# attendance) invalidates the affected entries after it commits.
+CLIENT_CACHE_SIZE = 512
+_client_cache = OrderedDict()
+_client_cache_lock = threading.Lock()
+_client_cache_version = 0
+
+
+def invalidate_client_cache(cid=None):
+    global _client_cache_version
+    with _client_cache_lock:
+        _client_cache_version += 1
+        if cid is None:
+            _client_cache.clear()
+        else:
+            _client_cache.pop(cid, None)
+
+
+def get_client(cid):
+    """Primary-key lookup of one client row, or None if it does not exist."""
+    with _client_cache_lock:
+        row = _client_cache.get(cid)
+        if row is not None:
+            _client_cache.move_to_end(cid)
+            return row
+        version = _client_cache_version
+    row = get_conn().execute(
+        "SELECT id, name, phone, daily_rate, days_worked FROM clients WHERE id=?", (cid,)
+    ).fetchone()
+    with _client_cache_lock:
+        # skip caching if a write invalidated the cache while we were reading
+        if row is not None and version == _client_cache_version:
+            _client_cache[cid] = row
+            if len(_client_cache) > CLIENT_CACHE_SIZE:
+                _client_cache.popitem(last=False)
+    return row
+
+
+def insert_client(name, phone, rate):
+    with transaction() as c:
+        c.execute("INSERT INTO clients (name, phone, daily_rate, days_worked) VALUES (?, ?, ?, 0)", (name, phone, rate))
+    return c.lastrowid
+
+
+def update_client_db(cid, name, phone, rate):
+    # days_worked is not editable: the attendance triggers maintain it
+    with transaction() as c:
+        c.execute("UPDATE clients SET name=?, phone=?, daily_rate=? WHERE id=?", (name, phone, rate, cid))
+    invalidate_client_cache(cid)
+
+
+def delete_client_db(cid):
+    with transaction() as c:
+        c.execute("DELETE FROM clients WHERE id=?", (cid,))
+    invalidate_client_cache(cid)
+
+# -------------------- ATTENDANCE --------------------
+def get_attendance_ids(date_str):
+    c = get_conn().cursor()
+    c.execute("SELECT client_id FROM attendance WHERE date=?", (date_str,))
+    return [r[0] for r in c.fetchall()]
+
+
+def toggle_attendance_db(cid, date_str, is_present):
+    apply_attendance_changes([(cid, date_str, is_present)])
+
+
+def apply_attendance_changes(changes):
+    """Write many (cid, date_str, is_present) toggles in one transaction.
+
+    Returns (added, removed) counts of rows that actually changed.
+    """
+    # the unique (client_id, date) index turns repeats into no-ops, and the
+    # attendance triggers adjust days_worked only for rows really written
+    wanted = {}
+    for cid, date_str, is_present in changes:
+        wanted[(cid, date_str)] = is_present  # the last toggle of a pair wins
+    with transaction() as c:
+        added = c.executemany("INSERT OR IGNORE INTO attendance (client_id, date) VALUES (?, ?)",
+                              [key for key, present in wanted.items() if present]).rowcount
+        removed = c.executemany("DELETE FROM attendance WHERE client_id=? AND date=?",
+                                [key for key, present in wanted.items() if not present]).rowcount
+    for cid in {cid for cid, _ in wanted}:
+        invalidate_client_cache(cid)
+    return added, removed
+
+
+def set_attendance_bulk(date_str, present_ids):
+    """Make exactly `present_ids` present on `date_str` in one transaction.
+
+    Only the difference against what is already stored is written.
+    Returns (added, removed) counts.
+    """
+    wanted = set(present_ids)
+    with transaction() as c:
+        current = {r[0] for r in c.execute("SELECT client_id FROM attendance WHERE date=?", (date_str,))}
+        added = wanted - current
+        removed = current - wanted
+        c.executemany("INSERT INTO attendance (client_id, date) VALUES (?, ?)", [(cid, date_str) for cid in added])
+        c.executemany("DELETE FROM attendance WHERE client_id=? AND date=?", [(cid, date_str) for cid in removed])
+    invalidate_client_cache()
+    return len(added), len(removed)
+
+
+def mark_all_present(date_str):
+    ids = [r[0] for r in get_conn().execute("SELECT id FROM clients")]
+    return set_attendance_bulk(date_str, ids)
+
+
+def clear_attendance(date_str):
+    return set_attendance_bulk(date_str, ())
+
+
+def copy_attendance(from_date, to_date):
+    return set_attendance_bulk(to_date, get_attendance_ids(from_date))
+
+
+def register_attendance_db(cid, date_str):
+    toggle_attendance_db(cid, date_str, True)
+
+
+def remove_attendance_db(cid, date_str):
+    toggle_attendance_db(cid, date_str, False)
+
+# -------------------- PAYMENTS --------------------
+def get_payments(cid, since=None):
+    """A client's payments (id, amount, type, date), newest first.
+
+    By default only the live database is read. With `since` (YYYY-MM-DD) the
+    rows from that date on are returned, archived years included.
+    """
+    conn = get_conn()
+    if since is None:
+        return conn.execute("SELECT id, amount, type, date FROM payments WHERE client_id=? ORDER BY date DESC", (cid,)).fetchall()
+    sql = "SELECT id, amount, type, date FROM {schema}.payments WHERE client_id=? AND date >= ?"
+    rows = conn.execute(sql.format(schema="main"), (cid, since)).fetchall()
+    for schema in _archives(conn, since, _today()):
+        rows += conn.execute(sql.format(schema=schema), (cid, since)).fetchall()
+    rows.sort(key=lambda r: r[3] or "", reverse=True)
+    return rows
+
+
+def add_payment_db(cid, amount, ptype):
+    with transaction() as c:
+        c.execute("INSERT INTO payments (client_id, amount, type, date) VALUES (?, ?, ?, ?)", (cid, amount, ptype, _today()))
+    return c.lastrowid
+
+
+def delete_payment_db(pid):
+    with transaction() as c:
+        c.execute("DELETE FROM payments WHERE id=?", (pid,))
+
+# -------------------- EXPENSES / INCOME --------------------
+def get_expenses(before=None, limit=None):
+    """Expenses (id, type, amount, description, date), newest first.
+
+    For keyset pagination pass `limit` and, for every page after the first,
+    `before=expense_cursor(last_row_of_previous_page)`.
+    """
+    sql = "SELECT id, type, amount, description, date FROM expenses"
+    params = []
+    if before:
+        sql += " WHERE (date, id) < (?, ?)"
+        params.extend(before)
+    sql += " ORDER BY date DESC, id DESC"
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return get_conn().execute(sql, params).fetchall()
+
+
+def expense_cursor(row):
+    return row[4], row[0]
+
+
+def add_expense_db(etype, amount, desc):
+    with transaction() as c:
+        c.execute("INSERT INTO expenses (type, amount, description, date) VALUES (?, ?, ?, ?)", (etype, amount, desc, _today()))
+    return c.lastrowid
+
+
+def update_expense_db(eid, etype, amount, desc):
+    with transaction() as c:
+        c.execute("UPDATE expenses SET type=?, amount=?, description=? WHERE id=?", (etype, amount, desc, eid))
+
+
+def delete_expense_db(eid):
+    with transaction() as c:
+        c.execute("DELETE FROM expenses WHERE id=?", (eid,))
+
+# -------------------- REPORT --------------------
+def _rebuild_report_summary(c):
+    # archived years are no longer in the base tables; their catalogued totals
+    # are added back (the catalog only exists from migration 9 on)
+    if c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='archives'").fetchone():
+        archived = "(SELECT COALESCE(SUM({}), 0) FROM archives)"
+    else:
+        archived = "0"
+    c.execute(f"""INSERT OR REPLACE INTO report_summary
+        (id, n_clients, days_worked, n_attendance, total_income, total_expense)
+        SELECT 1,
+            (SELECT COUNT(*) FROM clients),
+            (SELECT COALESCE(SUM(days_worked), 0) FROM clients),
+            (SELECT COUNT(*) FROM attendance) + {archived.format('attendance')},
+            (SELECT COALESCE(SUM(amount), 0) FROM expenses WHERE type='دخل') + {archived.format('income')},
+            (SELECT COALESCE(SUM(amount), 0) FROM expenses WHERE type='مصروف') + {archived.format('expense')}""")
+
+
+def _rebuild_daily_rollup(c, schema="main", start=None, end=None):
+    # all days, or only start..end; `schema` may be an attached archive file
+    where = "WHERE date BETWEEN :start AND :end" if start else ""
+    params = {"start": start, "end": end}
+    c.execute(f"DELETE FROM {schema}.daily_rollup" + (" WHERE day BETWEEN :start AND :end" if start else ""), params)
+    c.execute(f"""INSERT INTO {schema}.daily_rollup (day, attendance, income, expense, payments, advances)
+        SELECT day, SUM(att), SUM(inc), SUM(exp), SUM(paid), SUM(adv) FROM (
+            SELECT date AS day, COUNT(*) AS att, 0 AS inc, 0 AS exp, 0 AS paid, 0 AS adv
+                FROM {schema}.attendance {where} GROUP BY date
+            UNION ALL
+            SELECT date, 0,
+                SUM(CASE WHEN type='دخل' THEN COALESCE(amount, 0) ELSE 0 END),
+                SUM(CASE WHEN type='مصروف' THEN COALESCE(amount, 0) ELSE 0 END), 0, 0
+                FROM {schema}.expenses {where} GROUP BY date
+            UNION ALL
+            SELECT date, 0, 0, 0,
+                SUM(CASE WHEN type='دفع' THEN COALESCE(amount, 0) ELSE 0 END),
+                SUM(CASE WHEN type='سلفة' THEN COALESCE(amount, 0) ELSE 0 END)
+                FROM {schema}.payments {where} GROUP BY date
+        ) WHERE day IS NOT NULL GROUP BY day""", params)
+
+
+def rebuild_report_summary():
+    """Recompute report_summary and daily_rollup from the base tables."""
+    with transaction() as c:
+        _rebuild_report_summary(c)
+        _rebuild_daily_rollup(c)
+    return get_report_data()
+
+
+def _report_row():
+    return get_conn().execute(
+        "SELECT n_clients, days_worked, n_attendance, total_income, total_expense FROM report_summary WHERE id = 1"
+    ).fetchone()
+
+
+def get_report_data():
+    n_clients, n_att, _, inc, exp = _report_row()
+    return n_clients, n_att, inc, exp
+
+
+def compute_report():
+    num_clients, _, total_att, total_income, total_exp = _report_row()
+    return num_clients, total_att, total_income, total_exp, total_income - total_exp
+
+
+_RANGE_SQL = """SELECT COALESCE(SUM(attendance), 0), COALESCE(SUM(income), 0), COALESCE(SUM(expense), 0),
+                         COALESCE(SUM(payments), 0), COALESCE(SUM(advances), 0)
+                  FROM {schema}.daily_rollup WHERE day BETWEEN ? AND ?"""
+
+
+def archived_range_totals(conn, start, end):
+    """(attendance, income, expense, payments, advances) of archived years in start..end."""
+    totals = (0, 0, 0, 0, 0)
+    for schema in _archives(conn, start, end):
+        row = conn.execute(_RANGE_SQL.format(schema=schema), (start, end)).fetchall()[0]
+        totals = tuple(a + b for a, b in zip(totals, row))
+    return totals
+
+
+def get_range_report(start, end):
+    """Totals for start <= date <= end (YYYY-MM-DD) from daily_rollup.
+
+    Archived years in the range are included. Returns
+    (attendance, income, expense, payments, advances, net).
+    """
+    conn = get_conn()
+    live = conn.execute(_RANGE_SQL.format(schema="main"), (start, end)).fetchone()
+    att, inc, exp, paid, adv = (a + b for a, b in zip(live, archived_range_totals(conn, start, end)))
+    return att, inc, exp, paid, adv, inc - exp
+
+
+def get_daily_rows(start, end):
+    """daily_rollup rows (day, attendance, income, expense, payments, advances) in the range."""
+    conn = get_conn()
+    sql = "SELECT day, attendance, income, expense, payments, advances FROM {schema}.daily_rollup WHERE day BETWEEN ? AND ? ORDER BY day"
+    rows = conn.execute(sql.format(schema="main"), (start, end)).fetchall()
+    archived = [r for schema in _archives(conn, start, end)
+                for r in conn.execute(sql.format(schema=schema), (start, end)).fetchall()]
+    if not archived:
+        return rows
+    # a day can have rows on both sides if it was written to after being archived
+    days = {}
+    for day, *values in archived + rows:
+        days[day] = [a + b for a, b in zip(days.get(day, (0,) * 5), values)]
+    return [(day, *days[day]) for day in sorted(days)]
+
+
+# -------------------- ARCHIVES --------------------
+# archive.py moves closed years into one file per year next to the live DB;
+# readers ATTACH a year's file only when the requested range reaches it.
+def archive_file(year, db_path=None):
+    """File name (no directory) of `year`'s archive for the live DB at `db_path`."""
+    return f"{os.path.splitext(os.path.basename(db_path or DB))[0]}.{year}.db"
+
+
+def archived_years():
+    return [r[0] for r in get_conn().execute("SELECT year FROM archives ORDER BY year")]
+
+
+def _archives(conn, start, end):
+    # yield a schema name for each archived year overlapping start..end, one
+    # file ATTACHed at a time (so the number of years is not limited by
+    # SQLITE_LIMIT_ATTACHED) and DETACHed once the caller has read it
+    years = conn.execute("SELECT year, file FROM archives WHERE year BETWEEN ? AND ? ORDER BY year",
+                         (int(start[:4]), int(end[:4]))).fetchall()
+    if not years:
+        return
+    main_path = conn.execute("PRAGMA database_list").fetchone()[2]
+    for year, name in years:
+        path = os.path.join(os.path.dirname(main_path), name)
+        if not os.path.exists(path):  # ATTACH would silently create an empty one
+            raise FileNotFoundError(f"archive for {year} is missing: {path}")
+        conn.execute("ATTACH DATABASE ? AS archive", (path,))
+        try:
+            yield "archive"
+        finally:
+            conn.execute("DETACH DATABASE archive")
+
+
+def period_range(period, today=None):
+    """(start, end) date strings for 'today', 'week' (from Saturday) or 'month'."""
+    today = today or date.today()
+    if period == "today":
+        start = today
+    elif period == "week":
+        start = today - timedelta(days=(today.weekday() - 5) % 7)
+    elif period == "month":
+        start = today.replace(day=1)
+    else:
+        raise ValueError(f"unknown period: {period!r}")
+    return start.strftime("%Y-%m-%d"), today.strftime("%Y-%m-%d")
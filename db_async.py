@@ -0,0 +1,165 @@
+# db_async.py - awaitable versions of the db.py helpers for async Flet handlers
+#
+#   clients = await db_async.fetch_clients(limit=50)
+#
+# Every call is put on a request queue served by one dedicated DB worker
+# thread, so a slow query waits there instead of on the event loop. The worker
+# owns its own pooled connection (db.get_conn is per thread) and runs requests
+# in the order they were submitted. Long exports get a thread of their own so
+# they never hold up the queue.
+import asyncio
+import functools
+import queue
+import threading
+from concurrent.futures import Future
+
+import db
+import export
+import payroll
+import archive
+import backup
+import reconcile
+import sites
+import sync
+
+_requests = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+_STOP = object()
+
+
+def _serve():
+    while True:
+        item = _requests.get()
+        if item is _STOP:
+            return
+        fut, fn, args, kwargs = item
+        if not fut.set_running_or_notify_cancel():
+            continue
+        try:
+            fut.set_result(fn(*args, **kwargs))
+        except BaseException as ex:
+            fut.set_exception(ex)
+
+
+def _ensure_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_serve, name="db-worker", daemon=True)
+            _worker.start()
+
+
+def submit(fn, *args, **kwargs):
+    """Queue fn(*args, **kwargs) for the DB worker; returns a concurrent Future."""
+    _ensure_worker()
+    fut = Future()
+    _requests.put((fut, fn, args, kwargs))
+    return fut
+
+
+async def run(fn, *args, **kwargs):
+    """Run fn on the DB worker and await its result without blocking the loop."""
+    return await asyncio.wrap_future(submit(fn, *args, **kwargs))
+
+
+def shutdown(wait=True):
+    """Stop the worker after the requests already queued; the next call restarts it."""
+    global _worker
+    with _worker_lock:
+        worker, _worker = _worker, None
+    if worker is not None and worker.is_alive():
+        _requests.put(_STOP)
+        if wait:
+            worker.join()
+
+
+def _awaitable(fn):
+    @functools.wraps(fn)
+    async def call(*args, **kwargs):
+        return await run(fn, *args, **kwargs)
+    return call
+
+
+# -------------------- HELPERS --------------------
+init_db = _awaitable(db.init_db)
+rebuild_report_summary = _awaitable(db.rebuild_report_summary)
+
+fetch_clients = _awaitable(db.fetch_clients)
+search_clients = _awaitable(db.search_clients)
+get_client = _awaitable(db.get_client)
+insert_client = _awaitable(db.insert_client)
+update_client_db = _awaitable(db.update_client_db)
+delete_client_db = _awaitable(db.delete_client_db)
+
+get_attendance_ids = _awaitable(db.get_attendance_ids)
+toggle_attendance_db = _awaitable(db.toggle_attendance_db)
+apply_attendance_changes = _awaitable(db.apply_attendance_changes)
+set_attendance_bulk = _awaitable(db.set_attendance_bulk)
+mark_all_present = _awaitable(db.mark_all_present)
+clear_attendance = _awaitable(db.clear_attendance)
+copy_attendance = _awaitable(db.copy_attendance)
+register_attendance_db = _awaitable(db.register_attendance_db)
+remove_attendance_db = _awaitable(db.remove_attendance_db)
+
+get_payments = _awaitable(db.get_payments)
+add_payment_db = _awaitable(db.add_payment_db)
+delete_payment_db = _awaitable(db.delete_payment_db)
+
+get_expenses = _awaitable(db.get_expenses)
+add_expense_db = _awaitable(db.add_expense_db)
+update_expense_db = _awaitable(db.update_expense_db)
+delete_expense_db = _awaitable(db.delete_expense_db)
+
+get_report_data = _awaitable(db.get_report_data)
+compute_report = _awaitable(db.compute_report)
+get_range_report = _awaitable(db.get_range_report)
+get_daily_rows = _awaitable(db.get_daily_rows)
+archived_years = _awaitable(db.archived_years)
+
+compute_payroll = _awaitable(payroll.compute_payroll)
+
+# queued behind every request for the old site, so none of them lands in the new file
+switch_site = _awaitable(sites.switch_site)
+# likewise, no queued request runs while the file is being replaced
+restore_backup = _awaitable(backup.restore_backup)
+sync_token = _awaitable(sync.sync_token)
+
+
+async def export_all(out_dir, names=None, progress=None):
+    """export.export_all on its own thread; it streams through a separate connection."""
+    return await asyncio.to_thread(export.export_all, out_dir, names, progress)
+
+
+async def reconcile_days_worked(**kwargs):
+    """reconcile.reconcile_days_worked on its own thread; it commits batch by batch."""
+    return await asyncio.to_thread(reconcile.reconcile_days_worked, **kwargs)
+
+
+async def archive_closed_years(**kwargs):
+    """archive.archive_closed_years on its own thread; it moves whole years at a time."""
+    return await asyncio.to_thread(archive.archive_closed_years, **kwargs)
+
+
+async def take_backup(**kwargs):
+    """backup.take_backup on its own thread; it copies through a separate connection."""
+    return await asyncio.to_thread(backup.take_backup, **kwargs)
+
+
+async def backup_if_due(**kwargs):
+    return await asyncio.to_thread(backup.backup_if_due, **kwargs)
+
+
+async def sync_now(url, token=None):
+    """sync.sync_now on its own thread; it waits on the network through a separate connection."""
+    return await asyncio.to_thread(sync.sync_now, url, token)
+
+
+async def make_copy(target, url):
+    """sync.make_copy on its own thread; it copies the whole file."""
+    return await asyncio.to_thread(sync.make_copy, target, url)
+
+
+async def consolidated_report(site_paths, start=None, end=None):
+    """sites.consolidated_report on its own thread; it reads the site files through ATTACH."""
+    return await asyncio.to_thread(sites.consolidated_report, site_paths, start, end)
@@ -0,0 +1,175 @@
+# diagnostics.py - opt-in latency instrumentation for the data layer and UI handlers
+#
+#   WORKER_MANAGER_DIAGNOSTICS=1 python main.py
+#
+# install() must run before the app imports helpers from db / payroll: it
+# replaces every public helper with a timing wrapper and adds a sqlite3 trace
+# callback to each new connection. UI handlers opt in with @timed. When
+# diagnostics are off nothing is wrapped and @timed returns the function
+# unchanged, so normal runs pay nothing.
+#
+# SQLite's trace callback fires when a statement starts, so a statement's
+# time is measured until the next statement on the same thread or the end of
+# the helper that ran it; fetching the rows is included.
+import functools
+import inspect
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+
+import db
+import payroll
+
+ENV_VAR = "WORKER_MANAGER_DIAGNOSTICS"
+SAMPLES = 1000  # most recent latencies kept per name for percentiles
+
+# db.py functions that are plumbing rather than queries
+_NOT_HELPERS = {
+    "pragmas", "configure", "set_db_path", "open_connection", "get_conn", "close_all",
+    "transaction", "add_connection_hook", "client_cursor", "period_range", "invalidate_client_cache",
+    "archive_file", "expense_cursor",
+}
+
+_enabled = False
+_lock = threading.Lock()
+_stats = {}  # (kind, name) -> [count, total seconds, max seconds, deque of samples]
+_local = threading.local()
+
+
+def enabled():
+    return _enabled
+
+
+def install(force=False):
+    """Turn instrumentation on if `force` or the ENV_VAR environment variable is set."""
+    global _enabled
+    if _enabled or not (force or os.environ.get(ENV_VAR) not in (None, "", "0")):
+        return _enabled
+    _enabled = True
+    _wrap_module(db, [n for n, fn in vars(db).items()
+                      if inspect.isfunction(fn) and fn.__module__ == db.__name__
+                      and not n.startswith("_") and n not in _NOT_HELPERS])
+    _wrap_module(payroll, ["compute_payroll"])
+    db.add_connection_hook(lambda conn: conn.set_trace_callback(_on_statement))
+    return True
+
+
+def record(kind, name, seconds):
+    with _lock:
+        entry = _stats.get((kind, name))
+        if entry is None:
+            entry = _stats[(kind, name)] = [0, 0.0, 0.0, deque(maxlen=SAMPLES)]
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] = max(entry[2], seconds)
+        entry[3].append(seconds)
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+def timed(fn=None, *, kind="handler", name=None):
+    """Decorator timing fn (sync or async) under `name` when diagnostics are on."""
+    if fn is None:
+        return functools.partial(timed, kind=kind, name=name)
+    if not _enabled:
+        return fn
+    label = name or fn.__name__
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                record(kind, label, time.perf_counter() - start)
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            if kind == "db":
+                _close_statement()
+            record(kind, label, time.perf_counter() - start)
+    return wrapper
+
+
+def _wrap_module(module, names):
+    for name in names:
+        setattr(module, name, timed(getattr(module, name), kind="db", name=name))
+
+
+# -------------------- SQL TRACE --------------------
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_sql(sql):
+    """Statement text with literals replaced by ?, so executions group together."""
+    return _SPACES.sub(" ", _LITERALS.sub("?", sql)).strip()
+
+
+def _on_statement(sql):
+    now = time.perf_counter()
+    current = getattr(_local, "statement", None)
+    if current is not None and current[0] == sql:
+        return  # the same statement reported again for a trigger it fired
+    if current is not None:
+        record("sql", normalize_sql(current[0]), now - current[1])
+    _local.statement = (sql, now)
+
+
+def _close_statement():
+    current = getattr(_local, "statement", None)
+    if current is not None:
+        _local.statement = None
+        record("sql", normalize_sql(current[0]), time.perf_counter() - current[1])
+
+
+# -------------------- REPORTING --------------------
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def snapshot(kind=None):
+    """Rows of {kind, name, count, total_ms, p50_ms, p95_ms, p99_ms, max_ms}, slowest p95 first."""
+    with _lock:
+        items = [(k, n, count, total, peak, sorted(samples))
+                 for (k, n), (count, total, peak, samples) in _stats.items() if kind in (None, k)]
+    rows = [{
+        "kind": k, "name": n, "count": count,
+        "total_ms": round(total * 1000, 3),
+        "p50_ms": round(_percentile(ordered, 0.50) * 1000, 3),
+        "p95_ms": round(_percentile(ordered, 0.95) * 1000, 3),
+        "p99_ms": round(_percentile(ordered, 0.99) * 1000, 3),
+        "max_ms": round(peak * 1000, 3),
+    } for k, n, count, total, peak, ordered in items]
+    rows.sort(key=lambda r: r["p95_ms"], reverse=True)
+    return rows
+
+
+def slowest_sql(limit=20):
+    return sorted(snapshot("sql"), key=lambda r: r["max_ms"], reverse=True)[:limit]
+
+
+def format_row(row):
+    return (f"{row['name'][:160]}  ×{row['count']}  p50 {row['p50_ms']:.1f}  p95 {row['p95_ms']:.1f}  "
+            f"max {row['max_ms']:.1f} ms")
+
+
+def export(path):
+    """Write every statistic to `path` as JSON; returns the path."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"exported_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "stats": snapshot()},
+                  f, ensure_ascii=False, indent=1)
+    return path
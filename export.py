@@ -0,0 +1,112 @@
+# export.py - streaming CSV export of the ledgers, safe for millions of rows
+import csv
+import os
+import threading
+import time
+from contextlib import closing
+
+from db import open_connection
+
+CHUNK_SIZE = 2000
+PROGRESS_INTERVAL = 0.5  # seconds between progress callbacks
+
+# name -> (header, query); every query streams in a stable order
+EXPORTS = {
+    "clients": (
+        ["id", "الاسم", "الهاتف", "الأجر اليومي", "أيام العمل"],
+        "SELECT id, name, phone, daily_rate, days_worked FROM clients ORDER BY id",
+    ),
+    "attendance": (
+        ["id", "رقم العميل", "الاسم", "التاريخ"],
+        """SELECT a.id, a.client_id, c.name, a.date
+           FROM attendance a LEFT JOIN clients c ON c.id = a.client_id
+           ORDER BY a.date, a.client_id""",
+    ),
+    "payments": (
+        ["id", "رقم العميل", "الاسم", "المبلغ", "النوع", "التاريخ"],
+        """SELECT p.id, p.client_id, c.name, p.amount, p.type, p.date
+           FROM payments p LEFT JOIN clients c ON c.id = p.client_id
+           ORDER BY p.date, p.id""",
+    ),
+    "expenses": (
+        ["id", "النوع", "المبلغ", "الوصف", "التاريخ"],
+        "SELECT id, type, amount, description, date FROM expenses ORDER BY date, id",
+    ),
+    # one ledger per worker: each attendance day earns daily_rate, payments
+    # and advances are listed with their amounts; archived years open the
+    # ledger as one carried-forward balance
+    "statements": (
+        ["رقم العميل", "الاسم", "التاريخ", "البند", "المبلغ"],
+        """SELECT c.id, c.name, '', 'رصيد مرحل من الأرشيف',
+                  c.archived_days * COALESCE(c.daily_rate, 0) - c.archived_paid - c.archived_advances
+           FROM clients c WHERE c.archived_days OR c.archived_paid OR c.archived_advances
+           UNION ALL
+           SELECT c.id, c.name, a.date, 'حضور', c.daily_rate
+           FROM attendance a JOIN clients c ON c.id = a.client_id
+           UNION ALL
+           SELECT c.id, c.name, p.date, p.type, p.amount
+           FROM payments p JOIN clients c ON c.id = p.client_id
+           ORDER BY 1, 3""",
+    ),
+}
+
+
+def iter_rows(conn, sql, params=(), chunk_size=CHUNK_SIZE):
+    """Yield rows of `sql` while holding at most `chunk_size` of them in memory."""
+    cur = conn.execute(sql, params)
+    while True:
+        rows = cur.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield from rows
+
+
+def export_table(conn, name, path, progress=None):
+    """Stream one entry of EXPORTS to `path`; returns the number of data rows."""
+    header, sql = EXPORTS[name]
+    count = 0
+    last_report = time.monotonic()
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(header)
+        for row in iter_rows(conn, sql):
+            w.writerow(row)
+            count += 1
+            if progress and count % CHUNK_SIZE == 0 and time.monotonic() - last_report >= PROGRESS_INTERVAL:
+                last_report = time.monotonic()
+                progress(name, count)
+    if progress:
+        progress(name, count)
+    return count
+
+
+def export_all(out_dir, names=None, progress=None):
+    """Export `names` (default: every table) into `out_dir` as <name>.csv."""
+    os.makedirs(out_dir, exist_ok=True)
+    counts = {}
+    # one dedicated connection and one read transaction: all files share a snapshot
+    with closing(open_connection()) as conn:
+        conn.execute("BEGIN")
+        try:
+            for name in names or EXPORTS:
+                counts[name] = export_table(conn, name, os.path.join(out_dir, f"{name}.csv"), progress)
+        finally:
+            conn.rollback()
+    return counts
+
+
+def export_in_background(out_dir, names=None, progress=None, done=None, error=None):
+    """Run export_all on a daemon thread so a UI handler can return immediately."""
+    def run():
+        try:
+            counts = export_all(out_dir, names, progress)
+        except Exception as ex:
+            if error:
+                error(ex)
+            return
+        if done:
+            done(counts)
+
+    t = threading.Thread(target=run, name="csv-export", daemon=True)
+    t.start()
+    return t
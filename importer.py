@@ -0,0 +1,235 @@
+# importer.py - streaming bulk CSV import of clients, attendance and expenses
+#
+#   python importer.py clients workers.csv
+#   python importer.py attendance january.csv --rejects rejected.csv [--db path.db]
+#
+# Each file is loaded in one transaction with executemany batches; rows that
+# fail validation are collected with their line number instead of aborting.
+import argparse
+import csv
+import sys
+import time
+from contextlib import closing
+from datetime import date
+
+from db import invalidate_client_cache, migrate, open_connection, set_db_path
+
+BATCH_SIZE = 5000
+EXPENSE_TYPES = ("مصروف", "دخل")
+
+# accepted header names per column; the export.py headers are included so an
+# exported file can be imported back
+COLUMNS = {
+    "clients": {
+        "name": ("name", "الاسم"),
+        "phone": ("phone", "الهاتف"),
+        "daily_rate": ("daily_rate", "rate", "الأجر اليومي"),
+    },
+    "attendance": {
+        "client_id": ("client_id", "رقم العميل"),
+        "name": ("name", "الاسم"),
+        "date": ("date", "التاريخ"),
+    },
+    "expenses": {
+        "type": ("type", "النوع"),
+        "amount": ("amount", "المبلغ"),
+        "description": ("description", "الوصف"),
+        "date": ("date", "التاريخ"),
+    },
+}
+
+
+class RowError(ValueError):
+    pass
+
+
+def _column_map(kind, header):
+    positions = {}
+    normalized = [h.strip().lower() for h in header]
+    for field, aliases in COLUMNS[kind].items():
+        for alias in aliases:
+            if alias.lower() in normalized:
+                positions[field] = normalized.index(alias.lower())
+                break
+    return positions
+
+
+def _get(row, positions, field):
+    i = positions.get(field)
+    if i is None or i >= len(row):
+        return ""
+    return row[i].strip()
+
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value).strftime("%Y-%m-%d")
+    except ValueError:
+        raise RowError(f"تاريخ غير صحيح: {value!r}")
+
+
+def _parse_amount(value, field):
+    try:
+        return float(value or 0)
+    except ValueError:
+        raise RowError(f"{field} غير صحيح: {value!r}")
+
+
+# -------------------- ROW VALIDATORS --------------------
+def _client_row(row, positions, ctx):
+    name = _get(row, positions, "name")
+    if not name:
+        raise RowError("الاسم مطلوب")
+    rate = _parse_amount(_get(row, positions, "daily_rate"), "الأجر")
+    if rate < 0:
+        raise RowError("الأجر سالب")
+    return name, _get(row, positions, "phone"), rate
+
+
+def _attendance_row(row, positions, ctx):
+    raw_id = _get(row, positions, "client_id")
+    if raw_id:
+        try:
+            cid = int(raw_id)
+        except ValueError:
+            raise RowError(f"رقم عميل غير صحيح: {raw_id!r}")
+        if cid not in ctx["ids"]:
+            raise RowError(f"عميل غير موجود: {cid}")
+    else:
+        name = _get(row, positions, "name")
+        if not name:
+            raise RowError("رقم العميل أو الاسم مطلوب")
+        cid = ctx["by_name"].get(name)
+        if cid is None:
+            raise RowError(f"عميل غير موجود: {name}")
+        if cid == -1:
+            raise RowError(f"الاسم مكرر، استخدم رقم العميل: {name}")
+    return cid, _parse_date(_get(row, positions, "date"))
+
+
+def _expense_row(row, positions, ctx):
+    etype = _get(row, positions, "type")
+    if etype not in EXPENSE_TYPES:
+        raise RowError(f"النوع يجب أن يكون {' أو '.join(EXPENSE_TYPES)}: {etype!r}")
+    amount = _parse_amount(_get(row, positions, "amount"), "المبلغ")
+    return etype, amount, _get(row, positions, "description"), _parse_date(_get(row, positions, "date"))
+
+
+KINDS = {
+    "clients": (_client_row, ("name",),
+                "INSERT INTO clients (name, phone, daily_rate, days_worked) VALUES (?, ?, ?, 0)"),
+    # duplicates of an existing (client, date) are skipped by the unique index
+    "attendance": (_attendance_row, ("date",),
+                   "INSERT OR IGNORE INTO attendance (client_id, date) VALUES (?, ?)"),
+    "expenses": (_expense_row, ("type", "amount", "date"),
+                 "INSERT INTO expenses (type, amount, description, date) VALUES (?, ?, ?, ?)"),
+}
+
+
+def _attendance_context(conn):
+    ids = set()
+    by_name = {}
+    for cid, name in conn.execute("SELECT id, name FROM clients"):
+        ids.add(cid)
+        by_name[name] = -1 if name in by_name else cid
+    return {"ids": ids, "by_name": by_name}
+
+
+def import_csv(kind, path, max_rejects=1000):
+    """Load one CSV file of `kind` ('clients', 'attendance' or 'expenses').
+
+    Returns a dict with inserted/skipped counts, the first `max_rejects`
+    rejected lines as (line_no, reason, row) and throughput figures.
+    """
+    validate, required, insert_sql = KINDS[kind]
+    start = time.perf_counter()
+    result = {"kind": kind, "read": 0, "inserted": 0, "skipped": 0, "rejected_count": 0, "rejected": []}
+
+    with closing(open_connection()) as conn, open(path, newline="", encoding="utf-8-sig") as f:
+        migrate(conn)
+        reader = csv.reader(f)
+        header = next(reader, None)
+        positions = _column_map(kind, header or [])
+        missing = [c for c in required if c not in positions]
+        if kind == "attendance" and "client_id" not in positions and "name" not in positions:
+            missing.append("client_id/name")
+        if missing:
+            raise ValueError(f"{path}: أعمدة ناقصة: {', '.join(missing)}")
+
+        ctx = _attendance_context(conn) if kind == "attendance" else None
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            batch = []
+
+            def flush():
+                # rowcount counts direct inserts only, not trigger side effects
+                inserted = conn.executemany(insert_sql, batch).rowcount
+                result["inserted"] += inserted
+                result["skipped"] += len(batch) - inserted
+                batch.clear()
+
+            for line_no, row in enumerate(reader, start=2):
+                if not any(cell.strip() for cell in row):
+                    continue
+                result["read"] += 1
+                try:
+                    batch.append(validate(row, positions, ctx))
+                except RowError as ex:
+                    result["rejected_count"] += 1
+                    if len(result["rejected"]) < max_rejects:
+                        result["rejected"].append((line_no, str(ex), row))
+                    continue
+                if len(batch) >= BATCH_SIZE:
+                    flush()
+            if batch:
+                flush()
+            # days_worked follows attendance through its triggers
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    invalidate_client_cache()
+
+    elapsed = time.perf_counter() - start
+    result["seconds"] = elapsed
+    result["rows_per_sec"] = result["read"] / elapsed if elapsed else 0.0
+    return result
+
+
+def write_rejects(result, path):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["السطر", "السبب", "البيانات"])
+        for line_no, reason, row in result["rejected"]:
+            w.writerow([line_no, reason, *row])
+
+
+def format_result(result):
+    return (
+        f"{result['kind']}: read {result['read']}, inserted {result['inserted']}, "
+        f"skipped {result['skipped']}, rejected {result['rejected_count']} "
+        f"in {result['seconds']:.2f}s ({result['rows_per_sec']:.0f} rows/s)"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk CSV import")
+    parser.add_argument("kind", choices=sorted(KINDS))
+    parser.add_argument("path")
+    parser.add_argument("--rejects", help="write rejected lines to this CSV")
+    parser.add_argument("--db", help="database file (default: worker_manager_final.db)")
+    args = parser.parse_args(argv)
+    if args.db:
+        set_db_path(args.db)
+
+    result = import_csv(args.kind, args.path)
+    print(format_result(result))
+    for line_no, reason, _ in result["rejected"][:20]:
+        print(f"  line {line_no}: {reason}", file=sys.stderr)
+    if args.rejects:
+        write_rejects(result, args.rejects)
+    return 1 if result["rejected_count"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,219 +1,47 @@
 # phone_app.py
 import flet as ft
-import sqlite3
-from datetime import date
+import asyncio
+from datetime import date, timedelta
+import atexit
 import csv
-
-DB = "manager_app_complete.db"
-
-# -------------------- DATABASE INITIALIZATION --------------------
-def init_db():
-    conn = None
-    try:
-        conn = sqlite3.connect(DB)
-        c = conn.cursor()
-        c.execute("PRAGMA foreign_keys = ON")
-
-        # clients table
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS clients(
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                phone TEXT,
-                daily_rate REAL DEFAULT 0,
-                days_worked INTEGER DEFAULT 0
-            )
-        """)
-
-        # attendance table
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS attendance(
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                client_id INTEGER,
-                date TEXT,
-                FOREIGN KEY(client_id) REFERENCES clients(id) ON DELETE CASCADE
-            )
-        """)
-
-        # payments table (payments and advances for clients)
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS payments(
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                client_id INTEGER,
-                amount REAL,
-                type TEXT,
-                date TEXT,
-                FOREIGN KEY(client_id) REFERENCES clients(id) ON DELETE CASCADE
-            )
-        """)
-
-        # expenses table
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS expenses(
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                type TEXT,
-                amount REAL,
-                description TEXT,
-                date TEXT
-            )
-        """)
-
-        # ensure columns exist for older DBs
-        cols = [r[1] for r in c.execute("PRAGMA table_info(clients)").fetchall()]
-        if "daily_rate" not in cols:
-            try:
-                c.execute("ALTER TABLE clients ADD COLUMN daily_rate REAL DEFAULT 0")
-            except Exception:
-                pass
-        if "days_worked" not in cols:
-            try:
-                c.execute("ALTER TABLE clients ADD COLUMN days_worked INTEGER DEFAULT 0")
-            except Exception:
-                pass
-
-        conn.commit()
-    except sqlite3.Error as e:
-        print("DB init error:", e)
-    finally:
-        if conn:
-            conn.close()
-
-# -------------------- DB HELPERS --------------------
-def fetch_clients(order_by_name=True, search=None):
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    if search:
-        q = f"%{search}%"
-        c.execute("SELECT id, name, phone, daily_rate, days_worked FROM clients WHERE name LIKE ? ORDER BY name", (q,))
-    else:
-        c.execute("SELECT id, name, phone, daily_rate, days_worked FROM clients ORDER BY name" if order_by_name else "SELECT id, name, phone, daily_rate, days_worked FROM clients")
-    rows = c.fetchall()
-    conn.close()
-    return rows
-
-def insert_client(name, phone, rate):
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    c.execute("INSERT INTO clients (name, phone, daily_rate, days_worked) VALUES (?, ?, ?, 0)", (name, phone, rate))
-    conn.commit()
-    conn.close()
-
-def update_client_db(cid, name, phone, rate, days_worked=None):
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    c.execute("UPDATE clients SET name=?, phone=?, daily_rate=? WHERE id=?", (name, phone, rate, cid))
-    if days_worked is not None:
-        c.execute("UPDATE clients SET days_worked=? WHERE id=?", (days_worked, cid))
-    conn.commit()
-    conn.close()
-
-def delete_client_db(cid):
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    c.execute("DELETE FROM clients WHERE id=?", (cid,))
-    conn.commit()
-    conn.close()
-
-# attendance
-def get_attendance_ids(date_str):
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    c.execute("SELECT client_id FROM attendance WHERE date=?", (date_str,))
-    ids = [r[0] for r in c.fetchall()]
-    conn.close()
-    return ids
-
-def register_attendance_db(cid, date_str):
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    c.execute("SELECT id FROM attendance WHERE client_id=? AND date=?", (cid, date_str))
-    if not c.fetchone():
-        c.execute("INSERT INTO attendance (client_id, date) VALUES (?, ?)", (cid, date_str))
-        c.execute("UPDATE clients SET days_worked = days_worked + 1 WHERE id=?", (cid,))
-    conn.commit()
-    conn.close()
-
-def remove_attendance_db(cid, date_str):
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    c.execute("DELETE FROM attendance WHERE client_id=? AND date=?", (cid, date_str))
-    c.execute("UPDATE clients SET days_worked = days_worked - 1 WHERE id=?", (cid,))
-    conn.commit()
-    conn.close()
-
-# payments
-def get_payments_for_client(cid):
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    c.execute("SELECT id, amount, type, date FROM payments WHERE client_id=? ORDER BY date DESC", (cid,))
-    rows = c.fetchall()
-    conn.close()
-    return rows
-
-def insert_payment(cid, amount, ptype):
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    today = date.today().strftime("%Y-%m-%d")
-    c.execute("INSERT INTO payments (client_id, amount, type, date) VALUES (?, ?, ?, ?)", (cid, amount, ptype, today))
-    conn.commit()
-    conn.close()
-
-def delete_payment(pid):
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    c.execute("DELETE FROM payments WHERE id=?", (pid,))
-    conn.commit()
-    conn.close()
-
-# expenses / incomes
-def get_all_expenses():
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    c.execute("SELECT id, type, amount, description, date FROM expenses ORDER BY id DESC")
-    rows = c.fetchall()
-    conn.close()
-    return rows
-
-def insert_expense(type_, amount, desc):
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    today = date.today().strftime("%Y-%m-%d")
-    c.execute("INSERT INTO expenses (type, amount, description, date) VALUES (?, ?, ?, ?)", (type_, amount, desc, today))
-    conn.commit()
-    conn.close()
-
-def delete_expense_db(eid):
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    c.execute("DELETE FROM expenses WHERE id=?", (eid,))
-    conn.commit()
-    conn.close()
-
-def update_expense_db(eid, type_, amount, desc):
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    c.execute("UPDATE expenses SET type=?, amount=?, description=? WHERE id=?", (type_, amount, desc, eid))
-    conn.commit()
-    conn.close()
-
-# report
-def compute_report():
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    c.execute("SELECT COUNT(*) FROM clients")
-    num_clients = c.fetchone()[0] or 0
-    c.execute("SELECT COUNT(*) FROM attendance")
-    total_att = c.fetchone()[0] or 0
-    c.execute("SELECT SUM(amount) FROM expenses WHERE type='دخل'")
-    total_income = c.fetchone()[0] or 0
-    c.execute("SELECT SUM(amount) FROM expenses WHERE type='مصروف'")
-    total_exp = c.fetchone()[0] or 0
-    conn.close()
-    net = (total_income or 0) - (total_exp or 0)
-    return num_clients, total_att, (total_income or 0), (total_exp or 0), net
+import os
+import time
+
+import diagnostics
+diagnostics.install()  # before the db helpers are imported, so they get timed
+from diagnostics import timed
+
+from attendance_buffer import AttendanceBuffer
+from export import export_in_background
+from reconcile import reconcile_in_background
+from archive import archive_in_background
+from backup import list_backups, backup_in_background, restore_in_background
+from sites import open_current_site, load_registry, add_site, switch_site, consolidated_report
+from sync import last_peer, peer_token, sync_in_background
+from payroll import compute_payroll, payroll_totals, what_if_balances
+from db import (
+    init_db,
+    get_client, fetch_clients, client_cursor, search_clients,
+    insert_client, update_client_db, delete_client_db,
+    get_attendance_ids,
+    mark_all_present, clear_attendance, copy_attendance,
+    get_payments, add_payment_db, delete_payment_db,
+    get_expenses, add_expense_db, update_expense_db, delete_expense_db,
+    compute_report, rebuild_report_summary, get_range_report, period_range,
+    archived_years,
+)
+
+# files live in the app's data folder (set by Flet on phones), else next to this file
+DATA_DIR = os.environ.get("FLET_APP_STORAGE_DATA") or os.path.dirname(os.path.abspath(__file__))
+DB = os.path.join(DATA_DIR, "manager_app_complete.db")
+SITES_FILE = os.path.join(DATA_DIR, "manager_sites.json")  # site name -> database file, see sites.py
+
+SEARCH_DEBOUNCE = 0.3  # seconds of typing pause before searching
+EXPORT_DIR = os.path.join(DATA_DIR, "exports")
 
 # -------------------- UI (FLET) --------------------
 def main(page: ft.Page):
+    site = open_current_site("الموقع الرئيسي", DB, SITES_FILE)
     init_db()
 
     page.title = "نظام إدارة العمال - كامل"
@@ -231,18 +59,33 @@ def main(page: ft.Page):
         page.snack_bar.open = True
         page.update()
 
-    screens = {}
+    # screens are built (and filled) on their first visit, see go()
+    screens = {}   # name -> built screen
+    builders = {}  # name -> (build function, first fill or None)
+    current_site = [site]
 
     # ---------- HOME ----------
-    home_col = ft.Column([
-        ft.Text("🏠 لوحة التحكم", size=22, weight="bold"),
-        ft.ElevatedButton("👷 إدارة العملاء", width=320, on_click=lambda e: go("clients")),
-        ft.ElevatedButton("🕒 الحضور اليومي", width=320, on_click=lambda e: go("attendance")),
-        ft.ElevatedButton("💰 المصروفات والإيرادات", width=320, on_click=lambda e: go("expenses")),
-        ft.ElevatedButton("📊 التقرير المالي", width=320, on_click=lambda e: go("report")),
-        ft.Text("مصمم بواسطة: مريم علاء", size=12, color="#6A1B9A")
-    ], spacing=12, alignment=ft.MainAxisAlignment.CENTER)
-    screens["home"] = home_col
+    site_label = ft.Text(f"📍 الموقع: {site}", size=14, color="#6A1B9A")
+
+    def open_diagnostics(e):
+        # hidden: long-press the title, only when diagnostics are enabled
+        if diagnostics.enabled():
+            go("diagnostics")
+            refresh_diagnostics()
+
+    def build_home():
+        return ft.Column([
+            ft.Container(ft.Text("🏠 لوحة التحكم", size=22, weight="bold"), on_long_press=open_diagnostics),
+            site_label,
+            ft.ElevatedButton("👷 إدارة العملاء", width=320, on_click=lambda e: go("clients")),
+            ft.ElevatedButton("🕒 الحضور اليومي", width=320, on_click=lambda e: go("attendance")),
+            ft.ElevatedButton("💰 المصروفات والإيرادات", width=320, on_click=lambda e: go("expenses")),
+            ft.ElevatedButton("📊 التقرير المالي", width=320, on_click=lambda e: (go("report"), refresh_range_report())),
+            ft.ElevatedButton("💵 الرواتب", width=320, on_click=lambda e: (go("payroll"), refresh_payroll_ui())),
+            ft.ElevatedButton("🏗️ المواقع", width=320, on_click=lambda e: (go("sites"), refresh_sites_ui())),
+            ft.Text("مصمم بواسطة: مريم علاء", size=12, color="#6A1B9A")
+        ], spacing=12, alignment=ft.MainAxisAlignment.CENTER)
+    builders["home"] = (build_home, None)
 
     # ---------- CLIENTS SCREEN ----------
     search_field = ft.TextField(label="بحث بالاسم", width=300)
@@ -250,26 +93,111 @@ def main(page: ft.Page):
     client_phone = ft.TextField(label="الهاتف", width=140)
     client_rate = ft.TextField(label="الأجر اليومي", width=140)
     clients_list = ft.ListView(expand=True, spacing=6)
-
+    CLIENTS_PAGE_SIZE = 50
+    clients_page = {"search": None, "after": None, "done": False, "loading": False}
+
+    # keyed control registries (client id -> control) so a single change patches
+    # one row with control.update() instead of rebuilding every list
+    client_rows = {}
+    att_boxes = {}
+
+    def client_info(phone, rate, days):
+        return f"{phone or ''} | أجر: {rate} | أيام: {days}"
+
+    def client_row(row):
+        cid, name, phone, rate, days = row
+        # row with name clickable
+        name_btn = ft.ElevatedButton(name, expand=True, on_click=lambda e, cid=cid: open_client_detail(cid))
+        info = ft.Text(client_info(phone, rate, days), size=12)
+        del_btn = ft.ElevatedButton("حذف", bgcolor="red", color="white", on_click=lambda e, cid=cid: (delete_client_and_refresh(cid)))
+        row_ctl = ft.Row([name_btn, info, del_btn], alignment=ft.MainAxisAlignment.SPACE_BETWEEN)
+        client_rows[cid] = row_ctl
+        return row_ctl
+
+    def patch_client(cid):
+        # re-read one client (cache-backed) and patch only its visible controls
+        row = get_client(cid)
+        row_ctl = client_rows.get(cid)
+        box = att_boxes.get(cid)
+        if row is None:
+            if row_ctl is not None:
+                clients_list.controls.remove(client_rows.pop(cid))
+                clients_list.update()
+            if box is not None:
+                attendance_list.controls.remove(att_boxes.pop(cid))
+                attendance_list.update()
+            return
+        _, name, phone, rate, days = row
+        if row_ctl is not None:
+            name_btn, info, _ = row_ctl.controls
+            name_btn.text = name
+            info.value = client_info(phone, rate, days)
+            row_ctl.update()
+        if box is not None:
+            box.label = f"{name} | {phone or ''}"
+            box.update()
+
+    @timed
+    def load_more_clients():
+        # keyset pagination: fetch and build one page of rows at a time
+        if clients_page["done"] or clients_page["loading"]:
+            return
+        clients_page["loading"] = True
+        try:
+            if clients_page["search"]:
+                # search shows the best-ranked matches only, no further pages
+                rows = search_clients(clients_page["search"], limit=CLIENTS_PAGE_SIZE)
+                clients_page["done"] = True
+            else:
+                rows = fetch_clients(after=clients_page["after"], limit=CLIENTS_PAGE_SIZE)
+                clients_page["done"] = len(rows) < CLIENTS_PAGE_SIZE
+            clients_list.controls.extend(client_row(r) for r in rows)
+            if rows:
+                clients_page["after"] = client_cursor(rows[-1])
+        finally:
+            clients_page["loading"] = False
+
+    @timed
     def refresh_clients(search=None):
+        if "clients" not in screens:
+            return
         clients_list.controls.clear()
-        rows = fetch_clients(search=search)
-        for cid, name, phone, rate, days in rows:
-            # row with name clickable
-            name_btn = ft.ElevatedButton(name, expand=True, on_click=lambda e, cid=cid: open_client_detail(cid))
-            info = ft.Text(f"{phone or ''} | أجر: {rate} | أيام: {days}", size=12)
-            del_btn = ft.ElevatedButton("حذف", bgcolor="red", color="white", on_click=lambda e, cid=cid: (delete_client_and_refresh(cid)))
-            clients_list.controls.append(ft.Row([name_btn, info, del_btn], alignment=ft.MainAxisAlignment.SPACE_BETWEEN))
+        client_rows.clear()
+        clients_page.update(search=search, after=None, done=False)
+        load_more_clients()
         page.update()
 
+    # the phone layout scrolls the whole page, so page further on page scroll
+    def on_page_scroll(e):
+        if "clients" not in screens or not screens["clients"].visible or clients_page["done"]:
+            return
+        if e.pixels >= e.max_scroll_extent - 300:
+            load_more_clients()
+            page.update()
+
+    page.on_scroll_interval = 100
+    page.on_scroll = on_page_scroll
+
+    # debounced as-you-type search: the pause waits on the event loop and the
+    # query then runs on Flet's handler threads, like any other handler here
+    search_task = {"t": None}
+    async def search_after_pause():
+        await asyncio.sleep(SEARCH_DEBOUNCE)
+        page.run_thread(refresh_clients, search_field.value)
+    def on_search_change(e):
+        if search_task["t"]:
+            search_task["t"].cancel()
+        search_task["t"] = page.run_task(search_after_pause)
+    search_field.on_change = on_search_change
+
+    @timed
     def delete_client_and_refresh(cid):
         delete_client_db(cid)
         notify("✅ تم حذف العميل", "green")
-        refresh_clients()
-        refresh_attendance()
+        patch_client(cid)
         refresh_report_ui() # <--- تم التصحيح هنا
-        page.update()
 
+    @timed
     def add_client_action(e):
         name = client_name.value.strip()
         if not name:
@@ -288,13 +216,9 @@ def main(page: ft.Page):
         refresh_report_ui() # <--- تم التصحيح هنا
         page.update()
 
+    @timed
     def open_client_detail(cid):
-        # fetch client
-        client = None
-        for r in fetch_clients():
-            if r[0] == cid:
-                client = r
-                break
+        client = get_client(cid)
         if not client:
             notify("⚠️ العميل غير موجود", "red")
             return
@@ -304,52 +228,75 @@ def main(page: ft.Page):
         name_f = ft.TextField(label="الاسم", value=name, width=260)
         phone_f = ft.TextField(label="الهاتف", value=phone or "", width=160)
         rate_f = ft.TextField(label="الأجر اليومي", value=str(rate or 0), width=140)
-        days_f = ft.TextField(label="عدد الأيام", value=str(days or 0), width=120)
+        # days worked follow the attendance records, so the field is read-only
+        days_f = ft.TextField(label="عدد الأيام", value=str(days or 0), width=120, read_only=True)
 
         payments_list = ft.ListView(expand=True, spacing=6)
-        def refresh_payments_list():
+        payment_rows = {}
+        def payment_row(pid, amount, ptype, dt):
+            row_ctl = ft.Row([ft.Text(f"{dt} | {ptype}: {amount}ج"), ft.IconButton(icon=ft.Icons.DELETE, icon_color="red", on_click=lambda e, pid=pid: delete_payment_action(pid))])
+            payment_rows[pid] = row_ctl
+            return row_ctl
+        @timed
+        def delete_payment_action(pid):
+            delete_payment_db(pid)
+            payments_list.controls.remove(payment_rows.pop(pid))
+            payments_list.update()
+        for pid, amount, ptype, dt in get_payments(cid):
+            payments_list.controls.append(payment_row(pid, amount, ptype, dt))
+
+        @timed
+        def show_archived_payments(e):
+            # older years live in archive files: read them only when asked for
+            years = archived_years()
+            if not years:
+                notify("ℹ️ لا توجد سنوات مؤرشفة", "green")
+                return
+            live_ids = {row[0] for row in get_payments(cid)}
             payments_list.controls.clear()
-            for pid, amount, ptype, dt in get_payments_for_client(cid):
-                payments_list.controls.append(ft.Row([ft.Text(f"{dt} | {ptype}: {amount}ج"), ft.IconButton(icon=ft.Icons.DELETE, icon_color="red", on_click=lambda e, pid=pid: (delete_payment(pid), refresh_payments_list(), refresh_report_ui()))])) # <--- تم التصحيح هنا
-            page.update()
-        refresh_payments_list()
+            payment_rows.clear()
+            for pid, amount, ptype, dt in get_payments(cid, since=f"{years[0]}-01-01"):
+                if pid in live_ids:
+                    payments_list.controls.append(payment_row(pid, amount, ptype, dt))
+                else:  # archived rows are read-only
+                    payments_list.controls.append(ft.Text(f"📦 {dt} | {ptype}: {amount}ج", color="grey"))
+            payments_list.update()
 
         payment_amount = ft.TextField(label="المبلغ", width=140)
         payment_type = ft.Dropdown(width=140, value="دفع", options=[ft.dropdown.Option("دفع"), ft.dropdown.Option("سلفة")])
+        @timed
         def add_payment_action(e):
             try:
                 amt = float(payment_amount.value)
             except:
                 notify("⚠️ أدخلي مبلغ صحيح", "red")
                 return
-            insert_payment(cid, amt, payment_type.value)
+            pid = add_payment_db(cid, amt, payment_type.value)
             payment_amount.value = ""
+            # newest first, matching get_payments' ORDER BY date DESC
+            payments_list.controls.insert(0, payment_row(pid, amt, payment_type.value, date.today().strftime("%Y-%m-%d")))
             notify("✅ تم تسجيل الدفعة", "green")
-            refresh_payments_list()
-            refresh_report_ui() # <--- تم التصحيح هنا
-            page.update()
 
+        @timed
         def save_client_changes(e):
             new_name = name_f.value.strip()
             try:
                 new_rate = float(rate_f.value or 0)
-                new_days = int(days_f.value or 0)
             except:
                 notify("⚠️ القيم غير صحيحة", "red")
                 return
-            update_client_db(cid, new_name, phone_f.value.strip(), new_rate, new_days)
+            update_client_db(cid, new_name, phone_f.value.strip(), new_rate)
             notify("✅ تم حفظ التعديلات", "green")
-            refresh_clients()
-            refresh_attendance()
-            refresh_report_ui() # <--- تم التصحيح هنا
             go("clients")
+            patch_client(cid)
 
+        @timed
         def delete_client_from_detail(e):
             delete_client_db(cid)
             notify("✅ تم حذف العميل", "green")
-            refresh_clients()
-            refresh_attendance()
             go("clients")
+            patch_client(cid)
+            refresh_report_ui()
 
         details = ft.Column([
             ft.Row([ft.ElevatedButton("رجوع", on_click=lambda e: go("clients"))]),
@@ -357,7 +304,7 @@ def main(page: ft.Page):
             name_f, phone_f, rate_f, days_f,
             ft.Row([ft.ElevatedButton("💾 حفظ", on_click=save_client_changes), ft.ElevatedButton("❌ حذف العميل", bgcolor="red", color="white", on_click=delete_client_from_detail)], spacing=10),
             ft.Divider(),
-            ft.Text("الدفعات:", weight="bold"),
+            ft.Row([ft.Text("الدفعات:", weight="bold"), ft.TextButton("📦 السجل المؤرشف", on_click=show_archived_payments)]),
             payments_list,
             ft.Row([payment_amount, payment_type, ft.ElevatedButton("إضافة دفعة", on_click=add_payment_action)], spacing=8)
         ], spacing=10)
@@ -368,47 +315,92 @@ def main(page: ft.Page):
         screens["clients"].visible = True
         page.update()
 
-    clients_controls = ft.Column([
-        ft.Row([ft.ElevatedButton("رجوع", on_click=lambda e: go("home"))]),
-        ft.Text("👷 إدارة العملاء", size=18, weight="bold"),
-        ft.Row([search_field, ft.ElevatedButton("بحث", on_click=lambda e: refresh_clients(search_field.value))]),
-        ft.Row([client_name, client_phone, client_rate, ft.ElevatedButton("حفظ", on_click=add_client_action)], spacing=8),
-        ft.Text("قائمة العملاء:", weight="bold"),
-        clients_list
-    ], spacing=10)
-    screens["clients"] = clients_controls
+    clients_home_controls = []
+
+    def build_clients():
+        col = ft.Column([
+            ft.Row([ft.ElevatedButton("رجوع", on_click=lambda e: go("home"))]),
+            ft.Text("👷 إدارة العملاء", size=18, weight="bold"),
+            ft.Row([search_field, ft.ElevatedButton("بحث", on_click=lambda e: refresh_clients(search_field.value))]),
+            ft.Row([client_name, client_phone, client_rate, ft.ElevatedButton("حفظ", on_click=add_client_action)], spacing=8),
+            ft.Text("قائمة العملاء:", weight="bold"),
+            clients_list
+        ], spacing=10)
+        clients_home_controls[:] = col.controls
+        return col
+    builders["clients"] = (build_clients, refresh_clients)
 
     # ---------- ATTENDANCE ----------
     att_date_field = ft.TextField(label="التاريخ (YYYY-MM-DD)", value=date.today().strftime("%Y-%m-%d"), width=200)
     attendance_list = ft.ListView(expand=True, spacing=6)
 
+    def after_attendance_flush(changes):
+        # the checkboxes already show the new state; patch the rest
+        for cid in {cid for cid, _, _ in changes}:
+            patch_client(cid)
+        refresh_report_ui()
+
+    # toggles are coalesced and written in one transaction per burst
+    att_buffer = AttendanceBuffer(
+        on_flush=after_attendance_flush,
+        on_error=lambda ex: notify(f"⚠️ لم يتم حفظ الحضور: {ex}", "red"),
+    )
+    atexit.register(att_buffer.flush)
+    page.on_disconnect = lambda e: att_buffer.flush()
+
+    def save_attendance():
+        att_buffer.flush()
+        notify("✅ تم الحفظ", "green")
+
+    @timed
     def refresh_attendance():
+        if "attendance" not in screens:
+            return
+        att_buffer.flush()
         attendance_list.controls.clear()
+        att_boxes.clear()
         cur_date = att_date_field.value
-        attended = get_attendance_ids(cur_date)
+        attended = set(get_attendance_ids(cur_date))
         for cid, name, phone, rate, days in fetch_clients():
             checked = cid in attended
             checkbox = ft.Checkbox(label=f"{name} | {phone or ''}", value=checked)
             def toggle(e, cid_val=cid, date_val=cur_date, chk=checkbox):
-                if chk.value:
-                    register_attendance_db(cid_val, date_val)
-                else:
-                    remove_attendance_db(cid_val, date_val)
-                refresh_attendance()
-                refresh_clients()
-                refresh_report_ui() # <--- تم التصحيح هنا
+                att_buffer.toggle(cid_val, date_val, chk.value)
             checkbox.on_change = toggle
+            att_boxes[cid] = checkbox
             attendance_list.controls.append(checkbox)
         page.update()
 
-    attendance_controls = ft.Column([
-        ft.Row([ft.ElevatedButton("رجوع", on_click=lambda e: go("home"))]),
-        ft.Text("🕒 الحضور اليومي", size=18, weight="bold"),
-        att_date_field,
-        ft.Row([ft.ElevatedButton("تحديث", on_click=lambda e: refresh_attendance()), ft.ElevatedButton("حفظ", on_click=lambda e: notify("✅ تم الحفظ","green"))]),
-        attendance_list
-    ], spacing=10)
-    screens["attendance"] = attendance_controls
+    @timed
+    def bulk_attendance(action):
+        day = att_date_field.value
+        try:
+            prev_day = (date.fromisoformat(day) - timedelta(days=1)).strftime("%Y-%m-%d")
+        except ValueError:
+            notify("⚠️ التاريخ غير صحيح", "red")
+            return
+        att_buffer.flush()
+        if action == "all":
+            added, removed = mark_all_present(day)
+        elif action == "clear":
+            added, removed = clear_attendance(day)
+        else:
+            added, removed = copy_attendance(prev_day, day)
+        notify(f"✅ تم تسجيل {added} وإلغاء {removed}", "green")
+        refresh_attendance()
+        refresh_clients()
+        refresh_report_ui()
+
+    def build_attendance():
+        return ft.Column([
+            ft.Row([ft.ElevatedButton("رجوع", on_click=lambda e: go("home"))]),
+            ft.Text("🕒 الحضور اليومي", size=18, weight="bold"),
+            att_date_field,
+            ft.Row([ft.ElevatedButton("✅ حضور الكل", on_click=lambda e: bulk_attendance("all")), ft.ElevatedButton("🧹 مسح الكل", on_click=lambda e: bulk_attendance("clear")), ft.ElevatedButton("📋 نسخ من اليوم السابق", on_click=lambda e: bulk_attendance("copy"))], wrap=True),
+            ft.Row([ft.ElevatedButton("تحديث", on_click=lambda e: refresh_attendance()), ft.ElevatedButton("حفظ", on_click=lambda e: save_attendance())]),
+            attendance_list
+        ], spacing=10)
+    builders["attendance"] = (build_attendance, refresh_attendance)
 
     # ---------- EXPENSES / INCOME ----------
     exp_type = ft.Dropdown(width=150, value="مصروف", options=[ft.dropdown.Option("مصروف"), ft.dropdown.Option("دخل")])
@@ -419,9 +411,12 @@ def main(page: ft.Page):
     # edit state
     edit_exp_id = {"id": None}
 
+    @timed
     def refresh_expenses_ui():
+        if "expenses" not in screens:
+            return
         expenses_list_view.controls.clear()
-        for eid, t, a, d, dt in get_all_expenses():
+        for eid, t, a, d, dt in get_expenses():
             edit_btn = ft.IconButton(icon=ft.Icons.EDIT, on_click=lambda e, id=eid, tt=t, aa=a, dd=d: start_edit_expense(id, tt, aa, dd))
             del_btn = ft.IconButton(icon=ft.Icons.DELETE, icon_color="red", on_click=lambda e, id=eid: (delete_expense_db(id), notify("🗑️ تم الحذف","green"), refresh_expenses_ui(), refresh_report_ui())) # <--- تم التصحيح هنا
             expenses_list_view.controls.append(ft.Row([ft.Text(f"{dt} | {t}: {a} ج.م | {d}", expand=True), edit_btn, del_btn]))
@@ -434,6 +429,7 @@ def main(page: ft.Page):
         edit_exp_id["id"] = eid
         save_expense_button.text = "تحديث"
 
+    @timed
     def save_expense_action(e):
         try:
             amt = float(exp_amount.value)
@@ -448,7 +444,7 @@ def main(page: ft.Page):
             edit_exp_id["id"] = None
             save_expense_button.text = "حفظ"
         else:
-            insert_expense(typ, amt, desc)
+            add_expense_db(typ, amt, desc)
             notify("✅ تم الإضافة", "green")
         exp_amount.value = exp_desc.value = ""
         refresh_expenses_ui()
@@ -457,19 +453,23 @@ def main(page: ft.Page):
 
     save_expense_button = ft.ElevatedButton("حفظ", on_click=save_expense_action)
 
-    expenses_controls = ft.Column([
-        ft.Row([ft.ElevatedButton("رجوع", on_click=lambda e: go("home"))]),
-        ft.Text("💰 المصروفات والإيرادات", size=18, weight="bold"),
-        ft.Row([exp_type, exp_amount, exp_desc, save_expense_button], spacing=8),
-        ft.Text("السجل:", weight="bold"),
-        expenses_list_view
-    ], spacing=10)
-    screens["expenses"] = expenses_controls
+    def build_expenses():
+        return ft.Column([
+            ft.Row([ft.ElevatedButton("رجوع", on_click=lambda e: go("home"))]),
+            ft.Text("💰 المصروفات والإيرادات", size=18, weight="bold"),
+            ft.Row([exp_type, exp_amount, exp_desc, save_expense_button], spacing=8),
+            ft.Text("السجل:", weight="bold"),
+            expenses_list_view
+        ], spacing=10)
+    builders["expenses"] = (build_expenses, refresh_expenses_ui)
 
     # ---------- REPORT ----------
     report_text = ft.Text("", size=14)
 
+    @timed
     def refresh_report_ui():
+        if "report" not in screens:
+            return
         n, att, inc, exp, net = compute_report()
         report_text.value = (
             f"عدد العملاء: {n}\n"
@@ -478,16 +478,59 @@ def main(page: ft.Page):
             f"إجمالي المصروف: {exp} ج.م\n"
             f"صافي الأرباح: {net} ج.م"
         )
+        report_text.update()
+
+    # period report (this week / this month / custom) summed from daily_rollup
+    report_period = ft.Dropdown(width=150, value="month", options=[
+        ft.dropdown.Option("today", "اليوم"),
+        ft.dropdown.Option("week", "هذا الأسبوع"),
+        ft.dropdown.Option("month", "هذا الشهر"),
+        ft.dropdown.Option("custom", "فترة مخصصة"),
+    ])
+    report_from = ft.TextField(label="من (YYYY-MM-DD)", width=150)
+    report_to = ft.TextField(label="إلى (YYYY-MM-DD)", width=150)
+    range_text = ft.Text("", size=14)
+
+    @timed
+    def refresh_range_report():
+        if report_period.value == "custom":
+            try:
+                start = date.fromisoformat(report_from.value).strftime("%Y-%m-%d")
+                end = date.fromisoformat(report_to.value).strftime("%Y-%m-%d")
+            except (TypeError, ValueError):
+                notify("⚠️ التاريخ غير صحيح", "red")
+                return
+        else:
+            start, end = period_range(report_period.value)
+            report_from.value, report_to.value = start, end
+        att, inc, exp, paid, adv, net = get_range_report(start, end)
+        range_text.value = (
+            f"الفترة: {start} ← {end}\n"
+            f"أيام الحضور: {att}\n"
+            f"الدخل: {inc} ج.م\n"
+            f"المصروف: {exp} ج.م\n"
+            f"المدفوع للعمال: {paid} ج.م\n"
+            f"السلف: {adv} ج.م\n"
+            f"صافي الفترة: {net} ج.م"
+        )
         page.update()
 
-    report_controls = ft.Column([
-        ft.Row([ft.ElevatedButton("رجوع", on_click=lambda e: go("home"))]),
-        ft.Text("📊 التقرير المالي", size=18, weight="bold"),
-        ft.Row([ft.ElevatedButton("تحديث", on_click=lambda e: (refresh_report_ui(), notify('✅ تم التحديث','green'))), ft.ElevatedButton("تصدير CSV", on_click=lambda e: export_report())]),
-        report_text
-    ], spacing=10)
-    screens["report"] = report_controls
+    report_period.on_change = lambda e: refresh_range_report()
 
+    def build_report():
+        return ft.Column([
+            ft.Row([ft.ElevatedButton("رجوع", on_click=lambda e: go("home"))]),
+            ft.Text("📊 التقرير المالي", size=18, weight="bold"),
+            ft.Row([ft.ElevatedButton("تحديث", on_click=lambda e: (refresh_report_ui(), notify('✅ تم التحديث','green'))), ft.ElevatedButton("تصدير CSV", on_click=lambda e: export_report()), ft.ElevatedButton("📤 تصدير السجلات", on_click=lambda e: export_ledgers()), ft.ElevatedButton("إعادة الحساب", on_click=lambda e: (rebuild_report_summary(), refresh_report_ui(), notify('✅ تمت إعادة الحساب','green'))), ft.ElevatedButton("🔎 مراجعة أيام العمل", on_click=lambda e: check_days_worked()), ft.ElevatedButton("📦 أرشفة السنوات المغلقة", on_click=lambda e: archive_closed_years())], wrap=True),
+            report_text,
+            ft.Divider(),
+            ft.Text("📅 تقرير فترة", weight="bold"),
+            ft.Row([report_period, report_from, report_to, ft.ElevatedButton("عرض", on_click=lambda e: refresh_range_report())], wrap=True),
+            range_text
+        ], spacing=10)
+    builders["report"] = (build_report, refresh_report_ui)
+
+    @timed
     def export_report():
         n, att, inc, exp, net = compute_report()
         with open("financial_report.csv", "w", newline="", encoding="utf-8") as f:
@@ -496,28 +539,274 @@ def main(page: ft.Page):
             w.writerow([n, att, inc, exp, net])
         notify("✅ تم تصدير financial_report.csv", "green")
 
+    @timed
+    def check_days_worked():
+        # batch-by-batch recount in the background; the app stays usable meanwhile
+        notify("⏳ جاري مراجعة أيام العمل...", "green")
+        def finished(result):
+            if result["drift"]:
+                notify(f"⚠️ تم تصحيح أيام العمل لـ {result['fixed']} عميل", "red")
+                refresh_clients(clients_page["search"])
+                refresh_report_ui()
+            else:
+                notify(f"✅ أيام العمل مطابقة لسجل الحضور ({result['checked']} عميل)", "green")
+        reconcile_in_background(done=finished, error=lambda ex: notify(f"⚠️ فشلت المراجعة: {ex}", "red"))
+
+    @timed
+    def archive_closed_years():
+        # moves every year before this one into its own file; totals stay the same
+        att_buffer.flush()
+        notify("⏳ جاري أرشفة السنوات المغلقة...", "green")
+        def finished(result):
+            if not result["years"]:
+                notify("ℹ️ لا توجد سنوات مغلقة للأرشفة", "green")
+                return
+            years = "، ".join(str(y) for y in result["years"])
+            notify(f"✅ تمت أرشفة {years} ({sum(result['years'].values())} سجل)، "
+                   f"الحجم {result['bytes_before'] // 1024} ← {result['bytes_after'] // 1024} ك.ب", "green")
+            refresh_report_ui()
+            refresh_expenses_ui()
+        archive_in_background(done=finished, error=lambda ex: notify(f"⚠️ فشلت الأرشفة: {ex}", "red"))
+
+    @timed
+    def export_ledgers():
+        # full ledgers can be millions of rows: stream them from a worker thread
+        notify("⏳ جاري تصدير السجلات...", "green")
+        export_in_background(
+            EXPORT_DIR,
+            progress=lambda name, n: notify(f"⏳ {name}: {n} صف", "green"),
+            done=lambda counts: notify(f"✅ تم تصدير {sum(counts.values())} صف إلى {EXPORT_DIR}", "green"),
+            error=lambda ex: notify(f"⚠️ فشل التصدير: {ex}", "red"),
+        )
+
+    # ---------- PAYROLL ----------
+    PAYROLL_ROWS_SHOWN = 200
+    payroll_raise = ft.TextField(label="زيادة اليومية %", value="0", width=150)
+    payroll_text = ft.Text("", size=14)
+    payroll_list = ft.ListView(expand=True, spacing=4)
+
+    @timed
+    def refresh_payroll_ui():
+        try:
+            pct = float(payroll_raise.value or 0)
+        except:
+            notify("⚠️ أدخلي نسبة صحيحة", "red")
+            return
+        rows = compute_payroll()
+        n, earned, paid, adv, balance = payroll_totals(rows)
+        _, what_if_total = what_if_balances(rows, scale=1 + pct / 100)
+        payroll_text.value = (
+            f"عدد العمال: {n}\n"
+            f"إجمالي المستحق: {earned} ج.م\n"
+            f"إجمالي المدفوع: {paid} ج.م\n"
+            f"إجمالي السلف: {adv} ج.م\n"
+            f"الباقي للعمال: {balance} ج.م\n"
+            f"الباقي لو زادت اليومية {pct}%: {what_if_total:.2f} ج.م"
+        )
+        # largest balances first; the full list is in the ledger export
+        top = sorted(rows, key=lambda r: r[7], reverse=True)[:PAYROLL_ROWS_SHOWN]
+        payroll_list.controls = [
+            ft.Text(f"{name} | {days} يوم × {rate} = {earned_} | دفع {paid_} | سلف {adv_} | الباقي {bal}", size=12)
+            for _, name, rate, days, earned_, paid_, adv_, bal in top
+        ]
+        page.update()
+
+    def build_payroll():
+        return ft.Column([
+            ft.Row([ft.ElevatedButton("رجوع", on_click=lambda e: go("home"))]),
+            ft.Text("💵 الرواتب والمستحقات", size=18, weight="bold"),
+            ft.Row([payroll_raise, ft.ElevatedButton("احسب", on_click=lambda e: refresh_payroll_ui())]),
+            payroll_text,
+            payroll_list
+        ], spacing=10)
+    builders["payroll"] = (build_payroll, None)
+
+    # ---------- SITES ----------
+    site_choice = ft.Dropdown(label="الموقع", width=220)
+    new_site_name = ft.TextField(label="اسم موقع جديد", width=220)
+    sites_from = ft.TextField(label="من (YYYY-MM-DD)", width=150)
+    sites_to = ft.TextField(label="إلى (YYYY-MM-DD)", width=150)
+    sites_list = ft.ListView(expand=True, spacing=4)
+
+    backup_choice = ft.Dropdown(label="النسخ الاحتياطية", width=300)
+    sync_url = ft.TextField(label="عنوان جهاز المكتب", hint_text="http://192.168.1.10:8765/sync", width=300)
+    sync_token = ft.TextField(label="رمز المزامنة (أول مرة فقط)", password=True, can_reveal_password=True, width=300)
+
+    def refresh_sites_ui():
+        registry = load_registry(SITES_FILE)
+        site_choice.options = [ft.dropdown.Option(name) for name in registry["sites"]]
+        site_choice.value = current_site[0]
+        backup_choice.options = [ft.dropdown.Option(path, os.path.basename(path)) for path in list_backups()]
+        backup_choice.value = None
+        sync_url.value = sync_url.value or last_peer() or ""
+        sync_token.value = sync_token.value or (peer_token(sync_url.value) if sync_url.value else None) or ""
+        page.update()
+
+    def drop_screens():
+        # screens hold rows of the old file: drop them so their next visit rebuilds and refills
+        for key in [k for k in screens if k not in ("home", "sites")]:
+            page.controls.remove(screens.pop(key))
+
+    @timed
+    def switch_site_action(e):
+        name = site_choice.value
+        if not name or name == current_site[0]:
+            return
+        att_buffer.flush()  # pending attendance belongs to the old site's file
+        switch_site(name, SITES_FILE)
+        current_site[0] = name
+        site_label.value = f"📍 الموقع: {name}"
+        drop_screens()
+        notify(f"✅ تم التبديل إلى {name}", "green")
+
+    def add_site_action(e):
+        try:
+            add_site(new_site_name.value or "", registry=SITES_FILE)
+        except ValueError as ex:
+            notify(f"⚠️ {ex}", "red")
+            return
+        new_site_name.value = ""
+        refresh_sites_ui()
+        notify("✅ تمت إضافة الموقع", "green")
+
+    @timed
+    def refresh_sites_report():
+        start, end = sites_from.value or None, sites_to.value or None
+        try:
+            if start or end:
+                start = date.fromisoformat(start).strftime("%Y-%m-%d")
+                end = date.fromisoformat(end).strftime("%Y-%m-%d")
+        except (TypeError, ValueError):
+            notify("⚠️ التاريخ غير صحيح (أو اتركي الحقلين فارغين)", "red")
+            return
+        att_buffer.flush()
+        try:
+            rows, total = consolidated_report(load_registry(SITES_FILE)["sites"], start, end)
+        except Exception as ex:
+            notify(f"⚠️ تعذر التقرير: {ex}", "red")
+            return
+        sites_list.controls = [
+            ft.Text(f"{site} | عملاء {n} | حضور {att} | دخل {inc} | مصروف {exp} | مدفوع {paid} | سلف {adv} | صافي {net}", size=12)
+            for site, n, att, inc, exp, paid, adv, net in rows
+        ]
+        site, n, att, inc, exp, paid, adv, net = total
+        sites_list.controls.append(ft.Text(
+            f"{site}: عملاء {n} | حضور {att} | دخل {inc} | مصروف {exp} | مدفوع {paid} | سلف {adv} | صافي {net} ج.م",
+            weight="bold"))
+        page.update()
+
+    @timed
+    def backup_now():
+        # online copy on a worker thread; the app stays usable meanwhile
+        notify("⏳ جاري أخذ نسخة احتياطية...", "green")
+        def finished(result):
+            notify(f"✅ تم حفظ النسخة ({result['bytes'] // 1024} ك.ب) في "
+                   f"{result['copy_seconds'] + result['check_seconds']:.1f} ث", "green")
+            refresh_sites_ui()
+        backup_in_background(done=finished, error=lambda ex: notify(f"⚠️ فشل النسخ الاحتياطي: {ex}", "red"))
+
+    @timed
+    def restore_selected_backup():
+        if not backup_choice.value:
+            notify("⚠️ اختاري نسخة أولاً", "red")
+            return
+        att_buffer.flush()
+        notify("⏳ جاري الاسترجاع...", "green")
+        def finished(result):
+            drop_screens()
+            notify(f"✅ تم الاسترجاع، والحالة السابقة محفوظة في {os.path.basename(result['safety_backup'])}", "green")
+            refresh_sites_ui()
+        restore_in_background(backup_choice.value, done=finished, error=lambda ex: notify(f"⚠️ فشل الاسترجاع: {ex}", "red"))
+
+    @timed
+    def sync_now_action():
+        url = (sync_url.value or "").strip()
+        if not url:
+            notify("⚠️ أدخلي عنوان جهاز المكتب", "red")
+            return
+        att_buffer.flush()  # buffered marks must be in the log before it is sent
+        notify("⏳ جاري المزامنة...", "green")
+        def finished(result):
+            drop_screens()
+            notify(f"✅ تمت المزامنة: أُرسل {result['sent']} واستُقبل {result['received']} تغيير "
+                   f"({(result['bytes_sent'] + result['bytes_received']) / 1024:.1f} ك.ب)", "green")
+        sync_in_background(url, (sync_token.value or "").strip() or None, done=finished,
+                           error=lambda ex: notify(f"⚠️ فشلت المزامنة: {ex}", "red"))
+
+    def build_sites():
+        return ft.Column([
+            ft.Row([ft.ElevatedButton("رجوع", on_click=lambda e: go("home"))]),
+            ft.Text("🏗️ المواقع", size=18, weight="bold"),
+            ft.Row([site_choice, ft.ElevatedButton("تبديل", on_click=switch_site_action)], wrap=True),
+            ft.Row([new_site_name, ft.ElevatedButton("➕ إضافة", on_click=add_site_action)], wrap=True),
+            ft.Divider(),
+            ft.Text("📊 تقرير مجمع لكل المواقع", weight="bold"),
+            ft.Row([sites_from, sites_to, ft.ElevatedButton("عرض", on_click=lambda e: refresh_sites_report())], wrap=True),
+            sites_list,
+            ft.Divider(),
+            ft.Text("💾 النسخ الاحتياطية", weight="bold"),
+            ft.Row([ft.ElevatedButton("نسخة الآن", on_click=lambda e: backup_now()), backup_choice,
+                    ft.ElevatedButton("♻️ استرجاع", on_click=lambda e: restore_selected_backup())], wrap=True),
+            ft.Divider(),
+            ft.Text("🔄 المزامنة مع المكتب", weight="bold"),
+            ft.Row([sync_url, sync_token, ft.ElevatedButton("مزامنة الآن", on_click=lambda e: sync_now_action())],
+                   wrap=True),
+        ], spacing=10)
+    builders["sites"] = (build_sites, None)
+
+    # ---------- DIAGNOSTICS (hidden) ----------
+    diagnostics_list = ft.ListView(expand=True, spacing=2)
+
+    def refresh_diagnostics():
+        rows = diagnostics.snapshot()
+        diagnostics_list.controls = [ft.Text("⏱️ العمليات (الأبطأ أولاً)", weight="bold")]
+        diagnostics_list.controls += [ft.Text(f"[{r['kind']}] {diagnostics.format_row(r)}", size=12)
+                                      for r in rows if r["kind"] != "sql"]
+        diagnostics_list.controls.append(ft.Text("🐢 أبطأ استعلامات SQL", weight="bold"))
+        diagnostics_list.controls += [ft.Text(diagnostics.format_row(r), size=11, selectable=True)
+                                      for r in diagnostics.slowest_sql()]
+        page.update()
+
+    def export_diagnostics():
+        path = diagnostics.export(os.path.join(EXPORT_DIR, f"diagnostics-{time.strftime('%Y%m%d-%H%M%S')}.json"))
+        notify(f"✅ تم حفظ التشخيص في {path}", "green")
+
+    def build_diagnostics():
+        return ft.Column([
+            ft.Row([ft.ElevatedButton("رجوع", on_click=lambda e: go("home"))]),
+            ft.Text("🛠️ التشخيص", size=18, weight="bold"),
+            ft.Row([ft.ElevatedButton("تحديث", on_click=lambda e: refresh_diagnostics()),
+                    ft.ElevatedButton("تصفير", on_click=lambda e: (diagnostics.reset(), refresh_diagnostics())),
+                    ft.ElevatedButton("📤 تصدير", on_click=lambda e: export_diagnostics())]),
+            diagnostics_list
+        ], spacing=10)
+    builders["diagnostics"] = (build_diagnostics, None)
+
     # ---------- NAV / ADD SCREENS ----------
+    @timed
     def go(name):
+        att_buffer.flush()  # leaving a screen writes any pending attendance
         for s in screens.values():
             s.visible = False
+        first_fill = None
+        if name not in screens:
+            # build on first visit: startup only pays for the home screen
+            build, first_fill = builders[name]
+            screens[name] = build()
+            page.controls.append(screens[name])
+        if name == "clients":
+            # open_client_detail swaps the detail view in; put the list back
+            screens["clients"].controls[:] = clients_home_controls
         screens[name].visible = True
         page.update()
+        if first_fill:
+            first_fill()
 
-    # add all screens to page
-    for s in screens.values():
-        page.add(s)
-
-    # initial fills
-    refresh_clients()
-    refresh_attendance()
-    refresh_expenses_ui()
-    refresh_report_ui()
-
-    # show home
-    page.add(screens["home"])
+    # show home; no other screen is built or queried until it is opened
     go("home")
+    # one snapshot a day, taken in the background
+    backup_in_background(due_only=True, error=lambda ex: notify(f"⚠️ فشل النسخ الاحتياطي: {ex}", "red"))
 
 # entrypoint
 if __name__ == "__main__":
-    init_db()
     ft.app(target=main)
@@ -1,9 +1,36 @@
 # main.py - النسخة النهائية والكاملة للتطبيق
 import flet as ft
-import sqlite3
-from datetime import date
+from datetime import date, timedelta
+import asyncio
+import atexit
 import csv
 import os
+import time
+
+import diagnostics
+diagnostics.install()  # قبل استيراد دوال قاعدة البيانات حتى يتم توقيتها
+from diagnostics import timed
+
+from attendance_buffer import AttendanceBuffer
+from db import client_cursor, period_range, apply_attendance_changes
+from sites import open_current_site, load_registry, add_site
+from backup import list_backups
+from sync import serve_in_background, local_url
+from payroll import payroll_totals, what_if_balances
+# كل استعلام يمر عبر خيط قاعدة البيانات ويُنتظر (await) حتى لا تتجمد الواجهة
+from db_async import (
+    init_db,
+    get_client, fetch_clients, search_clients,
+    insert_client, update_client_db, delete_client_db,
+    get_attendance_ids,
+    mark_all_present, clear_attendance, copy_attendance,
+    get_payments, add_payment_db, delete_payment_db,
+    get_expenses, add_expense_db, delete_expense_db,
+    get_report_data, rebuild_report_summary, get_range_report,
+    compute_payroll, export_all, reconcile_days_worked, submit,
+    switch_site, consolidated_report, archived_years, archive_closed_years,
+    take_backup, backup_if_due, restore_backup, make_copy, sync_token,
+)
 
 # -------------------- ضبط المسار (نهائي) --------------------
 # يضمن حفظ قاعدة البيانات بجوار ملف التشغيل
@@ -11,142 +38,16 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_NAME = "worker_manager_final.db"
 DB = os.path.join(BASE_DIR, DB_NAME)
 
-# -------------------- دوال قاعدة البيانات --------------------
-def init_db():
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    c.execute("PRAGMA foreign_keys = ON")
-    
-    # جداول العملاء والحضور والمدفوعات والمصروفات
-    c.execute("""CREATE TABLE IF NOT EXISTS clients(id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, phone TEXT, daily_rate REAL DEFAULT 0, days_worked INTEGER DEFAULT 0)""")
-    c.execute("""CREATE TABLE IF NOT EXISTS attendance(id INTEGER PRIMARY KEY AUTOINCREMENT, client_id INTEGER, date TEXT, FOREIGN KEY(client_id) REFERENCES clients(id) ON DELETE CASCADE)""")
-    c.execute("""CREATE TABLE IF NOT EXISTS payments(id INTEGER PRIMARY KEY AUTOINCREMENT, client_id INTEGER, amount REAL, type TEXT, date TEXT, FOREIGN KEY(client_id) REFERENCES clients(id) ON DELETE CASCADE)""")
-    c.execute("""CREATE TABLE IF NOT EXISTS expenses(id INTEGER PRIMARY KEY AUTOINCREMENT, type TEXT, amount REAL, description TEXT, date TEXT)""")
-    
-    conn.commit()
-    conn.close()
-
-def fetch_clients(search=None):
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    if search:
-        c.execute("SELECT id, name, phone, daily_rate, days_worked FROM clients WHERE name LIKE ? ORDER BY name", (f"%{search}%",))
-    else:
-        c.execute("SELECT id, name, phone, daily_rate, days_worked FROM clients ORDER BY name")
-    rows = c.fetchall()
-    conn.close()
-    return rows
-
-def insert_client(name, phone, rate):
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    c.execute("INSERT INTO clients (name, phone, daily_rate, days_worked) VALUES (?, ?, ?, 0)", (name, phone, rate))
-    conn.commit()
-    conn.close()
-
-def update_client_db(cid, name, phone, rate, days_worked):
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    c.execute("UPDATE clients SET name=?, phone=?, daily_rate=?, days_worked=? WHERE id=?", (name, phone, rate, days_worked, cid))
-    conn.commit()
-    conn.close()
-
-def delete_client_db(cid):
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    c.execute("DELETE FROM clients WHERE id=?", (cid,))
-    conn.commit()
-    conn.close()
-
-def get_attendance_ids(date_str):
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    c.execute("SELECT client_id FROM attendance WHERE date=?", (date_str,))
-    ids = [r[0] for r in c.fetchall()]
-    conn.close()
-    return ids
-
-def toggle_attendance_db(cid, date_str, is_present):
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    c.execute("SELECT id FROM attendance WHERE client_id=? AND date=?", (cid, date_str))
-    exists = c.fetchone()
-    
-    if is_present and not exists:
-        c.execute("INSERT INTO attendance (client_id, date) VALUES (?, ?)", (cid, date_str))
-        c.execute("UPDATE clients SET days_worked = days_worked + 1 WHERE id=?", (cid,))
-    elif not is_present and exists:
-        c.execute("DELETE FROM attendance WHERE client_id=? AND date=?", (cid, date_str))
-        c.execute("UPDATE clients SET days_worked = days_worked - 1 WHERE id=?", (cid,))
-    
-    conn.commit()
-    conn.close()
-
-
-def get_payments(cid):
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    c.execute("SELECT id, amount, type, date FROM payments WHERE client_id=? ORDER BY date DESC", (cid,))
-    rows = c.fetchall()
-    conn.close()
-    return rows
-
-def add_payment_db(cid, amount, ptype):
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    today = date.today().strftime("%Y-%m-%d")
-    c.execute("INSERT INTO payments (client_id, amount, type, date) VALUES (?, ?, ?, ?)", (cid, amount, ptype, today))
-    conn.commit()
-    conn.close()
-
-def delete_payment_db(pid):
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    c.execute("DELETE FROM payments WHERE id=?", (pid,))
-    conn.commit()
-    conn.close()
-    
-def get_expenses():
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    c.execute("SELECT id, type, amount, description, date FROM expenses ORDER BY date DESC")
-    rows = c.fetchall()
-    conn.close()
-    return rows
-
-def add_expense_db(etype, amount, desc):
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    today = date.today().strftime("%Y-%m-%d")
-    c.execute("INSERT INTO expenses (type, amount, description, date) VALUES (?, ?, ?, ?)", (etype, amount, desc, today))
-    conn.commit()
-    conn.close()
-
-def delete_expense_db(eid):
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    c.execute("DELETE FROM expenses WHERE id=?", (eid,))
-    conn.commit()
-    conn.close()
-
-def get_report_data():
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    c.execute("SELECT COUNT(*) FROM clients")
-    n_clients = c.fetchone()[0] or 0
-    c.execute("SELECT SUM(days_worked) FROM clients")
-    n_att = c.fetchone()[0] or 0
-    c.execute("SELECT SUM(amount) FROM expenses WHERE type='دخل'")
-    inc = c.fetchone()[0] or 0
-    c.execute("SELECT SUM(amount) FROM expenses WHERE type='مصروف'")
-    exp = c.fetchone()[0] or 0
-    conn.close()
-    return n_clients, n_att, inc, exp
-# -------------------- نهاية دوال قاعدة البيانات --------------------
+SEARCH_DEBOUNCE = 0.3
+LOADING_DELAY = 0.15  # seconds a query may take before the loading bar shows
+EXPORT_DIR = os.path.join(BASE_DIR, "exports")
+
 
 # -------------------- الواجهة (Flet) --------------------
-def main(page: ft.Page):
-    init_db()
+async def main(page: ft.Page):
+    # كل موقع عمل له ملف قاعدة بيانات خاص به (sites.json)؛ نفتح آخر موقع استُخدم
+    site = open_current_site("الموقع الرئيسي", DB)
+    await init_db()
     
     page.title = "مدير العمال"
     page.window_width = 400
@@ -164,23 +65,60 @@ def main(page: ft.Page):
         snack.open = True
         page.update()
 
-    screens = {}
+    # شريط التحميل: يظهر فقط إذا تأخر الاستعلام أكثر من LOADING_DELAY
+    loading_bar = ft.ProgressBar(visible=False)
+    pending = [0]
+
+    async def loading(query):
+        task = asyncio.ensure_future(query)
+        done, _ = await asyncio.wait({task}, timeout=LOADING_DELAY)
+        if done:
+            return task.result()
+        pending[0] += 1
+        loading_bar.visible = True
+        loading_bar.update()
+        try:
+            return await task
+        finally:
+            pending[0] -= 1
+            loading_bar.visible = pending[0] > 0
+            loading_bar.update()
+
+    # كل شاشة تُبنى عند أول زيارة لها فقط (انظر go)
+    screens = {}   # الشاشات التي بُنيت
+    builders = {}  # اسم الشاشة -> دالة بنائها
     
-    def go(screen_name):
+    @timed
+    async def go(screen_name):
+        await flush_attendance()  # مغادرة الشاشة تحفظ الحضور المعلق
         for name, col in screens.items():
             col.visible = (name == screen_name)
+        if screen_name not in screens:
+            screens[screen_name] = builders[screen_name]()
+            page.controls.append(screens[screen_name])
+        page.update()
         
         if screen_name == "clients":
-            load_clients_list()
+            await load_clients_list()
         elif screen_name == "attendance":
-            load_attendance_list()
+            await load_attendance_list()
         elif screen_name == "expenses":
-            load_expenses_list()
+            await load_expenses_list()
         elif screen_name == "report":
-            load_report_data()
+            await load_report_data()
+            await load_range_report()
+        elif screen_name == "payroll":
+            await load_payroll()
+        elif screen_name == "sites":
+            load_sites()
+        elif screen_name == "diagnostics":
+            load_diagnostics()
         
         page.update()
 
+    def nav(screen_name):
+        return lambda e: page.run_task(go, screen_name)
+
     # --- مكونات شاشة التفاصيل (Client Details Screen Controls) ---
     detail_name = ft.TextField(label="الاسم")
     detail_phone = ft.TextField(label="موبايل")
@@ -193,17 +131,26 @@ def main(page: ft.Page):
 
     # --- دوال شاشة التفاصيل ---
 
-    def delete_pay_click(e):
+    @timed
+    async def delete_pay_click(e):
         pid = e.control.data
-        delete_payment_db(pid)
-        load_payments_on_detail_screen(current_cid[0])
+        await loading(delete_payment_db(pid))
+        await load_payments_on_detail_screen(current_cid[0])
         notify("تم حذف الدفعة")
 
-    def load_payments_on_detail_screen(cid):
+    @timed
+    async def load_payments_on_detail_screen(cid, since=None):
+        data = await loading(get_payments(cid))
+        live_ids = {row[0] for row in data}
+        if since:
+            # السنوات المؤرشفة تُقرأ من ملفاتها فقط عند طلبها
+            data = await loading(get_payments(cid, since=since))
         detail_payments_list.controls.clear()
-        data = get_payments(cid)
         for row in data:
             pid, amt, typ, dt = row
+            if pid not in live_ids:  # دفعات الأرشيف للعرض فقط
+                detail_payments_list.controls.append(ft.Text(f"{dt} | {typ}: {amt}ج (أرشيف)", color="grey"))
+                continue
             detail_payments_list.controls.append(
                 ft.Row([
                     ft.Text(f"{dt} | {typ}: {amt}ج", expand=True),
@@ -212,42 +159,48 @@ def main(page: ft.Page):
             )
         page.update()
 
-    def save_client_details_click(e):
+    @timed
+    async def show_archived_payments_click(e):
+        years = await loading(archived_years())
+        if not years:
+            notify("لا توجد سنوات مؤرشفة"); return
+        await load_payments_on_detail_screen(current_cid[0], since=f"{years[0]}-01-01")
+
+    @timed
+    async def save_client_details_click(e):
         if not current_cid[0]: return
         try:
             r = float(detail_rate.value)
-            d = int(detail_days.value)
         except: return
-        update_client_db(current_cid[0], detail_name.value, detail_phone.value, r, d)
+        # أيام العمل تُحسب من سجل الحضور فقط ولا تُعدل من هنا
+        await loading(update_client_db(current_cid[0], detail_name.value, detail_phone.value, r))
         notify("تم حفظ التعديلات بنجاح")
         page.update()
 
-    def add_pay_click(e):
+    @timed
+    async def add_pay_click(e):
         if not current_cid[0]: return
         try:
             val = float(detail_pay_amt.value)
         except:
             notify("المبلغ خطأ", "red"); return
-        add_payment_db(current_cid[0], val, detail_pay_type.value)
+        await loading(add_payment_db(current_cid[0], val, detail_pay_type.value))
         detail_pay_amt.value = ""
-        load_payments_on_detail_screen(current_cid[0])
+        await load_payments_on_detail_screen(current_cid[0])
         notify("تم تسجيل العملية")
 
-    def open_client_details_screen(cid):
+    @timed
+    async def open_client_details_screen(cid):
         current_cid[0] = cid
-        conn = sqlite3.connect(DB)
-        c = conn.cursor()
-        c.execute("SELECT * FROM clients WHERE id=?", (cid,))
-        res = c.fetchone()
-        conn.close()
+        res = await loading(get_client(cid))
         
         if res:
             detail_name.value = res[1]
             detail_phone.value = res[2]
             detail_rate.value = str(res[3])
             detail_days.value = str(res[4])
-            load_payments_on_detail_screen(cid)
-            go("client_details")
+            await load_payments_on_detail_screen(cid)
+            await go("client_details")
         else:
             notify("خطأ في تحميل بيانات العميل", "red")
 
@@ -256,62 +209,117 @@ def main(page: ft.Page):
     cl_name_in = ft.TextField(label="اسم جديد", expand=True)
     cl_phone_in = ft.TextField(label="تليفون", width=120)
     cl_rate_in = ft.TextField(label="يومية", width=100)
-    cl_list = ft.ListView(expand=True, spacing=5)
+    cl_list = ft.ListView(expand=True, spacing=5, on_scroll_interval=100)
+    CLIENTS_PAGE_SIZE = 50
+    cl_page = {"after": None, "done": False, "loading": False, "gen": 0}
 
-    def on_tile_click(e):
+    async def on_tile_click(e):
         cid = e.control.data
-        open_client_details_screen(cid)
+        await open_client_details_screen(cid)
 
-    def delete_client_click(e):
+    @timed
+    async def delete_client_click(e):
         cid = e.control.data
-        delete_client_db(cid)
+        await loading(delete_client_db(cid))
         notify("تم الحذف", "red")
-        load_clients_list()
-
-    def load_clients_list(e=None):
+        await load_clients_list()
+
+    def client_card(row):
+        cid, name, phone, rate, days = row
+        tile = ft.ListTile(
+            leading=ft.Icon(ft.Icons.PERSON),
+            title=ft.Text(name, weight="bold"),
+            subtitle=ft.Text(f"{phone} | {rate}ج | {days} يوم"),
+            data=cid,
+            on_click=on_tile_click,
+            trailing=ft.IconButton(ft.Icons.DELETE, icon_color="red", data=cid, on_click=delete_client_click)
+        )
+        return ft.Card(content=tile, elevation=2)
+
+    @timed
+    async def load_next_clients_page():
+        # keyset pagination: only CLIENTS_PAGE_SIZE rows are fetched and built per call
+        if cl_page["done"] or cl_page["loading"]: return
+        gen = cl_page["gen"]
+        cl_page["loading"] = True
+        try:
+            if cl_search.value:
+                # search shows the best-ranked matches only, no further pages
+                rows = await loading(search_clients(cl_search.value, limit=CLIENTS_PAGE_SIZE))
+                done = True
+            else:
+                rows = await loading(fetch_clients(after=cl_page["after"], limit=CLIENTS_PAGE_SIZE))
+                done = len(rows) < CLIENTS_PAGE_SIZE
+        finally:
+            if gen == cl_page["gen"]:
+                cl_page["loading"] = False
+        if gen != cl_page["gen"]: return  # the list was reloaded while this page was in flight
+        cl_page["done"] = done
+        cl_list.controls.extend(client_card(row) for row in rows)
+        if rows:
+            cl_page["after"] = client_cursor(rows[-1])
+
+    @timed
+    async def load_clients_list(e=None):
         cl_list.controls.clear()
-        data = fetch_clients(cl_search.value)
-        for row in data:
-            cid, name, phone, rate, days = row
-            tile = ft.ListTile(
-                leading=ft.Icon(ft.Icons.PERSON),
-                title=ft.Text(name, weight="bold"),
-                subtitle=ft.Text(f"{phone} | {rate}ج | {days} يوم"),
-                data=cid,
-                on_click=on_tile_click,
-                trailing=ft.IconButton(ft.Icons.DELETE, icon_color="red", data=cid, on_click=delete_client_click)
-            )
-            cl_list.controls.append(ft.Card(content=tile, elevation=2))
+        cl_page["after"] = None
+        cl_page["done"] = False
+        cl_page["loading"] = False
+        cl_page["gen"] += 1
+        await load_next_clients_page()
         page.update()
 
-    def add_client_btn(e):
+    async def on_clients_scroll(e):
+        if cl_page["done"] or e.pixels < e.max_scroll_extent - 300: return
+        await load_next_clients_page()
+        cl_list.update()
+
+    cl_list.on_scroll = on_clients_scroll
+
+    search_task = [None]
+
+    async def search_after_pause():
+        await asyncio.sleep(SEARCH_DEBOUNCE)
+        await load_clients_list()
+
+    async def on_search_change(e):
+        # debounce: query only once typing pauses for SEARCH_DEBOUNCE seconds
+        if search_task[0]:
+            search_task[0].cancel()
+        search_task[0] = asyncio.create_task(search_after_pause())
+
+    cl_search.on_change = on_search_change
+
+    @timed
+    async def add_client_btn(e):
         if not cl_name_in.value: return
         try:
             r = float(cl_rate_in.value or 0)
         except: return
-        insert_client(cl_name_in.value, cl_phone_in.value, r)
+        await loading(insert_client(cl_name_in.value, cl_phone_in.value, r))
         cl_name_in.value = cl_phone_in.value = cl_rate_in.value = ""
-        load_clients_list()
+        await load_clients_list()
         notify("تمت الإضافة")
 
-    screens["clients"] = ft.Column([
-        ft.ElevatedButton("الرئيسية", icon=ft.Icons.HOME, on_click=lambda e: go("home")),
+    builders["clients"] = lambda: ft.Column([
+        ft.ElevatedButton("الرئيسية", icon=ft.Icons.HOME, on_click=nav("home")),
         ft.Text("إدارة العملاء", size=20, weight="bold"),
         ft.Row([cl_search, ft.IconButton(ft.Icons.REFRESH, on_click=load_clients_list)]),
         ft.Row([cl_name_in, cl_phone_in, cl_rate_in]),
         ft.ElevatedButton("إضافة عميل", on_click=add_client_btn, bgcolor="blue", color="white", width=400),
         ft.Divider(),
         cl_list
-    ])
+    ], expand=True)
     
     # -------------------- شاشة تفاصيل العميل --------------------
-    screens["client_details"] = ft.Column([
-        ft.ElevatedButton("رجوع للعملاء", icon=ft.Icons.ARROW_BACK, on_click=lambda e: go("clients")),
+    builders["client_details"] = lambda: ft.Column([
+        ft.ElevatedButton("رجوع للعملاء", icon=ft.Icons.ARROW_BACK, on_click=nav("clients")),
         ft.Text("تعديل بيانات العميل", size=20, weight="bold"),
         detail_name, detail_phone, detail_rate, detail_days,
         ft.ElevatedButton("حفظ التعديلات", on_click=save_client_details_click, bgcolor="green", color="white", width=400),
         ft.Divider(),
-        ft.Text("السجل المالي:", weight="bold"),
+        ft.Row([ft.Text("السجل المالي:", weight="bold"),
+                ft.TextButton("عرض السنوات المؤرشفة", icon=ft.Icons.ARCHIVE, on_click=show_archived_payments_click)]),
         detail_payments_list,
         ft.Row([detail_pay_amt, detail_pay_type, ft.IconButton(ft.Icons.ADD_CIRCLE, icon_color="blue", on_click=add_pay_click)])
     ])
@@ -322,14 +330,29 @@ def main(page: ft.Page):
     att_date = ft.TextField(value=date.today().strftime("%Y-%m-%d"), label="تاريخ اليوم")
     att_list = ft.ListView(expand=True)
 
+    # النقرات السريعة تُجمع وتُكتب في معاملة واحدة كل FLUSH_WINDOW ثانية
+    att_buffer = AttendanceBuffer(
+        write=lambda changes: submit(apply_attendance_changes, changes).result(),
+        on_error=lambda ex: notify(f"لم يتم حفظ الحضور: {ex}", "red"),
+    )
+    atexit.register(att_buffer.flush)
+    page.on_disconnect = lambda e: att_buffer.flush()
+
+    async def flush_attendance():
+        await loading(asyncio.to_thread(att_buffer.flush))
+
+    @timed
     def att_check_change(e):
         cid = e.control.data
-        toggle_attendance_db(cid, att_date.value, e.control.value)
+        att_buffer.toggle(cid, att_date.value, e.control.value)
 
-    def load_attendance_list(e=None):
+    @timed
+    async def load_attendance_list(e=None):
+        await flush_attendance()
+        present_ids = set(await loading(get_attendance_ids(att_date.value)))
+        rows = await loading(fetch_clients())
         att_list.controls.clear()
-        present_ids = get_attendance_ids(att_date.value)
-        for row in fetch_clients():
+        for row in rows:
             cid, name, _, _, _ = row
             chk = ft.Checkbox(
                 label=name, 
@@ -342,10 +365,33 @@ def main(page: ft.Page):
 
     att_date.on_change = load_attendance_list
 
-    screens["attendance"] = ft.Column([
-        ft.ElevatedButton("الرئيسية", icon=ft.Icons.HOME, on_click=lambda e: go("home")),
+    @timed
+    async def bulk_attendance_click(e):
+        action = e.control.data
+        day = att_date.value
+        try:
+            prev_day = (date.fromisoformat(day) - timedelta(days=1)).strftime("%Y-%m-%d")
+        except ValueError:
+            notify("التاريخ غير صحيح", "red"); return
+        await flush_attendance()
+        if action == "all":
+            added, removed = await loading(mark_all_present(day))
+        elif action == "clear":
+            added, removed = await loading(clear_attendance(day))
+        else:
+            added, removed = await loading(copy_attendance(prev_day, day))
+        await load_attendance_list()
+        notify(f"تم تسجيل {added} وإلغاء {removed}")
+
+    builders["attendance"] = lambda: ft.Column([
+        ft.ElevatedButton("الرئيسية", icon=ft.Icons.HOME, on_click=nav("home")),
         ft.Text("تسجيل الحضور اليومي", size=20, weight="bold"),
         att_date,
+        ft.Row([
+            ft.ElevatedButton("حضور الكل", data="all", on_click=bulk_attendance_click),
+            ft.ElevatedButton("مسح الكل", data="clear", on_click=bulk_attendance_click),
+            ft.ElevatedButton("نسخ من اليوم السابق", data="copy", on_click=bulk_attendance_click),
+        ], wrap=True),
         ft.Divider(),
         att_list
     ])
@@ -358,13 +404,16 @@ def main(page: ft.Page):
     exp_d = ft.TextField(label="بيان/وصف", expand=True)
     exp_list = ft.ListView(expand=True)
 
-    def del_exp(e):
-        delete_expense_db(e.control.data)
-        load_expenses_list()
+    @timed
+    async def del_exp(e):
+        await loading(delete_expense_db(e.control.data))
+        await load_expenses_list()
 
-    def load_expenses_list():
+    @timed
+    async def load_expenses_list():
+        rows = await loading(get_expenses())
         exp_list.controls.clear()
-        for row in get_expenses():
+        for row in rows:
             eid, t, a, d, dt = row
             exp_list.controls.append(ft.Row([
                 ft.Text(f"{dt} | {t}: {a}ج ({d})", expand=True),
@@ -372,16 +421,17 @@ def main(page: ft.Page):
             ]))
         page.update()
 
-    def add_exp(e):
+    @timed
+    async def add_exp(e):
         try:
             val = float(exp_a.value)
         except: return
-        add_expense_db(exp_t.value, val, exp_d.value)
+        await loading(add_expense_db(exp_t.value, val, exp_d.value))
         exp_a.value = exp_d.value = ""
-        load_expenses_list()
+        await load_expenses_list()
 
-    screens["expenses"] = ft.Column([
-        ft.ElevatedButton("الرئيسية", icon=ft.Icons.HOME, on_click=lambda e: go("home")),
+    builders["expenses"] = lambda: ft.Column([
+        ft.ElevatedButton("الرئيسية", icon=ft.Icons.HOME, on_click=nav("home")),
         ft.Text("المصروفات والدخل", size=20, weight="bold"),
         ft.Row([exp_t, exp_a, exp_d]),
         ft.ElevatedButton("إضافة عملية", on_click=add_exp, bgcolor="blue", color="white"),
@@ -394,8 +444,9 @@ def main(page: ft.Page):
     # -----------------------------------------------------------
     rep_view = ft.Column(scroll=ft.ScrollMode.AUTO)
 
-    def load_report_data():
-        n, att, inc, exp = get_report_data()
+    @timed
+    async def load_report_data(e=None):
+        n, att, inc, exp = await loading(get_report_data())
         net = inc - exp
         
         rep_view.controls = [
@@ -408,27 +459,358 @@ def main(page: ft.Page):
         ]
         page.update()
 
-    screens["report"] = ft.Column([
-        ft.ElevatedButton("الرئيسية", icon=ft.Icons.HOME, on_click=lambda e: go("home")),
-        ft.Text("التقرير المالي العام", size=20, weight="bold"),
-        ft.ElevatedButton("تحديث البيانات", on_click=lambda e: load_report_data()),
-        ft.Container(content=rep_view, padding=20, bgcolor="white", border_radius=10)
+    # --- تقرير فترة (أسبوع / شهر / مخصص) من جدول الإجماليات اليومية ---
+    rep_period = ft.Dropdown(width=150, value="month", options=[
+        ft.dropdown.Option("today", "اليوم"),
+        ft.dropdown.Option("week", "هذا الأسبوع"),
+        ft.dropdown.Option("month", "هذا الشهر"),
+        ft.dropdown.Option("custom", "فترة مخصصة"),
     ])
+    rep_from = ft.TextField(label="من (YYYY-MM-DD)", width=150)
+    rep_to = ft.TextField(label="إلى (YYYY-MM-DD)", width=150)
+    rep_range_view = ft.Column()
+
+    @timed
+    async def load_range_report(e=None):
+        if rep_period.value == "custom":
+            try:
+                start = date.fromisoformat(rep_from.value).strftime("%Y-%m-%d")
+                end = date.fromisoformat(rep_to.value).strftime("%Y-%m-%d")
+            except (TypeError, ValueError):
+                notify("التاريخ غير صحيح", "red"); return
+        else:
+            start, end = period_range(rep_period.value)
+            rep_from.value, rep_to.value = start, end
+        att, inc, exp, paid, adv, net = await loading(get_range_report(start, end))
+        rep_range_view.controls = [
+            ft.Text(f"الفترة: {start} ← {end}", weight="bold"),
+            ft.Text(f"أيام الحضور: {att}", size=16),
+            ft.Text(f"الدخل: {inc} ج | المصروفات: {exp} ج", size=16),
+            ft.Text(f"المدفوع للعمال: {paid} ج | السلف: {adv} ج", size=16),
+            ft.Text(f"صافي الفترة: {net} ج", size=18, weight="bold", color="blue"),
+        ]
+        page.update()
+
+    rep_period.on_change = load_range_report
+
+    @timed
+    async def export_ledgers_click(e):
+        # يتم التصدير في خيط مستقل حتى لا تتجمد الواجهة مع السجلات الكبيرة
+        notify("جاري تصدير السجلات...")
+        try:
+            counts = await loading(export_all(EXPORT_DIR, progress=lambda name, n: notify(f"{name}: {n} صف")))
+        except Exception as ex:
+            notify(f"فشل التصدير: {ex}", "red"); return
+        notify(f"تم تصدير {sum(counts.values())} صف إلى {EXPORT_DIR}")
+
+    @timed
+    async def reconcile_days_click(e):
+        # مراجعة على دفعات في خيط مستقل، فلا تُقفل قاعدة البيانات أثناءها
+        notify("جاري مراجعة أيام العمل...")
+        try:
+            result = await loading(reconcile_days_worked())
+        except Exception as ex:
+            notify(f"فشلت المراجعة: {ex}", "red"); return
+        if result["drift"]:
+            notify(f"تم تصحيح أيام العمل لـ {result['fixed']} عميل", "red")
+            await load_report_data()
+        else:
+            notify(f"أيام العمل مطابقة لسجل الحضور ({result['checked']} عميل)")
+
+    @timed
+    async def archive_years_click(e):
+        # نقل السنوات السابقة إلى ملفات أرشيف؛ الإجماليات لا تتغير
+        await flush_attendance()
+        notify("جاري أرشفة السنوات المغلقة...")
+        try:
+            result = await loading(archive_closed_years())
+        except Exception as ex:
+            notify(f"فشلت الأرشفة: {ex}", "red"); return
+        if not result["years"]:
+            notify("لا توجد سنوات مغلقة للأرشفة"); return
+        years = "، ".join(str(y) for y in result["years"])
+        notify(f"تمت أرشفة {years} ({sum(result['years'].values())} سجل)، "
+               f"الحجم {result['bytes_before'] // 1024} ← {result['bytes_after'] // 1024} ك.ب")
+        await load_report_data()
+
+    @timed
+    async def rebuild_report_click(e):
+        await loading(rebuild_report_summary())
+        await load_report_data()
+        notify("تمت إعادة حساب الإجماليات")
+
+    builders["report"] = lambda: ft.Column([
+        ft.ElevatedButton("الرئيسية", icon=ft.Icons.HOME, on_click=nav("home")),
+        ft.Text("التقرير المالي العام", size=20, weight="bold"),
+        ft.Row([
+            ft.ElevatedButton("تحديث البيانات", on_click=load_report_data),
+            ft.ElevatedButton("إعادة حساب الإجماليات", on_click=rebuild_report_click),
+            ft.ElevatedButton("مراجعة أيام العمل", on_click=reconcile_days_click),
+            ft.ElevatedButton("أرشفة السنوات المغلقة", icon=ft.Icons.ARCHIVE, on_click=archive_years_click),
+            ft.ElevatedButton("تصدير السجلات CSV", icon=ft.Icons.DOWNLOAD, on_click=export_ledgers_click),
+        ], wrap=True),
+        ft.Container(content=rep_view, padding=20, bgcolor="white", border_radius=10),
+        ft.Divider(),
+        ft.Text("تقرير فترة", size=18, weight="bold"),
+        ft.Row([rep_period, rep_from, rep_to, ft.ElevatedButton("عرض", on_click=load_range_report)], wrap=True),
+        ft.Container(content=rep_range_view, padding=20, bgcolor="white", border_radius=10)
+    ], scroll=ft.ScrollMode.AUTO, expand=True)
+
+    # -----------------------------------------------------------
+    # -------------------- شاشة الرواتب --------------------
+    # -----------------------------------------------------------
+    PAYROLL_ROWS_SHOWN = 200
+    pay_raise = ft.TextField(label="زيادة اليومية %", value="0", width=150)
+    pay_summary = ft.Column()
+    pay_list = ft.ListView(expand=True, spacing=2)
+
+    @timed
+    async def load_payroll(e=None):
+        try:
+            pct = float(pay_raise.value or 0)
+        except ValueError:
+            notify("النسبة غير صحيحة", "red"); return
+        rows = await loading(compute_payroll())
+        n, earned, paid, adv, balance = payroll_totals(rows)
+        _, what_if_total = what_if_balances(rows, scale=1 + pct / 100)
+        pay_summary.controls = [
+            ft.Text(f"عدد العمال: {n}", size=16),
+            ft.Text(f"المستحق: {earned} ج | المدفوع: {paid} ج | السلف: {adv} ج", size=16),
+            ft.Text(f"الباقي للعمال: {balance} ج", size=18, weight="bold", color="blue"),
+            ft.Text(f"الباقي لو زادت اليومية {pct}%: {what_if_total:.2f} ج", size=14, color="grey"),
+        ]
+        # أكبر المستحقات أولاً؛ القائمة الكاملة متاحة من التصدير
+        top = sorted(rows, key=lambda r: r[7], reverse=True)[:PAYROLL_ROWS_SHOWN]
+        pay_list.controls = [
+            ft.Text(f"{name} | {days} يوم × {rate}ج = {earned_}ج | دفع {paid_}ج | سلف {adv_}ج | الباقي {bal}ج")
+            for _, name, rate, days, earned_, paid_, adv_, bal in top
+        ]
+        page.update()
+
+    builders["payroll"] = lambda: ft.Column([
+        ft.ElevatedButton("الرئيسية", icon=ft.Icons.HOME, on_click=nav("home")),
+        ft.Text("الرواتب والمستحقات", size=20, weight="bold"),
+        ft.Row([pay_raise, ft.ElevatedButton("احسب", on_click=load_payroll)]),
+        ft.Container(content=pay_summary, padding=10, bgcolor="white", border_radius=10),
+        ft.Divider(),
+        pay_list
+    ], expand=True)
+
+    # -----------------------------------------------------------
+    # -------------------- شاشة المواقع --------------------
+    # -----------------------------------------------------------
+    current_site = [site]
+    home_site = ft.Text(f"الموقع: {site}", size=16, color="grey")
+    site_dd = ft.Dropdown(label="الموقع", width=250)
+    new_site_name = ft.TextField(label="اسم موقع جديد", width=250)
+    sites_from = ft.TextField(label="من (YYYY-MM-DD)", width=150)
+    sites_to = ft.TextField(label="إلى (YYYY-MM-DD)", width=150)
+    sites_view = ft.Column()
+    backup_dd = ft.Dropdown(label="النسخ الاحتياطية", width=300)
+    sync_server = [None]
+    sync_status = ft.Text("خادم المزامنة متوقف", color="grey")
+    sync_btn = ft.ElevatedButton("تشغيل خادم المزامنة", icon=ft.Icons.SYNC)
+
+    def load_sites(e=None):
+        registry = load_registry()
+        site_dd.options = [ft.dropdown.Option(name) for name in registry["sites"]]
+        site_dd.value = current_site[0]
+        backup_dd.options = [ft.dropdown.Option(path, os.path.basename(path)) for path in list_backups()]
+        backup_dd.value = None
+        page.update()
+
+    @timed
+    async def switch_site_click(e):
+        name = site_dd.value
+        if not name or name == current_site[0]:
+            return
+        await flush_attendance()  # الحضور المعلق يُحفظ في ملف الموقع القديم أولاً
+        # على خيط قاعدة البيانات: كل استعلام سابق يُنفذ على الموقع القديم قبل التبديل
+        await loading(switch_site(name))
+        current_site[0] = name
+        home_site.value = f"الموقع: {name}"
+        notify(f"تم التبديل إلى {name}")
+        await go("home")  # كل شاشة تعيد تحميل بياناتها عند زيارتها
+
+    def add_site_click(e):
+        try:
+            add_site(new_site_name.value or "")
+        except ValueError as ex:
+            notify(str(ex), "red"); return
+        new_site_name.value = ""
+        load_sites()
+        notify("تمت إضافة الموقع")
+
+    @timed
+    async def load_sites_report(e=None):
+        start, end = sites_from.value or None, sites_to.value or None
+        try:
+            if start or end:
+                start = date.fromisoformat(start).strftime("%Y-%m-%d")
+                end = date.fromisoformat(end).strftime("%Y-%m-%d")
+        except (TypeError, ValueError):
+            notify("التاريخ غير صحيح (أو اترك الحقلين فارغين)", "red"); return
+        await flush_attendance()
+        try:
+            rows, total = await loading(consolidated_report(load_registry()["sites"], start, end))
+        except Exception as ex:
+            notify(f"تعذر التقرير: {ex}", "red"); return
+        sites_view.controls = [
+            ft.Text(f"{site}: العملاء {n} | الحضور {att} | الدخل {inc}ج | المصروف {exp}ج | "
+                    f"المدفوع {paid}ج | السلف {adv}ج | الصافي {net}ج")
+            for site, n, att, inc, exp, paid, adv, net in rows
+        ]
+        site, n, att, inc, exp, paid, adv, net = total
+        sites_view.controls.append(ft.Text(
+            f"{site}: العملاء {n} | الحضور {att} | الدخل {inc}ج | المصروف {exp}ج | الصافي {net}ج",
+            size=18, weight="bold", color="blue"))
+        page.update()
+
+    @timed
+    async def backup_now_click(e):
+        # نسخ مباشر على خيط مستقل؛ التطبيق يبقى قابلاً للاستخدام
+        notify("جاري أخذ نسخة احتياطية...")
+        try:
+            result = await loading(take_backup())
+        except Exception as ex:
+            notify(f"فشل النسخ الاحتياطي: {ex}", "red"); return
+        notify(f"تم حفظ النسخة ({result['bytes'] // 1024} ك.ب) في "
+               f"{result['copy_seconds'] + result['check_seconds']:.1f} ث")
+        load_sites()
+
+    @timed
+    async def restore_backup_click(e):
+        if not backup_dd.value:
+            notify("اختر نسخة أولاً", "red"); return
+        await flush_attendance()
+        try:
+            result = await loading(restore_backup(backup_dd.value))
+        except Exception as ex:
+            notify(f"فشل الاسترجاع: {ex}", "red"); return
+        notify(f"تم الاسترجاع، والحالة السابقة محفوظة في {os.path.basename(result['safety_backup'])}")
+        await go("home")  # كل شاشة تعيد تحميل بياناتها عند زيارتها
+
+    async def toggle_sync_server(e):
+        # الهواتف ترسل تعديلاتها إلى هذا الجهاز وتستقبل تعديلاته (sync.py)
+        if sync_server[0] is None:
+            try:
+                sync_server[0] = serve_in_background()
+            except OSError as ex:
+                notify(f"تعذر تشغيل خادم المزامنة: {ex}", "red"); return
+            # الهاتف المنسوخ من هنا مقترن مسبقاً، وغيره يحتاج هذا الرمز في أول مزامنة
+            sync_status.value = f"خادم المزامنة يعمل على {local_url()} | رمز المزامنة: {await sync_token()}"
+            sync_btn.text = "إيقاف خادم المزامنة"
+        else:
+            sync_server[0].shutdown()
+            sync_server[0].server_close()
+            sync_server[0] = None
+            sync_status.value = "خادم المزامنة متوقف"
+            sync_btn.text = "تشغيل خادم المزامنة"
+        page.update()
+
+    sync_btn.on_click = toggle_sync_server
+
+    @timed
+    async def copy_for_phone_click(e):
+        # نسخة لهاتف جديد تبدأ مزامنتها من هنا بدل إعادة إرسال كل السجل
+        await flush_attendance()
+        target = os.path.join(BASE_DIR, f"phone-{time.strftime('%Y%m%d-%H%M%S')}.db")
+        try:
+            result = await loading(make_copy(target, local_url()))
+        except Exception as ex:
+            notify(f"تعذر إنشاء النسخة: {ex}", "red"); return
+        notify(f"تم إنشاء {os.path.basename(target)} ({result['bytes'] // 1024} ك.ب)، انقلها إلى الهاتف")
+
+    async def auto_backup():
+        # نسخة واحدة يومياً في الخلفية
+        try:
+            await backup_if_due()
+        except Exception as ex:
+            notify(f"فشل النسخ الاحتياطي: {ex}", "red")
+
+    builders["sites"] = lambda: ft.Column([
+        ft.ElevatedButton("الرئيسية", icon=ft.Icons.HOME, on_click=nav("home")),
+        ft.Text("المواقع", size=20, weight="bold"),
+        ft.Row([site_dd, ft.ElevatedButton("تبديل", on_click=switch_site_click)], wrap=True),
+        ft.Row([new_site_name, ft.ElevatedButton("إضافة", icon=ft.Icons.ADD, on_click=add_site_click)], wrap=True),
+        ft.Divider(),
+        ft.Text("تقرير مجمع لكل المواقع", size=18, weight="bold"),
+        ft.Row([sites_from, sites_to, ft.ElevatedButton("عرض", on_click=load_sites_report)], wrap=True),
+        ft.Container(content=sites_view, padding=20, bgcolor="white", border_radius=10),
+        ft.Divider(),
+        ft.Text("النسخ الاحتياطية", size=18, weight="bold"),
+        ft.Row([
+            ft.ElevatedButton("نسخة الآن", icon=ft.Icons.BACKUP, on_click=backup_now_click),
+            backup_dd,
+            ft.ElevatedButton("استرجاع", icon=ft.Icons.RESTORE, on_click=restore_backup_click),
+        ], wrap=True),
+        ft.Divider(),
+        ft.Text("المزامنة مع الهواتف", size=18, weight="bold"),
+        ft.Row([
+            sync_btn,
+            ft.ElevatedButton("نسخة لهاتف جديد", icon=ft.Icons.PHONE_ANDROID, on_click=copy_for_phone_click),
+        ], wrap=True),
+        sync_status,
+    ], scroll=ft.ScrollMode.AUTO, expand=True)
+
+    # -----------------------------------------------------------
+    # -------------------- شاشة التشخيص (مخفية) --------------------
+    # -----------------------------------------------------------
+    diag_list = ft.ListView(expand=True, spacing=2)
+
+    def load_diagnostics(e=None):
+        rows = diagnostics.snapshot()
+        diag_list.controls = [ft.Text("العمليات (الأبطأ أولاً)", weight="bold")]
+        diag_list.controls += [ft.Text(f"[{r['kind']}] {diagnostics.format_row(r)}", size=12)
+                               for r in rows if r["kind"] != "sql"]
+        diag_list.controls.append(ft.Text("أبطأ استعلامات SQL", weight="bold"))
+        diag_list.controls += [ft.Text(diagnostics.format_row(r), size=11, selectable=True)
+                               for r in diagnostics.slowest_sql()]
+        page.update()
+
+    def reset_diagnostics_click(e):
+        diagnostics.reset()
+        load_diagnostics()
+
+    def export_diagnostics_click(e):
+        path = diagnostics.export(os.path.join(EXPORT_DIR, f"diagnostics-{time.strftime('%Y%m%d-%H%M%S')}.json"))
+        notify(f"تم حفظ التشخيص في {path}")
+
+    def open_diagnostics(e):
+        # الدخول بالضغط المطول على أيقونة الرئيسية، فقط عند تفعيل التشخيص
+        if diagnostics.enabled():
+            page.run_task(go, "diagnostics")
+
+    builders["diagnostics"] = lambda: ft.Column([
+        ft.ElevatedButton("الرئيسية", icon=ft.Icons.HOME, on_click=nav("home")),
+        ft.Text("التشخيص وزمن الاستجابة", size=20, weight="bold"),
+        ft.Row([
+            ft.ElevatedButton("تحديث", on_click=load_diagnostics),
+            ft.ElevatedButton("تصفير", on_click=reset_diagnostics_click),
+            ft.ElevatedButton("تصدير", icon=ft.Icons.DOWNLOAD, on_click=export_diagnostics_click),
+        ]),
+        ft.Divider(),
+        diag_list
+    ], expand=True)
 
     # -----------------------------------------------------------
     # -------------------- الشاشة الرئيسية --------------------
     # -----------------------------------------------------------
-    screens["home"] = ft.Column([
-        ft.Icon(ft.Icons.DASHBOARD, size=60, color="blue"),
+    builders["home"] = lambda: ft.Column([
+        ft.Container(ft.Icon(ft.Icons.DASHBOARD, size=60, color="blue"), on_long_press=open_diagnostics),
         ft.Text("نظام إدارة العمال", size=30, weight="bold"),
+        home_site,
         ft.Container(height=20),
-        ft.ElevatedButton("العملاء", width=250, height=60, on_click=lambda e: go("clients"), icon=ft.Icons.PEOPLE),
-        ft.ElevatedButton("الحضور", width=250, height=60, on_click=lambda e: go("attendance"), icon=ft.Icons.CHECK),
-        ft.ElevatedButton("المصروفات", width=250, height=60, on_click=lambda e: go("expenses"), icon=ft.Icons.MONEY),
-        ft.ElevatedButton("التقرير", width=250, height=60, on_click=lambda e: go("report"), icon=ft.Icons.ANALYTICS),
+        ft.ElevatedButton("العملاء", width=250, height=60, on_click=nav("clients"), icon=ft.Icons.PEOPLE),
+        ft.ElevatedButton("الحضور", width=250, height=60, on_click=nav("attendance"), icon=ft.Icons.CHECK),
+        ft.ElevatedButton("المصروفات", width=250, height=60, on_click=nav("expenses"), icon=ft.Icons.MONEY),
+        ft.ElevatedButton("التقرير", width=250, height=60, on_click=nav("report"), icon=ft.Icons.ANALYTICS),
+        ft.ElevatedButton("الرواتب", width=250, height=60, on_click=nav("payroll"), icon=ft.Icons.PAYMENTS),
+        ft.ElevatedButton("المواقع", width=250, height=60, on_click=nav("sites"), icon=ft.Icons.APARTMENT),
     ], alignment=ft.MainAxisAlignment.CENTER, horizontal_alignment=ft.CrossAxisAlignment.CENTER)
 
-    for s in screens.values(): page.add(s)
-    go("home")
+    page.add(loading_bar)
+    await go("home")
+    page.run_task(auto_backup)
 
 ft.app(target=main)
@@ -0,0 +1,69 @@
+# payroll.py - what every worker has earned, been paid and is still owed
+#
+# earned = daily_rate × days_worked, paid = payments of type دفع,
+# advances = payments of type سلفة, balance = earned - paid - advances.
+# All workers are computed by one GROUP BY over clients LEFT JOIN payments;
+# payments moved to archive files count through the clients.archived_* totals.
+from db import get_conn
+
+np = None  # NumPy, imported on the first what-if scenario when it is installed
+_np_checked = False
+
+PAYMENT = "دفع"
+ADVANCE = "سلفة"
+
+PAYROLL_SQL = """
+    SELECT c.id, c.name, c.daily_rate, c.days_worked,
+           COALESCE(c.daily_rate, 0) * COALESCE(c.days_worked, 0) AS earned,
+           COALESCE(SUM(CASE WHEN p.type = ? THEN p.amount END), 0) + c.archived_paid AS paid,
+           COALESCE(SUM(CASE WHEN p.type = ? THEN p.amount END), 0) + c.archived_advances AS advances
+    FROM clients c LEFT JOIN payments p ON p.client_id = c.id
+    GROUP BY c.id
+    ORDER BY c.name, c.id
+"""
+
+
+def compute_payroll():
+    """Rows of (id, name, daily_rate, days, earned, paid, advances, balance)."""
+    rows = get_conn().execute(PAYROLL_SQL, (PAYMENT, ADVANCE)).fetchall()
+    return [(cid, name, rate, days, earned, paid, adv, earned - paid - adv)
+            for cid, name, rate, days, earned, paid, adv in rows]
+
+
+def payroll_totals(rows):
+    """(workers, earned, paid, advances, balance) summed over compute_payroll rows."""
+    earned = paid = adv = balance = 0
+    for row in rows:
+        earned += row[4]
+        paid += row[5]
+        adv += row[6]
+        balance += row[7]
+    return len(rows), earned, paid, adv, balance
+
+
+def what_if_balances(rows, scale=1.0, raise_by=0.0):
+    """Balances if every daily rate became rate * scale + raise_by.
+
+    Uses NumPy when it is installed, plain Python otherwise.
+    Returns (balances, total_balance).
+    """
+    _load_numpy()
+    if np is not None and rows:
+        arr = np.array([(r[2] or 0, r[3] or 0, r[5], r[6]) for r in rows], dtype=float)
+        rate, days, paid, adv = arr.T
+        balances = (rate * scale + raise_by) * days - paid - adv
+        return balances.tolist(), float(balances.sum())
+    balances = [((r[2] or 0) * scale + raise_by) * (r[3] or 0) - r[5] - r[6] for r in rows]
+    return balances, sum(balances)
+
+
+def _load_numpy():
+    # deferred so importing payroll (and starting the app) does not pay for NumPy
+    global np, _np_checked
+    if not _np_checked:
+        _np_checked = True
+        try:
+            import numpy
+            np = numpy
+        except ImportError:  # optional: only speeds up what-if scenarios
+            pass
@@ -0,0 +1,104 @@
+# reconcile.py - check clients.days_worked against the attendance table
+#
+#   python reconcile.py [--db path.db] [--batch 500] [--dry-run]
+#
+# The attendance triggers are the only writers of days_worked; this job
+# verifies them and repairs rows changed behind their back (a hand edit, an
+# old app version). Days moved to an archive file by archive.py are counted
+# through clients.archived_days. Clients are checked in id order, `batch_size` at a time,
+# each batch in its own short transaction, so other writers wait at most one
+# batch and never for the whole table.
+import argparse
+import sys
+import threading
+import time
+from contextlib import closing
+
+from db import invalidate_client_cache, migrate, open_connection, set_db_path
+
+BATCH_SIZE = 500
+PAUSE = 0.01  # seconds between batches, so queued writers get the lock
+
+CHECK_SQL = """
+    SELECT c.id, c.days_worked, c.archived_days + (SELECT COUNT(*) FROM attendance a WHERE a.client_id = c.id)
+    FROM clients c WHERE c.id > ? ORDER BY c.id LIMIT ?
+"""
+
+
+def reconcile_days_worked(batch_size=BATCH_SIZE, pause=PAUSE, fix=True, progress=None):
+    """Recount days_worked from attendance for every client.
+
+    Returns a dict with `checked`, `fixed` and `drift`, the list of
+    (client_id, stored, counted) rows that disagreed, plus `seconds`.
+    With fix=False nothing is written.
+    """
+    start = time.perf_counter()
+    result = {"checked": 0, "fixed": 0, "drift": []}
+    after = 0
+    with closing(open_connection()) as conn:
+        migrate(conn)
+        while True:
+            # IMMEDIATE: no toggle can land between counting and fixing a batch
+            conn.execute("BEGIN IMMEDIATE" if fix else "BEGIN")
+            try:
+                rows = conn.execute(CHECK_SQL, (after, batch_size)).fetchall()
+                drift = [(cid, stored, counted) for cid, stored, counted in rows if stored != counted]
+                if fix and drift:
+                    conn.executemany("UPDATE clients SET days_worked=? WHERE id=?",
+                                     [(counted, cid) for cid, _, counted in drift])
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            result["checked"] += len(rows)
+            result["drift"] += drift
+            if fix:
+                result["fixed"] += len(drift)
+                for cid, _, _ in drift:
+                    invalidate_client_cache(cid)
+            if progress:
+                progress(result["checked"], len(result["drift"]))
+            if len(rows) < batch_size:
+                break
+            after = rows[-1][0]
+            time.sleep(pause)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def reconcile_in_background(progress=None, done=None, error=None, **kwargs):
+    """Run reconcile_days_worked on a daemon thread so a UI handler can return immediately."""
+    def run():
+        try:
+            result = reconcile_days_worked(progress=progress, **kwargs)
+        except Exception as ex:
+            if error:
+                error(ex)
+            return
+        if done:
+            done(result)
+
+    t = threading.Thread(target=run, name="days-worked-reconcile", daemon=True)
+    t.start()
+    return t
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check days_worked against attendance")
+    parser.add_argument("--db", help="database file (default: worker_manager_final.db)")
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="report drift without fixing it")
+    args = parser.parse_args(argv)
+    if args.db:
+        set_db_path(args.db)
+
+    result = reconcile_days_worked(batch_size=args.batch, fix=not args.dry_run)
+    print(f"checked {result['checked']} clients in {result['seconds']:.2f}s, "
+          f"drift {len(result['drift'])}, fixed {result['fixed']}")
+    for cid, stored, counted in result["drift"][:20]:
+        print(f"  client {cid}: days_worked {stored}, attendance {counted}", file=sys.stderr)
+    return 1 if result["drift"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+# sites.py - one database file per construction site, and reports across sites
+#
+#   python sites.py report                       # every registered site, all time
+#   python sites.py report --from 2024-01-01 --to 2024-01-31 a.db b.db
+#
+# The registry (sites.json) maps a site name to its database file and
+# remembers which site the app last had open. switch_site() points db.py at
+# another file without restarting the app. consolidated_report() ATTACHes the
+# site files to one in-memory connection and totals them in a single query
+# over their report_summary / daily_rollup tables.
+import argparse
+import json
+import os
+import sqlite3
+import sys
+from contextlib import closing
+from urllib.parse import quote
+
+import db
+
+SITES_FILE = os.path.join(db.BASE_DIR, "sites.json")
+
+
+# -------------------- REGISTRY --------------------
+def load_registry(registry=SITES_FILE):
+    """{"current": name or None, "sites": {name: db path}}"""
+    try:
+        with open(registry, encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        data = {}
+    return {"current": data.get("current"), "sites": dict(data.get("sites", {}))}
+
+
+def save_registry(data, registry=SITES_FILE):
+    tmp = registry + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, registry)
+
+
+def site_path(name, registry=SITES_FILE):
+    # default file for a new site: next to the registry, named after the site
+    safe = "".join(ch if ch.isalnum() else "_" for ch in name.strip())
+    return os.path.join(os.path.dirname(os.path.abspath(registry)), f"site_{safe}.db")
+
+
+def add_site(name, path=None, registry=SITES_FILE):
+    """Register `name` and create its database if needed; returns its path."""
+    name = name.strip()
+    if not name:
+        raise ValueError("اسم الموقع مطلوب")
+    data = load_registry(registry)
+    if name in data["sites"]:
+        raise ValueError(f"الموقع موجود بالفعل: {name}")
+    path = os.path.abspath(path or site_path(name, registry))
+    with closing(db.open_connection(path)) as conn:
+        db.migrate(conn)
+    data["sites"][name] = path
+    save_registry(data, registry)
+    return path
+
+
+def remove_site(name, registry=SITES_FILE):
+    """Forget `name`; its database file is left on disk."""
+    data = load_registry(registry)
+    data["sites"].pop(name, None)
+    if data["current"] == name:
+        data["current"] = None
+    save_registry(data, registry)
+
+
+def open_current_site(default_name, default_path, registry=SITES_FILE):
+    """Point db.py at the last used site, registering `default_path` on first run.
+
+    Returns the site name.
+    """
+    data = load_registry(registry)
+    if not data["sites"]:
+        data["sites"][default_name] = os.path.abspath(default_path)
+    name = data["current"] if data["current"] in data["sites"] else next(iter(data["sites"]))
+    data["current"] = name
+    save_registry(data, registry)
+    db.set_db_path(data["sites"][name])
+    return name
+
+
+def switch_site(name, registry=SITES_FILE):
+    """Make `name` the open site: later helper calls, on every thread, use its file.
+
+    Pending writes for the old site (e.g. buffered attendance) must be
+    flushed by the caller first.
+    """
+    data = load_registry(registry)
+    path = data["sites"][name]
+    db.set_db_path(path)
+    db.init_db()
+    data["current"] = name
+    save_registry(data, registry)
+    return path
+
+
+# -------------------- CONSOLIDATED REPORT --------------------
+def _attach_uri(path):
+    return "file:" + quote(os.path.abspath(path)) + "?mode=ro"
+
+
+def _site_select(schema, ranged):
+    if ranged:
+        return f"""SELECT ? AS site,
+            (SELECT n_clients FROM {schema}.report_summary WHERE id = 1),
+            COALESCE(SUM(attendance), 0), COALESCE(SUM(income), 0), COALESCE(SUM(expense), 0),
+            COALESCE(SUM(payments), 0), COALESCE(SUM(advances), 0)
+            FROM {schema}.daily_rollup WHERE day BETWEEN ? AND ?"""
+    return f"""SELECT ? AS site, s.n_clients, s.n_attendance, s.total_income, s.total_expense,
+            (SELECT COALESCE(SUM(payments), 0) FROM {schema}.daily_rollup)
+                + (SELECT COALESCE(SUM(payments), 0) FROM {schema}.archives),
+            (SELECT COALESCE(SUM(advances), 0) FROM {schema}.daily_rollup)
+                + (SELECT COALESCE(SUM(advances), 0) FROM {schema}.archives)
+            FROM {schema}.report_summary s WHERE s.id = 1"""
+
+
+def consolidated_report(sites, start=None, end=None):
+    """Totals per site and overall for {name: db path}, optionally for start..end.
+
+    Rows are (site, clients, attendance, income, expense, payments, advances, net);
+    returns (rows, total_row). Site files are upgraded to the current schema
+    first, then read through ATTACH in read-only mode. Archived years in a
+    date range come from each site's archive files (see archive.py).
+    """
+    ranged = start is not None
+    archived = {}
+    for name, path in sites.items():
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        with closing(db.open_connection(path)) as conn:
+            db.migrate(conn)
+            if ranged:
+                archived[name] = db.archived_range_totals(conn, start, end)
+
+    rows = []
+    with closing(sqlite3.connect("file::memory:", uri=True)) as conn:
+        limit = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+        items = list(sites.items())
+        # SQLite attaches at most `limit` files at once: one query per group
+        for i in range(0, len(items), limit):
+            group = items[i:i + limit]
+            selects, params = [], []
+            for n, (name, path) in enumerate(group):
+                conn.execute(f"ATTACH DATABASE ? AS site{n}", (_attach_uri(path),))
+                selects.append(_site_select(f"site{n}", ranged))
+                params += [name, start, end] if ranged else [name]
+            try:
+                rows += conn.execute(" UNION ALL ".join(selects), params).fetchall()
+            finally:
+                for n in range(len(group)):
+                    conn.execute(f"DETACH DATABASE site{n}")
+
+    if ranged:
+        rows = [(site, n, *(a + b for a, b in zip(values, archived[site]))) for site, n, *values in rows]
+    rows = [(site, n or 0, att, inc, exp, paid, adv, inc - exp) for site, n, att, inc, exp, paid, adv in rows]
+    total = ("الإجمالي",) + tuple(sum(r[k] for r in rows) for k in range(1, 8))
+    return rows, total
+
+
+def format_report(rows, total):
+    header = ("الموقع", "العملاء", "الحضور", "الدخل", "المصروف", "المدفوع", "السلف", "الصافي")
+    return "\n".join(" | ".join(str(v) for v in r) for r in [header, *rows, total])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-site databases")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rep = sub.add_parser("report", help="consolidated report across sites")
+    rep.add_argument("paths", nargs="*", help="site database files (default: every registered site)")
+    rep.add_argument("--from", dest="start")
+    rep.add_argument("--to", dest="end")
+    rep.add_argument("--registry", default=SITES_FILE)
+    args = parser.parse_args(argv)
+
+    if (args.start is None) != (args.end is None):
+        parser.error("--from and --to go together")
+    if args.paths:
+        sites = {os.path.splitext(os.path.basename(p))[0]: p for p in args.paths}
+    else:
+        sites = load_registry(args.registry)["sites"]
+    if not sites:
+        parser.error("no sites registered")
+    print(format_report(*consolidated_report(sites, args.start, args.end)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
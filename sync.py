@@ -0,0 +1,516 @@
+# sync.py - exchange only the rows changed since the last sync between copies of the database
+#
+#   python sync.py [--db path.db] serve [--port 8765]                  # on the office desktop
+#   python sync.py [--db path.db] push http://192.168.1.10:8765/sync [--token T]  # from a phone's copy
+#   python sync.py [--db path.db] copy phone.db [--url ...]            # set up a new copy
+#
+# Triggers (migration 10) record every edit of clients, attendance, payments
+# and expenses in change_log, one entry per row that moves to the end of the
+# log on each edit (a tombstone once the row is deleted). A sync sends the
+# current state of the rows behind entries newer than the peer's watermark,
+# so it moves kilobytes instead of the whole file. Conflicts resolve the
+# same way on both sides: the edit with the later time wins, ties going to
+# the larger device id. An edit always gets a later time than the version of
+# the row it replaced, so a clock running behind cannot lose a change made
+# after a sync. A client deleted on one copy but edited later on the other
+# stays, with all its rows: deleting a client leaves one tombstone (its
+# attendance and payments go with it by cascade), and the copy where that
+# tombstone loses sends the client's rows back.
+#
+# The side that starts a sync keeps both watermarks per peer in sync_peers:
+# `sent`, the last local seq the peer has taken, and `received`, the last seq
+# of the peer's log applied here. A sync that fails half way is simply run
+# again: rows already applied lose the comparison against themselves. Every
+# answer names the peer's log (migration 12); restoring a backup gives the
+# restored file a new one, since its seqs went back, and a sync that sees the
+# name change exchanges everything once instead of trusting its watermarks.
+#
+# serve() only answers requests carrying the served file's token
+# (Authorization: Bearer ...). make_copy() pairs a new copy by storing the
+# token with its peer; a copy set up otherwise is paired by passing the token
+# (shown by `serve` and in the desktop app) to its first sync.
+#
+# A new device starts from make_copy(), which records the copy's watermarks
+# so its first sync does not resend the whole log. Copies set up before this
+# existed were whole-file copies: rows from before migration 10 are matched
+# by id, and only edits made after it are sent.
+import argparse
+import gzip
+import hmac
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import urllib.request
+import uuid
+from contextlib import closing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import db
+from db import init_db, invalidate_client_cache, migrate, open_connection, set_db_path, transaction
+
+PORT = 8765
+UPSERT = "upsert"
+DELETE = "delete"
+
+# the current state of each row edited after seq ? (and up to seq ?), skipping
+# edits that came from device ?: seq, ts, origin, key, then the row's fields;
+# a payment names its client by uid
+_CHANGED_SQL = {
+    "clients": """SELECT l.seq, l.ts, l.origin, r.uid, r.name, r.phone, r.daily_rate
+        FROM change_log l JOIN clients r ON r.id = l.row_id""",
+    "payments": """SELECT l.seq, l.ts, l.origin, r.uid, c.uid, r.amount, r.type, r.date
+        FROM change_log l JOIN payments r ON r.id = l.row_id JOIN clients c ON c.id = r.client_id""",
+    "expenses": """SELECT l.seq, l.ts, l.origin, r.uid, r.type, r.amount, r.description, r.date
+        FROM change_log l JOIN expenses r ON r.id = l.row_id""",
+    "attendance": """SELECT l.seq, l.ts, l.origin, c.uid || '|' || r.date
+        FROM change_log l JOIN attendance r ON r.id = l.row_id JOIN clients c ON c.id = r.client_id""",
+}
+_CHANGED_WHERE = " WHERE l.tbl = '{}' AND l.seq > ? AND l.seq <= ? AND l.origin IS NOT ?"
+# parents are written before their children and deleted after them
+_ORDER = ("clients", "expenses", "payments", "attendance")
+
+
+def device_id(db_path=None):
+    """This copy's id, kept next to the DB file (<name>.device).
+
+    It is not stored in the database itself: a copied file would otherwise
+    carry the id of the copy it came from.
+    """
+    path = os.path.splitext(os.path.abspath(db_path or db.DB))[0] + ".device"
+    try:
+        with open(path, encoding="utf-8") as f:
+            value = f.read().strip()
+        if value:
+            return value
+    except FileNotFoundError:
+        pass
+    value = uuid.uuid4().hex
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(value)
+    return value
+
+
+def _db_path(conn):
+    return conn.execute("PRAGMA database_list").fetchone()[2]
+
+
+def _state(conn, key):
+    row = conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def renew_log(conn):
+    """Give the change log of `conn`'s file a new id, e.g. after its seqs went back.
+
+    Peers that synced with the old log then resend and refetch everything
+    once on their next sync.
+    """
+    with transaction(conn) as c:
+        c.execute("INSERT OR REPLACE INTO sync_state VALUES ('log', lower(hex(randomblob(8))))")
+
+
+def _encode(message):
+    return json.dumps(message, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def local_changes(conn, after, me, peer=None):
+    """Changes logged after seq `after`, minus those that came from `peer`.
+
+    Returns (changes, upto): one [table, key, op, ts, origin, row] per changed
+    row in log order, and the log position they cover.
+    """
+    upto = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+    params = (after, upto, peer)
+    found = []
+    for tbl, sql in _CHANGED_SQL.items():
+        for seq, ts, origin, key, *row in conn.execute(sql + _CHANGED_WHERE.format(tbl), params):
+            found.append((seq, [tbl, key, UPSERT, ts, origin or me, row or None]))
+    for seq, tbl, ts, origin, key in conn.execute(
+            "SELECT seq, tbl, ts, origin, key FROM change_log l WHERE op = 'delete' AND seq > ? AND seq <= ? "
+            "AND origin IS NOT ?", params):
+        found.append((seq, [tbl, key, DELETE, ts, origin or me, None]))
+    found.sort(key=lambda item: item[0])
+    return [change for _, change in found], upto
+
+
+def _id_of(c, table, uid):
+    row = c.execute(f"SELECT id FROM {table} WHERE uid = ?", (uid,)).fetchone()
+    return row[0] if row else None
+
+
+def _local_id(c, tbl, key):
+    # id of the row `key` names here, or None
+    if tbl != "attendance":
+        return _id_of(c, tbl, key)
+    client_uid, day = key.rsplit("|", 1)
+    row = c.execute("SELECT a.id FROM attendance a JOIN clients c ON c.id = a.client_id "
+                    "WHERE c.uid = ? AND a.date = ?", (client_uid, day)).fetchone()
+    return row[0] if row else None
+
+
+def _version(c, tbl, row_id, key):
+    # (ts, origin) of the local version: the row's entry, or its tombstone
+    if row_id is not None:
+        return c.execute("SELECT ts, origin FROM change_log WHERE tbl = ? AND row_id = ?", (tbl, row_id)).fetchone()
+    return c.execute("SELECT ts, origin FROM change_log WHERE tbl = ? AND key = ?", (tbl, key)).fetchone()
+
+
+def _upsert(c, tbl, key, row):
+    # write one remote row; its local id, or None if its client is gone here
+    if tbl == "attendance":
+        client_uid, day = key.rsplit("|", 1)
+        cid = _id_of(c, "clients", client_uid)
+        if cid is None:
+            return None
+        c.execute("INSERT OR IGNORE INTO attendance (client_id, date) VALUES (?, ?)", (cid, day))
+        return _local_id(c, tbl, key)
+    if tbl == "clients":
+        values = (*row, key)
+        updated = c.execute("UPDATE clients SET name = ?, phone = ?, daily_rate = ? WHERE uid = ?", values).rowcount
+        insert = "INSERT INTO clients (name, phone, daily_rate, days_worked, uid) VALUES (?, ?, ?, 0, ?)"
+    elif tbl == "payments":
+        cid = _id_of(c, "clients", row[0])
+        if cid is None:
+            return None
+        values = (cid, *row[1:], key)
+        updated = c.execute("UPDATE payments SET client_id = ?, amount = ?, type = ?, date = ? WHERE uid = ?",
+                            values).rowcount
+        insert = "INSERT INTO payments (client_id, amount, type, date, uid) VALUES (?, ?, ?, ?, ?)"
+    elif tbl == "expenses":
+        values = (*row, key)
+        updated = c.execute("UPDATE expenses SET type = ?, amount = ?, description = ?, date = ? WHERE uid = ?",
+                            values).rowcount
+        insert = "INSERT INTO expenses (type, amount, description, date, uid) VALUES (?, ?, ?, ?, ?)"
+    else:
+        raise ValueError(f"unknown table {tbl!r}")
+    return _id_of(c, tbl, key) if updated else c.execute(insert, values).lastrowid
+
+
+# a client and the rows that go with it when it is deleted
+_CLIENT_ROWS = {"clients": "id", "payments": "client_id", "attendance": "client_id"}
+
+
+def _resend_client(c, cid):
+    # the client outlived a remote delete here, but the deleting copy lost the
+    # client's rows with it (the cascade leaves no tombstones): log the client
+    # and each of its rows again as a fresh local edit, so they are sent back
+    now = int(time.time() * 1000)
+    for tbl, column in _CLIENT_ROWS.items():
+        c.execute(f"""INSERT OR REPLACE INTO change_log (tbl, row_id, op, ts, origin)
+            SELECT ?, r.id, ?, MAX(?, COALESCE(l.ts, 0) + 1), '' FROM {tbl} r
+            LEFT JOIN change_log l ON l.tbl = ? AND l.row_id = r.id WHERE r.{column} = ?""",
+                  (tbl, UPSERT, now, tbl, cid))
+
+
+def _order(change):
+    rank = _ORDER.index(change[0])
+    return (0, rank) if change[2] == UPSERT else (1, -rank)
+
+
+def apply_changes(conn, changes, me):
+    """Apply a peer's changes where they win against the local version.
+
+    Runs in one transaction (joining the caller's). Applied changes are logged
+    with the peer's time and origin, not as local edits. Returns a dict with
+    `applied`, `skipped` and `resent` (clients kept against a remote delete,
+    whose rows are logged again for the peer).
+    """
+    applied = skipped = resent = 0
+    with transaction(conn) as c:
+        c.execute("INSERT OR REPLACE INTO sync_state VALUES ('muted', 1)")
+        for tbl, key, op, ts, origin, row in sorted(changes, key=_order):
+            if tbl not in _CHANGED_SQL:
+                raise ValueError(f"unknown table {tbl!r}")
+            row_id = _local_id(c, tbl, key)
+            local = _version(c, tbl, row_id, key)
+            if local and (local[0], local[1] or me) >= (ts, origin):
+                if op == DELETE and tbl == "clients" and row_id is not None:
+                    _resend_client(c, row_id)
+                    resent += 1
+                skipped += 1
+                continue
+            if op == UPSERT:
+                row_id = _upsert(c, tbl, key, row)
+                if row_id is None:
+                    skipped += 1
+                    continue
+                c.execute("DELETE FROM change_log WHERE tbl = ? AND key = ?", (tbl, key))
+                c.execute("INSERT OR REPLACE INTO change_log (tbl, row_id, op, ts, origin) VALUES (?, ?, ?, ?, ?)",
+                          (tbl, row_id, UPSERT, ts, origin))
+            else:
+                # the tombstone stays even if the row never existed here, so
+                # an older copy of it arriving later cannot bring it back
+                if row_id is not None:
+                    c.execute(f"DELETE FROM {tbl} WHERE id = ?", (row_id,))
+                c.execute("INSERT OR REPLACE INTO change_log (tbl, op, ts, origin, key) VALUES (?, ?, ?, ?, ?)",
+                          (tbl, DELETE, ts, origin, key))
+            applied += 1
+        c.execute("DELETE FROM sync_state WHERE key = 'muted'")
+    if applied:
+        invalidate_client_cache()
+    return {"applied": applied, "skipped": skipped, "resent": resent}
+
+
+def handle_sync(conn, request):
+    """Serve one sync request from a peer: apply its changes, answer with ours."""
+    me = device_id(_db_path(conn))
+    peer = request["device"]
+    if peer == me:
+        raise ValueError("a database cannot sync with itself (copied .device file?)")
+    result = apply_changes(conn, request["changes"], me)
+    # a full exchange (since 0) also returns the peer's own edits: it may have lost them
+    since = int(request["since"])
+    changes, upto = local_changes(conn, since, me, peer if since else None)
+    return {"device": me, "log": _state(conn, "log"), "upto": upto, "changes": changes,
+            "applied": result["applied"]}
+
+
+def sync(conn, transport, peer):
+    """Exchange changes with the copy behind `transport`.
+
+    `transport` takes a request dict and returns the peer's response dict
+    (http_transport(url), or handle_sync on another connection in-process);
+    `peer` names the peer in sync_peers. Returns a dict with `sent`,
+    `received`, `applied` (here), `peer_applied`, `bytes_sent`,
+    `bytes_received` and `seconds`.
+    """
+    start = time.perf_counter()
+    result = _exchange(conn, transport, peer)
+    if result.pop("resent"):
+        # a client the peer deleted was kept here: send its rows back right away
+        more = _exchange(conn, transport, peer)
+        more.pop("resent")
+        result = {key: result[key] + more[key] for key in result}
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def _exchange(conn, transport, peer):
+    me = device_id(_db_path(conn))
+    state = conn.execute("SELECT device, sent, received, log, token FROM sync_peers WHERE peer = ?",
+                         (peer,)).fetchone()
+    device, sent, received, log, token = state or (None, 0, 0, None, None)
+    changes, upto = local_changes(conn, sent, me, device)
+    request = {"device": me, "since": received, "upto": upto, "changes": changes}
+    response = transport(request)
+    bytes_sent, bytes_received = len(_encode(request)), len(_encode(response))
+    if log is not None and response.get("log") != log:
+        # the peer's log was replaced (a restored backup): its seqs no longer
+        # match our watermarks and it may have lost what we sent, so send and
+        # take everything, including our own edits it had
+        changes, upto = local_changes(conn, 0, me)
+        request = {"device": me, "since": 0, "upto": upto, "changes": changes}
+        response = transport(request)
+        bytes_sent, bytes_received = bytes_sent + len(_encode(request)), bytes_received + len(_encode(response))
+    with transaction(conn) as c:
+        result = apply_changes(conn, response["changes"], me)
+        c.execute("INSERT OR REPLACE INTO sync_peers (peer, device, sent, received, synced_at, log, token) "
+                  "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                  (peer, response["device"], upto, response["upto"], time.strftime("%Y-%m-%dT%H:%M:%S"),
+                   response.get("log"), token))
+    return {"sent": len(changes), "received": len(response["changes"]), "applied": result["applied"],
+            "peer_applied": response.get("applied", 0), "bytes_sent": bytes_sent,
+            "bytes_received": bytes_received, "resent": result["resent"]}
+
+
+def http_transport(url, token, timeout=30):
+    """A transport for sync() that POSTs the request to a `serve()` endpoint with its `token`."""
+    def send(request):
+        req = urllib.request.Request(url, data=gzip.compress(_encode(request)), method="POST",
+                                     headers={"Content-Type": "application/json", "Content-Encoding": "gzip",
+                                              "Authorization": f"Bearer {token}"})
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return json.loads(gzip.decompress(resp.read()))
+    return send
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        if self.path.rstrip("/") != "/sync":
+            self.send_error(404)
+            return
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        given = self.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        try:
+            if self.headers.get("Content-Encoding") == "gzip":
+                body = gzip.decompress(body)
+            with closing(open_connection(self.server.db_path)) as conn:
+                migrate(conn)
+                if not hmac.compare_digest(given.encode(), _state(conn, "token").encode()):
+                    self.send_error(401, "wrong or missing sync token")
+                    return
+                response = gzip.compress(_encode(handle_sync(conn, json.loads(body))))
+        except (ValueError, KeyError, TypeError, OSError, sqlite3.Error) as ex:
+            self.send_error(400, str(ex))
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(db_path=None, host="0.0.0.0", port=PORT):
+    """An HTTP server answering POST /sync for the DB at `db_path`.
+
+    Without `db_path` each request goes to the DB current at that moment, so
+    the server follows a site switch. Requests must carry that DB's
+    sync_token().
+
+    Call serve_forever() on it, or use serve_in_background().
+    """
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.db_path = db_path
+    return server
+
+
+def serve_in_background(db_path=None, host="0.0.0.0", port=PORT):
+    """Start serve() on a daemon thread; stop it with .shutdown() on the returned server."""
+    server = serve(db_path, host, port)
+    threading.Thread(target=server.serve_forever, name="sync-server", daemon=True).start()
+    return server
+
+
+def make_copy(target, url):
+    """Copy the current DB to a new file `target` for another device that syncs with `url`.
+
+    `url` is where this DB is served. Both watermarks of the copy start at the
+    end of the log, so its first sync sends only what changed after the copy,
+    and the copy is paired with this DB's token. The copy gets a log id and a
+    token of its own.
+    """
+    if os.path.exists(target):
+        raise FileExistsError(target)
+    me = device_id()
+    with closing(open_connection()) as source, closing(sqlite3.connect(target)) as conn:
+        migrate(source)
+        source.backup(conn)
+        with conn:
+            upto = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+            log, token = _state(conn, "log"), _state(conn, "token")
+            conn.execute("INSERT OR REPLACE INTO sync_state VALUES ('log', lower(hex(randomblob(8))))")
+            conn.execute("INSERT OR REPLACE INTO sync_state VALUES ('token', lower(hex(randomblob(16))))")
+            conn.execute("DELETE FROM sync_peers")
+            conn.execute("INSERT INTO sync_peers (peer, device, sent, received, synced_at, log, token) "
+                         "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (url, me, upto, upto, time.strftime("%Y-%m-%dT%H:%M:%S"), log, token))
+    return {"path": target, "bytes": os.path.getsize(target), "upto": upto}
+
+
+def local_url(port=PORT):
+    """The /sync URL other devices on the local network can reach this machine at."""
+    with closing(socket.socket(socket.AF_INET, socket.SOCK_DGRAM)) as s:
+        try:
+            s.connect(("10.255.255.255", 1))  # picks the LAN interface; nothing is sent
+            host = s.getsockname()[0]
+        except OSError:
+            host = "127.0.0.1"
+    return f"http://{host}:{port}/sync"
+
+
+def sync_now(url, token=None):
+    """sync() the current DB with the server at `url`.
+
+    `token` pairs the DB with that server; it is stored with the peer, so
+    later syncs can leave it out.
+    """
+    with closing(open_connection()) as conn:
+        migrate(conn)
+        token = token or peer_token(url, conn)
+        if not token:
+            raise PermissionError("not paired with this server: give its sync token")
+        with transaction(conn) as c:
+            if not c.execute("UPDATE sync_peers SET token = ? WHERE peer = ?", (token, url)).rowcount:
+                c.execute("INSERT INTO sync_peers (peer, token) VALUES (?, ?)", (url, token))
+        return sync(conn, http_transport(url, token), url)
+
+
+def sync_token():
+    """The token other copies must present to sync with the current DB."""
+    init_db()
+    return _state(db.get_conn(), "token")
+
+
+def peer_token(url, conn=None):
+    """The token the current DB was paired with for the server at `url`, or None."""
+    if conn is None:
+        init_db()
+        conn = db.get_conn()
+    row = conn.execute("SELECT token FROM sync_peers WHERE peer = ?", (url,)).fetchone()
+    return row[0] if row else None
+
+
+def last_peer():
+    """URL of the most recently synced peer of the current DB, or None."""
+    init_db()
+    row = db.get_conn().execute("SELECT peer FROM sync_peers ORDER BY synced_at DESC LIMIT 1").fetchone()
+    return row[0] if row else None
+
+
+def sync_in_background(url, token=None, done=None, error=None):
+    """Run sync_now on a daemon thread so a UI handler can return immediately."""
+    def run():
+        try:
+            result = sync_now(url, token)
+        except Exception as ex:
+            if error:
+                error(ex)
+            return
+        if done:
+            done(result)
+
+    t = threading.Thread(target=run, name="db-sync", daemon=True)
+    t.start()
+    return t
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sync changed rows between copies of the database")
+    parser.add_argument("--db", help="database file (default: worker_manager_final.db)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("serve", help="answer sync requests from other copies")
+    p.add_argument("--host", default="0.0.0.0")
+    p.add_argument("--port", type=int, default=PORT)
+    p = sub.add_parser("push", help="sync with the copy served at URL")
+    p.add_argument("url", help="e.g. http://192.168.1.10:8765/sync")
+    p.add_argument("--token", help="the server's sync token (first sync of a copy not made with `copy`)")
+    p = sub.add_parser("copy", help="make a new copy for another device that syncs with this one")
+    p.add_argument("target", help="file to create, e.g. phone.db")
+    p.add_argument("--url", help="where this DB is served (default: this machine on --port)")
+    p.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args(argv)
+    if args.db:
+        set_db_path(args.db)
+
+    if args.command == "serve":
+        init_db()
+        server = serve(host=args.host, port=args.port)
+        print(f"serving {db.DB} on http://{args.host}:{args.port}/sync (device {device_id()})")
+        print(f"sync token: {sync_token()}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return 0
+    if args.command == "copy":
+        result = make_copy(args.target, args.url or local_url(args.port))
+        print(f"{result['path']}: {result['bytes'] / 1e6:.1f} MB, syncs from log position {result['upto']}")
+        return 0
+    result = sync_now(args.url, args.token)
+    print(f"sent {result['sent']} change(s) ({result['bytes_sent']} bytes), peer applied {result['peer_applied']}; "
+          f"received {result['received']} ({result['bytes_received']} bytes), applied {result['applied']} "
+          f"in {result['seconds']:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+
+
+@pytest.fixture
+def fresh_db(tmp_path):
+    """Point the data layer at an empty, migrated DB for one test; yields its path."""
+    previous = db.DB
+    path = str(tmp_path / "test.db")
+    db.set_db_path(path)
+    db.init_db()
+    yield path
+    db.set_db_path(previous)
@@ -0,0 +1,125 @@
+import json
+import os
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import pytest
+
+import api
+import archive
+import db
+
+
+@pytest.fixture
+def server(fresh_db):
+    server = api.serve_in_background(port=0, workers=2)
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+    db.close_all()
+
+
+def get(url, etag=None):
+    # (status, body or None, ETag header) for one GET
+    request = urllib.request.Request(url, headers={"If-None-Match": etag} if etag else {})
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, json.loads(response.read()), response.headers["ETag"]
+    except urllib.error.HTTPError as ex:
+        body = ex.read()
+        return ex.code, json.loads(body) if body else None, ex.headers["ETag"]
+
+
+def all_pages(url, limit, max_pages=100):
+    items, cursor = [], None
+    for _ in range(max_pages):
+        status, body, _ = get(f"{url}{'&' if '?' in url else '?'}limit={limit}" + (f"&cursor={cursor}" if cursor else ""))
+        assert status == 200 and len(body["items"]) <= limit
+        items += body["items"]
+        cursor = body["next"]
+        if cursor is None:
+            return items
+    raise AssertionError(f"still paging after {max_pages} pages")
+
+
+def add_payments(cid, dates):
+    with db.transaction() as c:
+        c.executemany("INSERT INTO payments (client_id, amount, type, date) VALUES (?, 10, 'دفع', ?)",
+                      [(cid, day) for day in dates])
+
+
+# -------------------- PAGES --------------------
+def test_client_and_expense_pages_cover_every_row_once(server):
+    for i in range(23):
+        db.insert_client(("أحمد", "علي")[i % 2], str(i), 100)
+    with db.transaction() as c:
+        c.executemany("INSERT INTO expenses (type, amount, description, date) VALUES ('دخل', ?, '', ?)",
+                      [(i, f"2025-03-0{1 + i % 3}") for i in range(17)])
+    for limit in (1, 5, 23, 100):
+        clients = all_pages(f"{server}/clients", limit)
+        assert [c["id"] for c in clients] == [r[0] for r in db.fetch_clients()]
+        expenses = all_pages(f"{server}/expenses", limit)
+        assert [e["id"] for e in expenses] == [r[0] for r in db.get_expenses()]
+    searched = all_pages(f"{server}/clients?search={urllib.parse.quote('علي')}", 4)
+    assert [c["id"] for c in searched] == [r[0] for r in db.fetch_clients("علي")]
+
+
+def test_payment_pages_follow_the_helper(server):
+    cid = db.insert_client("سعيد", "010", 150)
+    add_payments(cid, [f"2025-03-{d:02d}" for d in range(1, 12)])
+    items = all_pages(f"{server}/payments?client={cid}", 4)
+    assert [p["id"] for p in items] == [r[0] for r in db.get_payments(cid)]
+
+
+# -------------------- ETAGS --------------------
+def test_a_matching_etag_is_answered_304_until_the_data_changes(server):
+    db.insert_client("سعيد", "010", 150)
+    status, body, etag = get(f"{server}/report")
+    assert status == 200 and body["clients"] == 1 and etag
+
+    assert get(f"{server}/report", etag)[0] == 304
+    assert get(f"{server}/clients", etag)[0] == 304  # the tag is for the whole DB
+
+    db.add_expense_db("دخل", 500, "x")  # another connection writes
+    status, body, new_etag = get(f"{server}/report", etag)
+    assert status == 200 and body["income"] == 500
+    assert new_etag != etag
+    assert get(f"{server}/report", new_etag)[0] == 304
+
+
+# -------------------- ERRORS --------------------
+@pytest.mark.parametrize("path", [
+    "/clients?limit=0",
+    "/clients?limit=x",
+    "/clients?cursor=nonsense",
+    "/clients?cursor=WyJhIiwge31d",  # ["a", {}]
+    "/expenses?cursor=WzEsIDJd",  # [1, 2]
+    "/payments",
+    "/payments?client=99999999999999999999999",
+    "/payments?client=1&cursor=-1",
+    "/report?from=2025-01-01",
+    "/report/daily",
+    "/attendance?date=yesterday",
+])
+def test_bad_parameters_are_400(server, path):
+    status, body, _ = get(server + path)
+    assert status == 400 and body["error"]
+
+
+@pytest.mark.parametrize("path", ["/clients/1", "/clients/99999999999999999999999", "/nowhere"])
+def test_unknown_ids_and_endpoints_are_404(server, path):
+    status, body, _ = get(server + path)
+    assert status == 404 and body["error"]
+
+
+def test_a_missing_archive_file_is_503(server, tmp_path):
+    cid = db.insert_client("سعيد", "010", 150)
+    add_payments(cid, ["2023-05-01", "2025-03-01"])
+    archive.archive_closed_years(before=2024)
+    assert get(f"{server}/payments?client={cid}&since=2023-01-01")[0] == 200
+
+    os.remove(tmp_path / "test.2023.db")
+    status, body, _ = get(f"{server}/payments?client={cid}&since=2023-01-01")
+    assert status == 503 and "2023" in body["error"]
+    assert get(f"{server}/payments?client={cid}&since=2025-01-01")[0] == 200  # later ranges still work
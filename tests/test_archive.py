@@ -0,0 +1,87 @@
+import os
+
+import pytest
+
+import archive
+import db
+import payroll
+import reconcile
+
+EVERYTHING = ("2023-01-01", "2025-12-31")
+
+
+@pytest.fixture
+def history(fresh_db):
+    """Two workers with days, payments and expenses in 2023, 2024 and 2025; yields their ids."""
+    ids = [db.insert_client("سعيد", "010", 150), db.insert_client("ماهر", "011", 120)]
+    with db.transaction() as c:
+        c.executemany("INSERT INTO attendance (client_id, date) VALUES (?, ?)",
+                      [(cid, f"{year}-{month:02d}-{day:02d}") for cid in ids for year in (2023, 2024, 2025)
+                       for month in (1, 6) for day in range(1, 4 + cid)])
+        c.executemany("INSERT INTO payments (client_id, amount, type, date) VALUES (?, ?, ?, ?)",
+                      [(cid, 10 * cid + year % 10, kind, f"{year}-03-0{1 + i}") for cid in ids
+                       for year in (2023, 2024, 2025) for i, kind in enumerate(("دفع", "سلفة"))])
+        c.executemany("INSERT INTO expenses (type, amount, description, date) VALUES (?, ?, '', ?)",
+                      [(kind, amount + year % 10, f"{year}-04-01") for year in (2023, 2024, 2025)
+                       for kind, amount in (("دخل", 500), ("مصروف", 80))])
+    return ids
+
+
+def everything_reported(ids):
+    # what the app shows that must not change when rows move to an archive file
+    return (
+        db.compute_report(),
+        payroll.compute_payroll(),
+        [db.get_range_report(f"{year}-01-01", f"{year}-12-31") for year in (2023, 2024, 2025)],
+        db.get_range_report(*EVERYTHING),
+        db.get_daily_rows(*EVERYTHING),
+        [db.get_payments(cid, "2023-01-01") for cid in ids],
+    )
+
+
+def live_rows():
+    conn = db.get_conn()
+    return {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in ("attendance", "payments", "expenses")}
+
+
+def test_archiving_keeps_every_total_and_carry_forward(history):
+    before = everything_reported(history)
+
+    result = archive.archive_closed_years(before=2025)
+
+    assert sorted(result["years"]) == [2023, 2024] == db.archived_years()
+    assert everything_reported(history) == before
+    # only 2025 is left in the live file
+    assert live_rows() == {"attendance": sum(2 * (3 + cid) for cid in history), "payments": 4, "expenses": 2}
+    assert reconcile.reconcile_days_worked(fix=False)["drift"] == []
+
+
+def test_archiving_again_moves_only_late_rows(history):
+    archive.archive_closed_years(before=2025)
+    before = everything_reported(history)
+
+    assert archive.archive_closed_years(before=2025)["years"] == {}
+    assert everything_reported(history) == before
+
+    # a day written to a closed year after it was archived
+    db.apply_attendance_changes([(history[0], "2023-09-01", True)])
+    db.add_expense_db("دخل", 5, "late")  # today's: stays live
+    before = everything_reported(history)
+    assert archive.archive_closed_years(before=2025)["years"] == {2023: 1}
+    assert everything_reported(history) == before
+    assert reconcile.reconcile_days_worked(fix=False)["drift"] == []
+
+
+def test_payments_of_a_missing_archive_year_raise_instead_of_coming_back_empty(history, fresh_db):
+    cid = history[0]
+    archive.archive_closed_years(before=2025)
+    live, since_2024 = db.get_payments(cid), db.get_payments(cid, "2024-01-01")
+    missing = os.path.join(os.path.dirname(fresh_db), db.archive_file(2023, fresh_db))
+    os.remove(missing)
+
+    assert db.get_payments(cid) == live  # the live file alone does not need it
+    assert db.get_payments(cid, "2024-01-01") == since_2024
+    with pytest.raises(FileNotFoundError, match="2023"):
+        db.get_payments(cid, "2023-01-01")
+    assert not os.path.exists(missing)  # ATTACH did not leave an empty file in its place
+    assert db.get_payments(cid, "2024-01-01") == since_2024  # nothing was left attached
@@ -0,0 +1,151 @@
+import os
+import shutil
+import sqlite3
+import time
+from contextlib import closing
+
+import pytest
+
+import archive
+import backup
+import db
+import sync
+
+
+def snapshot(**kwargs):
+    result = backup.take_backup(**kwargs)
+    time.sleep(0.002)  # snapshot names are stamped to the millisecond
+    return result
+
+
+def names():
+    return sorted(row[1] for row in db.fetch_clients())
+
+
+def log_id():
+    with closing(db.open_connection()) as conn:
+        return sync._state(conn, "log")
+
+
+def add_history(cid, years):
+    with db.transaction() as c:
+        c.executemany("INSERT INTO attendance (client_id, date) VALUES (?, ?)",
+                      [(cid, f"{year}-05-0{day}") for year in years for day in (1, 2, 3)])
+        c.executemany("INSERT INTO payments (client_id, amount, type, date) VALUES (?, 25, 'سلفة', ?)",
+                      [(cid, f"{year}-06-01") for year in years])
+
+
+def reported(cid):
+    return db.compute_report(), db.get_range_report("2023-01-01", "2025-12-31"), db.get_payments(cid, "2023-01-01")
+
+
+# -------------------- SNAPSHOTS --------------------
+def test_only_the_newest_snapshots_are_kept(fresh_db):
+    taken = []
+    for i in range(4):
+        db.insert_client(f"w{i}", "", 100)
+        taken.append(snapshot(keep=2))
+    assert backup.list_backups() == [taken[3]["path"], taken[2]["path"]]
+    assert taken[2]["removed"] == [taken[0]["path"]] and taken[3]["removed"] == [taken[1]["path"]]
+    assert backup.check_integrity(taken[3]["path"]) == []
+    assert sorted(os.listdir(backup.backup_dir())) == sorted(os.path.basename(p) for p in backup.list_backups())
+
+
+def test_a_copy_that_fails_its_check_replaces_nothing(fresh_db, monkeypatch):
+    kept = snapshot(keep=1)["path"]
+    monkeypatch.setattr(backup, "check_integrity", lambda path: ["*** in database main ***"])
+    with pytest.raises(sqlite3.DatabaseError, match="integrity_check"):
+        backup.take_backup(keep=1)
+    assert backup.list_backups() == [kept]
+    assert os.listdir(backup.backup_dir()) == [os.path.basename(kept)]  # no .partial left behind
+
+
+def test_a_corrupt_snapshot_is_not_restored(fresh_db):
+    for i in range(300):
+        db.insert_client(f"worker {i}", "0100000000", 100)
+    path = snapshot()["path"]
+    with open(path, "r+b") as f:
+        f.seek(2 * 4096)
+        f.write(b"\xff" * 4096)
+    db.insert_client("after the snapshot", "", 100)
+    before = names()
+
+    with pytest.raises(sqlite3.DatabaseError):
+        backup.restore_backup(path)
+
+    assert names() == before
+    assert backup.list_backups() == [path]  # not even the safety snapshot was taken
+
+
+def test_a_restore_brings_the_data_back_under_a_new_log_id(fresh_db):
+    db.insert_client("in the snapshot", "", 100)
+    path = snapshot()["path"]
+    with closing(sqlite3.connect(path)) as conn:
+        saved_log = sync._state(conn, "log")
+    db.insert_client("after the snapshot", "", 100)
+    current_log = log_id()
+
+    result = backup.restore_backup(path)
+
+    assert names() == ["in the snapshot"]
+    assert log_id() not in (saved_log, current_log)
+    with closing(sqlite3.connect(result["safety_backup"])) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM clients").fetchone()[0] == 2  # the restore can be undone
+
+
+# -------------------- ARCHIVE FILES --------------------
+def test_archive_files_are_saved_once_and_restored_elsewhere(fresh_db, tmp_path):
+    cid = db.insert_client("سعيد", "010", 150)
+    add_history(cid, (2023, 2024, 2025))
+    archive.archive_closed_years(before=2025)
+    expected = reported(cid)
+
+    first, second = snapshot(), snapshot()
+    assert len(first["archives"]) == 2 and second["archives"] == []  # the second shares the copies
+
+    # another machine: the backups folder, but none of the live files
+    elsewhere = tmp_path / "elsewhere"
+    shutil.copytree(backup.backup_dir(), elsewhere / "backups")
+    db.set_db_path(str(elsewhere / "test.db"))
+    db.init_db()
+    result = backup.restore_backup(str(elsewhere / "backups" / os.path.basename(second["path"])))
+
+    assert sorted(result["archives"]) == ["test.2023.db", "test.2024.db"] and result["missing"] == []
+    assert reported(cid) == expected
+
+
+def test_rotation_drops_archive_copies_no_snapshot_needs(fresh_db):
+    cid = db.insert_client("سعيد", "010", 150)
+    add_history(cid, (2023, 2024))
+    archive.archive_closed_years(before=2025)
+    old = snapshot(keep=1)
+    old_2023 = backup.archive_copies(old["path"])["test.2023.db"]
+    time.sleep(1)  # archived_at, which tells versions apart, is stamped to the second
+    db.apply_attendance_changes([(cid, "2023-09-01", True)])
+    archive.archive_closed_years(before=2025)
+
+    new = snapshot(keep=1)
+
+    assert new["archives"] == [backup.archive_copies(new["path"])["test.2023.db"]]
+    assert old["path"] in new["removed"]
+    assert old_2023 in new["removed"] and not os.path.exists(old_2023)
+    assert sorted(os.listdir(os.path.join(backup.backup_dir(), "archives"))) == \
+        sorted(os.path.basename(p) for p in backup.archive_copies(new["path"]).values())
+
+
+def test_a_year_lost_everywhere_is_reported_and_the_rest_restored(fresh_db):
+    cid = db.insert_client("سعيد", "010", 150)
+    add_history(cid, (2023, 2024))
+    archive.archive_closed_years(before=2025)
+    path = snapshot()["path"]
+    year_2023 = db.get_range_report("2023-01-01", "2023-12-31")
+    lost = os.path.join(os.path.dirname(fresh_db), "test.2024.db")
+    os.remove(lost)
+    os.remove(backup.archive_copies(path)["test.2024.db"])
+
+    result = backup.restore_backup(path)
+
+    assert result["archives"] == ["test.2023.db"] and result["missing"] == ["test.2024.db"]
+    assert db.get_range_report("2023-01-01", "2023-12-31") == year_2023
+    with pytest.raises(FileNotFoundError):
+        db.get_payments(cid, "2024-01-01")
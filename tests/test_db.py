@@ -0,0 +1,185 @@
+import random
+import threading
+from contextlib import closing
+
+import db
+from attendance_buffer import AttendanceBuffer
+
+DAYS = ["2025-03-01", "2025-03-02", "2025-03-03"]
+
+
+def add_clients(n, names=("أحمد", "محمد", "علي")):
+    # few distinct names, so keyset pages have to break ties on id
+    return [db.insert_client(names[i % len(names)], str(i), 100 + i) for i in range(n)]
+
+
+def attendance_state(path):
+    # everything the attendance rows feed: the rows, days_worked and both report tables
+    with closing(db.open_connection(path)) as conn:
+        return (
+            conn.execute("SELECT client_id, date FROM attendance ORDER BY 1, 2").fetchall(),
+            conn.execute("SELECT id, days_worked FROM clients ORDER BY id").fetchall(),
+            conn.execute("SELECT n_attendance FROM report_summary").fetchall(),
+            conn.execute("SELECT day, attendance FROM daily_rollup WHERE attendance > 0 ORDER BY day").fetchall(),
+        )
+
+
+def per_row(path, toggles):
+    # the reference: one statement and one commit per toggle, no batching
+    with closing(db.open_connection(path)) as conn:
+        for cid, day, present in toggles:
+            with conn:
+                if present:
+                    conn.execute("INSERT OR IGNORE INTO attendance (client_id, date) VALUES (?, ?)", (cid, day))
+                else:
+                    conn.execute("DELETE FROM attendance WHERE client_id = ? AND date = ?", (cid, day))
+
+
+def make_pair(tmp_path, n_clients=30):
+    # two DBs with the same clients: a reference and the one under test
+    paths = [str(tmp_path / "reference.db"), str(tmp_path / "batched.db")]
+    for path in paths:
+        db.set_db_path(path)
+        db.init_db()
+        ids = add_clients(n_clients)
+    return paths, ids
+
+
+def random_toggles(ids, n, seed):
+    rnd = random.Random(seed)
+    return [(rnd.choice(ids), rnd.choice(DAYS), rnd.random() < 0.6) for _ in range(n)]
+
+
+def random_clicks(ids, n, seed):
+    # checkbox clicks on an empty sheet: each one flips what the box showed
+    rnd, shown, clicks = random.Random(seed), {}, []
+    for _ in range(n):
+        key = (rnd.choice(ids), rnd.choice(DAYS))
+        shown[key] = not shown.get(key, False)
+        clicks.append((*key, shown[key]))
+    return clicks
+
+
+# -------------------- CONNECTIONS --------------------
+def test_connections_use_the_tuned_pragmas(fresh_db):
+    conn = db.get_conn()
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+    assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == db.BUSY_TIMEOUT_MS
+    assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+    with closing(db.open_connection()) as other:
+        assert other.execute("PRAGMA busy_timeout").fetchone()[0] == db.BUSY_TIMEOUT_MS
+
+
+def test_parallel_readers_and_writers_do_not_fail_on_locks(fresh_db):
+    writers, readers, per_writer = 4, 4, 40
+    errors, stop = [], threading.Event()
+
+    def write():
+        try:
+            for _ in range(per_writer):
+                db.add_expense_db("دخل", 10, "test")
+        except Exception as ex:
+            errors.append(ex)
+
+    def read():
+        try:
+            while not stop.is_set():
+                db.compute_report()
+                db.get_expenses(limit=20)
+        except Exception as ex:
+            errors.append(ex)
+
+    read_threads = [threading.Thread(target=read) for _ in range(readers)]
+    write_threads = [threading.Thread(target=write) for _ in range(writers)]
+    for t in read_threads + write_threads:
+        t.start()
+    for t in write_threads:
+        t.join()
+    stop.set()
+    for t in read_threads:
+        t.join()
+    db.close_all()
+
+    assert errors == []
+    assert db.compute_report()[2] == writers * per_writer * 10
+
+
+# -------------------- BULK ATTENDANCE --------------------
+def test_apply_attendance_changes_matches_per_row_inserts(fresh_db, tmp_path):
+    (reference, batched), ids = make_pair(tmp_path)
+    for seed in range(3):
+        toggles = random_toggles(ids, 200, seed)
+        per_row(reference, toggles)
+        db.set_db_path(batched)
+        db.apply_attendance_changes(toggles)
+    db.close_all()
+    assert attendance_state(batched) == attendance_state(reference)
+
+
+def test_set_attendance_bulk_matches_per_row_inserts(fresh_db, tmp_path):
+    (reference, batched), ids = make_pair(tmp_path)
+    rnd = random.Random(1)
+    for day in DAYS + DAYS:
+        present = set(rnd.sample(ids, 12))
+        per_row(reference, [(cid, day, cid in present) for cid in ids])
+        db.set_db_path(batched)
+        db.set_attendance_bulk(day, present)
+    db.set_db_path(batched)
+    db.copy_attendance(DAYS[0], DAYS[1])
+    db.clear_attendance(DAYS[2])
+    first = set(db.get_attendance_ids(DAYS[0]))
+    per_row(reference, [(cid, DAYS[1], cid in first) for cid in ids] + [(cid, DAYS[2], False) for cid in ids])
+    db.close_all()
+    assert attendance_state(batched) == attendance_state(reference)
+
+
+def test_attendance_buffer_flush_matches_per_row_inserts(fresh_db, tmp_path):
+    (reference, batched), ids = make_pair(tmp_path)
+    toggles = random_clicks(ids, 300, seed=5)
+    per_row(reference, toggles)
+    db.set_db_path(batched)
+    buffer = AttendanceBuffer(window=60)  # nothing is written until flush()
+    for toggle in toggles:
+        buffer.toggle(*toggle)
+    buffer.flush()
+    db.close_all()
+    assert buffer.flushes == 1
+    assert attendance_state(batched) == attendance_state(reference)
+
+
+# -------------------- KEYSET PAGES --------------------
+def pages(fetch, cursor_of, limit, max_pages=200):
+    # every page in turn; a cursor that stops moving fails instead of looping
+    rows, after = [], None
+    for _ in range(max_pages):
+        page = fetch(after, limit)
+        assert len(page) <= limit
+        rows += page
+        if len(page) < limit:
+            return rows
+        after = cursor_of(page[-1])
+    raise AssertionError(f"still paging after {max_pages} pages")
+
+
+def test_client_pages_have_no_gaps_or_duplicates(fresh_db):
+    add_clients(53)
+    for limit in (1, 7, 53, 100):
+        rows = pages(lambda after, n: db.fetch_clients(after=after, limit=n), db.client_cursor, limit)
+        assert rows == db.fetch_clients()
+        assert len({r[0] for r in rows}) == 53
+    searched = pages(lambda after, n: db.fetch_clients("علي", after, n), db.client_cursor, 4)
+    assert searched == db.fetch_clients("علي")
+
+
+def test_expense_pages_have_no_gaps_or_duplicates(fresh_db):
+    rnd = random.Random(3)
+    with db.transaction() as c:
+        # many expenses share a date, so pages have to break ties on id
+        c.executemany("INSERT INTO expenses (type, amount, description, date) VALUES (?, ?, ?, ?)",
+                      [(rnd.choice(["دخل", "مصروف"]), i, "", rnd.choice(DAYS)) for i in range(61)])
+    for limit in (1, 8, 61, 100):
+        rows = pages(lambda before, n: db.get_expenses(before, n), db.expense_cursor, limit)
+        assert rows == db.get_expenses()
+        assert len({r[0] for r in rows}) == 61
+    assert [(r[4], r[0]) for r in rows] == sorted(((r[4], r[0]) for r in rows), reverse=True)
@@ -0,0 +1,100 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import db
+import db_async
+
+
+@pytest.fixture(autouse=True)
+def stop_worker():
+    yield
+    db_async.shutdown()
+
+
+async def max_gap_while(coro, tick=0.005):
+    # longest time the loop went without running the ticker while `coro` ran
+    gaps, done = [], asyncio.Event()
+
+    async def ticker():
+        last = time.perf_counter()
+        while not done.is_set():
+            await asyncio.sleep(tick)
+            now = time.perf_counter()
+            gaps.append(now - last)
+            last = now
+
+    task = asyncio.create_task(ticker())
+    try:
+        result = await coro
+    finally:
+        done.set()
+        await task
+    return result, max(gaps), len(gaps)
+
+
+def test_requests_run_in_order_on_the_db_worker(fresh_db):
+    seen = []
+
+    def record(i):
+        seen.append((i, threading.current_thread().name))
+        return i
+
+    async def go():
+        return await asyncio.gather(*(db_async.run(record, i) for i in range(20)))
+
+    assert asyncio.run(go()) == list(range(20))
+    assert seen == [(i, "db-worker") for i in range(20)]
+
+
+def test_awaitable_helpers_match_the_sync_ones(fresh_db):
+    async def go():
+        cid = await db_async.insert_client("سعيد", "010", 150)
+        await db_async.add_payment_db(cid, 40, "دفع")
+        await db_async.add_expense_db("دخل", 500, "x")
+        await db_async.apply_attendance_changes([(cid, "2025-03-01", True)])
+        return cid, await db_async.get_client(cid), await db_async.compute_report(), await db_async.get_payments(cid)
+
+    cid, client, report, payments = asyncio.run(go())
+    assert client == db.get_client(cid)
+    assert client[4] == 1  # days_worked
+    assert report == db.compute_report()
+    assert payments == db.get_payments(cid)
+
+
+def test_errors_reach_the_awaiting_handler(fresh_db):
+    async def go():
+        await db_async.run(db.get_conn().execute, "SELECT * FROM no_such_table")
+
+    with pytest.raises(sqlite3.OperationalError):
+        asyncio.run(go())
+
+
+def test_event_loop_keeps_running_during_a_slow_query(fresh_db):
+    async def go():
+        return await max_gap_while(db_async.run(time.sleep, 0.3))
+
+    _, gap, ticks = asyncio.run(go())
+    assert ticks >= 10
+    assert gap < 0.1
+
+
+def test_event_loop_keeps_running_during_a_long_export(fresh_db, tmp_path):
+    cids = [db.insert_client(f"w{i}", "", 100) for i in range(200)]
+    with db.transaction() as c:
+        c.executemany("INSERT INTO payments (client_id, amount, type, date) VALUES (?, 10, 'دفع', ?)",
+                      [(cids[i % 200], f"2025-{1 + i % 12:02d}-{1 + i % 28:02d}") for i in range(60000)])
+    out_dir = str(tmp_path / "exports")
+
+    async def go():
+        return await max_gap_while(db_async.export_all(out_dir, ["payments"]))
+
+    counts, gap, ticks = asyncio.run(go())
+    assert counts["payments"] == 60000
+    assert os.path.getsize(os.path.join(out_dir, "payments.csv")) > 0
+    assert ticks >= 5  # the export took long enough for the check to mean something
+    assert gap < 0.1
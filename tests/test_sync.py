@@ -0,0 +1,173 @@
+import json
+import time
+import urllib.error
+from contextlib import closing
+
+import pytest
+
+import backup
+import db
+import sync
+
+URL = "http://office.test:8765/sync"
+
+
+@pytest.fixture
+def copies(fresh_db, tmp_path):
+    """An office DB with one worker (2 days, 1 advance) and a phone copy made from it.
+
+    Yields (office path, phone path, the worker's uid).
+    """
+    office, phone = fresh_db, str(tmp_path / "phone.db")
+    cid = db.insert_client("سعيد", "010", 150)
+    db.apply_attendance_changes([(cid, "2025-03-01", True), (cid, "2025-03-02", True)])
+    db.add_payment_db(cid, 40, "سلفة")
+    uid = db.get_conn().execute("SELECT uid FROM clients WHERE id = ?", (cid,)).fetchone()[0]
+    db.close_all()
+    sync.make_copy(phone, URL)
+    return office, phone, uid
+
+
+def on(path, fn, *args):
+    # run one data-layer helper against `path`
+    db.set_db_path(path)
+    try:
+        return fn(*args)
+    finally:
+        db.close_all()
+        # times are in milliseconds: keep the edits of the two copies in order
+        time.sleep(0.005)
+
+
+def local_id(path, uid):
+    with closing(db.open_connection(path)) as conn:
+        row = conn.execute("SELECT id FROM clients WHERE uid = ?", (uid,)).fetchone()
+    return row[0] if row else None
+
+
+def transport_to(path):
+    # what serve() does for one POST, minus the socket (JSON both ways)
+    def send(request):
+        with closing(db.open_connection(path)) as conn:
+            db.migrate(conn)
+            return json.loads(sync._encode(sync.handle_sync(conn, json.loads(sync._encode(request)))))
+    return send
+
+
+def push(phone, office):
+    with closing(db.open_connection(phone)) as conn:
+        return sync.sync(conn, transport_to(office), URL)
+
+
+def contents(path):
+    # a copy's rows keyed by uid, so local ids may differ
+    with closing(db.open_connection(path)) as conn:
+        return (
+            conn.execute("SELECT uid, name, phone, daily_rate, days_worked FROM clients ORDER BY uid").fetchall(),
+            conn.execute("SELECT c.uid, a.date FROM attendance a JOIN clients c ON c.id = a.client_id "
+                         "ORDER BY 1, 2").fetchall(),
+            conn.execute("SELECT p.uid, c.uid, p.amount, p.type, p.date FROM payments p "
+                         "JOIN clients c ON c.id = p.client_id ORDER BY 1").fetchall(),
+            conn.execute("SELECT uid, type, amount, description, date FROM expenses ORDER BY uid").fetchall(),
+            conn.execute("SELECT n_clients, n_attendance, total_income, total_expense FROM report_summary").fetchall(),
+        )
+
+
+def client(path, uid):
+    return next((row for row in contents(path)[0] if row[0] == uid), None)
+
+
+def assert_converged(phone, office):
+    assert contents(phone) == contents(office)
+    again = push(phone, office)
+    assert (again["sent"], again["received"]) == (0, 0)
+    assert contents(phone) == contents(office)
+
+
+def test_edits_on_both_sides_converge_and_the_later_edit_wins(copies):
+    office, phone, uid = copies
+    cid = local_id(phone, uid)
+    other = on(phone, db.insert_client, "ماهر", "011", 120)
+    on(phone, db.apply_attendance_changes, [(other, "2025-03-03", True), (cid, "2025-03-03", True)])
+    on(phone, db.add_payment_db, other, 70, "دفع")
+    on(phone, db.update_client_db, cid, "edited on the phone", "010", 150)
+    on(office, db.add_expense_db, "مصروف", 30, "office")
+    on(office, db.update_client_db, local_id(office, uid), "edited in the office", "010", 175)
+
+    result = push(phone, office)
+
+    assert result["sent"] > 0 and result["received"] > 0
+    assert client(office, uid)[1:5] == ("edited in the office", "010", 175, 3)
+    assert_converged(phone, office)
+
+
+def test_an_edit_after_a_remote_delete_keeps_the_client_and_its_rows(copies):
+    office, phone, uid = copies
+    before = contents(office)
+    on(phone, db.delete_client_db, local_id(phone, uid))
+    on(office, db.update_client_db, local_id(office, uid), "renamed in the office", "010", 150)
+
+    push(phone, office)
+
+    assert client(phone, uid)[1:5] == ("renamed in the office", "010", 150, 2)
+    assert contents(phone)[1:3] == before[1:3]  # both days and the advance came back
+    assert_converged(phone, office)
+
+
+def test_a_delete_after_a_remote_edit_removes_the_client_and_its_rows(copies):
+    office, phone, uid = copies
+    on(office, db.update_client_db, local_id(office, uid), "renamed in the office", "010", 150)
+    on(phone, db.delete_client_db, local_id(phone, uid))
+
+    push(phone, office)
+
+    assert client(office, uid) is None
+    assert contents(office)[1:3] == ([], [])
+    assert_converged(phone, office)
+
+
+def test_a_deleted_payment_stays_deleted(copies):
+    office, phone, uid = copies
+    payment = on(phone, db.get_payments, local_id(phone, uid))[0][0]
+    on(phone, db.delete_payment_db, payment)
+
+    push(phone, office)
+
+    assert contents(office)[2] == []
+    assert_converged(phone, office)
+
+
+def test_a_restored_server_log_resets_the_watermarks(copies):
+    office, phone, uid = copies
+    snapshot = on(office, backup.take_backup)["path"]
+    on(office, db.insert_client, "before the restore", "", 100)
+    push(phone, office)
+    on(office, backup.restore_backup, snapshot)
+    # the restored office reuses the seqs the phone has already seen
+    on(office, db.insert_client, "after the restore", "", 100)
+
+    result = push(phone, office)
+
+    names = {row[1] for row in contents(phone)[0]}
+    assert {"before the restore", "after the restore"} <= names
+    assert result["sent"] > 0  # the office got back what it lost in the restore
+    assert_converged(phone, office)
+
+
+def test_the_server_only_syncs_with_its_token(copies):
+    office, phone, uid = copies
+    server = sync.serve_in_background(office, host="127.0.0.1", port=0)
+    url = f"http://127.0.0.1:{server.server_address[1]}/sync"
+    try:
+        db.set_db_path(phone)
+        with pytest.raises(urllib.error.HTTPError) as rejected:
+            sync.sync_now(url, "not the token")
+        assert rejected.value.code == 401
+        with closing(db.open_connection(office)) as conn:
+            token = sync._state(conn, "token")
+        assert sync.sync_now(url, token)["received"] >= 0
+        assert sync.peer_token(url) == token  # kept for the next sync
+    finally:
+        server.shutdown()
+        server.server_close()
+        db.close_all()